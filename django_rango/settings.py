@@ -10,6 +10,7 @@ https://docs.djangoproject.com/en/1.7/ref/settings/
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 import os
+import tempfile
 BASE_DIR = os.path.dirname(os.path.dirname(__file__)) # path to <project>/
 TEMPLATE_PATH = os.path.join(BASE_DIR, 'templates')   # path to <project>/templates
 STATIC_PATH = os.path.join(BASE_DIR, 'static')        # path to <project>/static
@@ -45,13 +46,18 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'rango.metrics.MetricsMiddleware',
+    'rango.shedding.LoadSheddingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
+    'rango.traffic.TrafficRecordingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'rango.routers.ReplicaPinMiddleware',
+    'rango.profiling.ProfilingMiddleware',
 )
 
 ROOT_URLCONF = 'django_rango.urls'
@@ -66,9 +72,33 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,         # Reuse connection across requests (seconds)
+        'OPTIONS': {
+            'timeout': 5,           # Wait for locks instead of failing (seconds)
+        },
     }
 }
 
+# Read replicas. Add replica aliases to DATABASES (e.g. a copy of the
+# SQLite file kept up to date by the deployment) and list them below.
+# Reads of rango models go to replicas, writes go to 'default'.
+
+DATABASE_ROUTERS = ['rango.routers.ReplicaRouter']
+
+RANGO_READ_REPLICAS = ()            # Aliases from DATABASES serving rango reads
+RANGO_REPLICA_LAG = 5               # Seconds a writer keeps reading from 'default'
+
+# SQLite tuning applied to every new connection (see rango/sqlite_tuning.py).
+# Set to () to run with SQLite defaults.
+SQLITE_PRAGMAS = (
+    ('busy_timeout', 5000),         # Wait for locks instead of failing (ms)
+    ('journal_mode', 'WAL'),        # Readers don't block the writer and vice versa
+    ('synchronous', 'NORMAL'),      # fsync on checkpoints only, durable enough with WAL
+    ('mmap_size', 268435456),       # Memory-mapped I/O up to 256 MiB
+    ('cache_size', -65536),         # Page cache of 64 MiB (negative means KiB)
+    ('temp_store', 'MEMORY'),       # Temporary B-trees in memory
+)
+
 # Internationalization
 # https://docs.djangoproject.com/en/1.7/topics/i18n/
 
@@ -93,6 +123,21 @@ STATICFILES_DIRS = (
 )
 
 
+# caches
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared between processes: reports built by management commands
+    # are shown in the admin.
+    'reports': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'django_rango_reports'),
+    },
+}
+
+
 # templates
 
 TEMPLATE_DIRS = (
@@ -119,3 +164,105 @@ REGISTRATION_AUTO_LOGIN = True      # If True, the user will be automatically lo
 LOGIN_REDIRECT_URL = '/rango/'      # The page you want users to arrive at after they successful log in
 LOGIN_URL = '/accounts/login/'      # The page users are directed to if they are not logged in,
                                     # and are tying to access pages requiring authentication
+
+
+# Rango settings
+
+RANGO_PAGE_CHUNK_SIZE = 20          # Pages per chunk on category page (infinite scrolling)
+RANGO_VIEW_BUFFER_MAX_AGE = 5       # Flush buffered category views every N seconds...
+RANGO_VIEW_BUFFER_MAX_PENDING = 1000    # ...or once N categories are pending
+RANGO_CLICK_BUFFER_MAX_AGE = 5      # Bulk insert buffered click events every N seconds...
+RANGO_CLICK_BUFFER_MAX_PENDING = 500    # ...or once N events are pending
+RANGO_TRENDING_BUFFER_MAX_AGE = 5   # Write buffered trending scores every N seconds...
+RANGO_TRENDING_BUFFER_MAX_PENDING = 1000    # ...or once N rows are pending
+RANGO_BUFFER_AUTO_FLUSH = True      # Flush buffers from a timer thread and at exit
+RANGO_CLICK_EVENT_RETENTION = 24    # Hours raw click events are kept after rollup
+RANGO_HOURLY_ROLLUP_RETENTION = 30  # Days hourly rollups are kept (daily ones forever)
+RANGO_TRENDING_HALF_LIFE = 24       # Hours after which a click counts half for trending
+RANGO_TRENDING_LIKE_WEIGHT = 5      # Clicks a like is worth for trending categories
+RANGO_RELATED_CATEGORIES = 5        # Related categories stored per category
+RANGO_RELATED_MIN_COVISITS = 2      # Sessions two categories must share to be related
+RANGO_RELATED_WINDOW = 24           # Hours of clicks related categories are built from (<= event retention)
+RANGO_EVENT_BATCH_MAX = 100         # Click and like events accepted per beacon POST
+# Token buckets per endpoint (see rango/throttling.py): `rate` requests per
+# second sustained, `burst` at once, keyed by client IP or by `user`.
+RANGO_THROTTLES = {
+    'goto': {'rate': 10, 'burst': 50},
+    'events': {'rate': 5, 'burst': 20},
+    'suggest_category': {'rate': 10, 'burst': 30},
+    'like_category': {'rate': 1, 'burst': 10, 'key': 'user'},
+    'auto_add_page': {'rate': 1, 'burst': 10, 'key': 'user'},
+}
+RANGO_THROTTLE_CACHE = None         # Cache alias to share buckets between workers
+RANGO_SHED_MAX_IN_FLIGHT = 16       # Concurrent requests per process at full load...
+RANGO_SHED_LATENCY_TARGET = 1.0     # ...or mean seconds per request at full load
+RANGO_SHED_WINDOW = 10              # Seconds of latency samples considered
+RANGO_SHED_RETRY_AFTER = 5          # Retry-After of shed requests
+# Load (1.0 = full) at which each class of requests is shed, see rango/shedding.py.
+RANGO_SHED_LEVELS = (('search', 1.0), ('suggest', 1.25), ('api', 1.5))
+RANGO_RECENT_PAGES = 10             # Pages kept in a user's recently visited list (up to ~20)
+RANGO_REPORT_CACHE = 'reports'      # Cache alias of reports shown in the admin
+RANGO_ANALYTICS_CHUNK_SIZE = 100000     # Rows per query when building the analytics report
+RANGO_ANALYTICS_REPORT_TTL = 86400  # Seconds the analytics report is kept
+RANGO_METRICS_ALLOWED_IPS = ('127.0.0.1',)  # Clients allowed to scrape /metrics (None: all)
+RANGO_PROFILE_SAMPLE_EVERY = 0      # Profile one request in N automatically (0: only on request)
+RANGO_PROFILE_KEEP = 50             # Newest request profiles kept for the admin
+RANGO_REQUEST_LOG_SAMPLE = 0.01     # Fraction of requests written to the request log
+RANGO_TRAFFIC_RECORD = 0            # Fraction of requests recorded for replay_traffic
+# Form fields never written to the traffic record.
+RANGO_TRAFFIC_REDACT = ('csrfmiddlewaretoken', 'password', 'password1', 'password2')
+RANGO_IMPORT_MAX_ROWS = 10000       # Pages per request to the page import API
+# Query parameters ignored when comparing page URLs ('*' matches a prefix),
+# run `manage.py dedupe_pages --rehash` after changing them.
+RANGO_URL_TRACKING_PARAMS = ('utm_*', 'fbclid', 'gclid', 'mc_cid', 'mc_eid')
+RANGO_LINK_CHECK_TIMEOUT = 10       # Seconds per request of check_links
+RANGO_LINK_CHECK_PER_HOST = 2       # Link check requests in flight per host
+RANGO_LINK_CHECK_INTERVAL = 7 * 86400   # Seconds until a working link is checked again...
+RANGO_LINK_CHECK_RETRY = 3600       # ...a broken one, doubled per failed check up to the interval
+RANGO_LINK_CHECK_ALLOW_PRIVATE = False  # Check links to private and loopback addresses too
+
+# Sampled JSON-lines request log (rango/requestlog.py) and recorded
+# traffic (rango/traffic.py).
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'request_log': {
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': os.path.join(tempfile.gettempdir(),
+                                     'django_rango_requests.log'),
+            'formatter': 'message',
+            'delay': True,
+        },
+        'traffic_record': {
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': os.path.join(tempfile.gettempdir(),
+                                     'django_rango_traffic.log'),
+            'formatter': 'message',
+            'delay': True,
+        },
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # Warnings and errors of rango modules, e.g. rejected imports.
+        'rango': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+        'rango.requests': {
+            'handlers': ['request_log'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'rango.traffic.record': {
+            'handlers': ['traffic_record'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
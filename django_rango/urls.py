@@ -24,6 +24,7 @@ urlpatterns = patterns(
         name='registration_register'),
     (r'^accounts/', include('registration.backends.simple.urls')),
     url(r'^accounts/user/settings/$', views.user_settings, name='user_settings'),
+    url(r'^metrics$', views.metrics, name='metrics'),
 )
 
 
@@ -34,10 +35,26 @@ urlpatterns += patterns(
         views.CategoriesViewSet.as_view(),
         name='cat-list'),
 
+    url(r'^api/categories/most_viewed/$',
+        views.MostViewedCategoriesViewSet.as_view(),
+        name='cat-most-viewed'),
+
+    url(r'^api/categories/trending/$',
+        views.TrendingCategoriesViewSet.as_view(),
+        name='cat-trending'),
+
     url(r'^api/pages/$',
         views.PagesViewSet.as_view(),
         name='page-list'),
 
+    url(r'^api/pages/import/$',
+        views.import_pages,
+        name='page-import'),
+
+    url(r'^api/pages/trending/$',
+        views.TrendingPagesViewSet.as_view(),
+        name='page-trending'),
+
     url(r'^api/categories/(?P<cat_id>[\d]+)/$',
         views.category_details,
         name='specific-cat'),
@@ -1,22 +1,118 @@
+import json
+
+from django.conf.urls import patterns, url
 from django.contrib import admin
-from rango.models import Category, Page, UserProfile
+from django.core.urlresolvers import reverse
+from django.http import HttpResponse, HttpResponseRedirect
+from django.shortcuts import get_object_or_404, render
+from django.utils.html import format_html, format_html_join
+from rango.models import Category, Page, ProfileDump, UserProfile
 
 
 # update Page model view at admin interface
 
 class PageAdmin(admin.ModelAdmin):
-    list_display = ('title', 'category', 'url', 'views')
+    list_display = ('title', 'category', 'url', 'views', 'link_status',
+                    'link_error', 'link_checked')
+    list_filter = ('link_status', 'link_error')
+
+    def get_urls(self):
+        urls = patterns(
+            '',
+            url(r'^analytics/$',
+                self.admin_site.admin_view(self.analytics_view),
+                name='rango_analytics'),
+        )
+        return urls + super(PageAdmin, self).get_urls()
+
+    def analytics_view(self, request):
+        """
+        Shows the cached analytics report, POST rebuilds it.
+        """
+        # Optional dependency, only needed by this report.
+        from rango.analytics import build_report, get_report
+
+        if request.method == 'POST':
+            build_report()
+            return HttpResponseRedirect(request.path)
+
+        report = get_report()
+        sections = []
+        if report:
+            sections = [('Page views', report['page_views']),
+                        ('Views per category', report['category_views']),
+                        ('Category likes', report['category_likes'])]
+
+        context = {
+            'title': 'Page and category analytics',
+            'report': report,
+            'sections': sections,
+            'opts': self.model._meta,
+        }
+        return render(request, 'admin/rango/analytics.html', context)
 
 
 # re-order fields in the Category edit form
 
 class CatAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
-    fields = ['name', 'slug', 'likes', 'views']
+    fields = ['name', 'slug', 'likes', 'views',
+              'page_count', 'total_page_views', 'last_activity']
+    readonly_fields = ('page_count', 'total_page_views', 'last_activity')
+    list_display = ('name', 'page_count', 'total_page_views',
+                    'last_activity', 'likes', 'views')
+
+
+# profiled requests, read-only with a download of the cProfile stats
+
+class ProfileDumpAdmin(admin.ModelAdmin):
+    list_display = ('created', 'view', 'method', 'path', 'status',
+                    'duration', 'query_count', 'query_time', 'sampled',
+                    'user')
+    list_filter = ('view', 'sampled')
+    fields = ('created', 'user', 'method', 'path', 'view', 'status',
+              'sampled', 'duration', 'query_count', 'query_time',
+              'download', 'sql', 'summary')
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        urls = patterns(
+            '',
+            url(r'^(\d+)/download/$',
+                self.admin_site.admin_view(self.download_view),
+                name='rango_profiledump_download'),
+        )
+        return urls + super(ProfileDumpAdmin, self).get_urls()
+
+    def download_view(self, request, pk):
+        dump = get_object_or_404(ProfileDump, pk=pk)
+        response = HttpResponse(bytes(dump.stats),
+                                content_type='application/octet-stream')
+        response['Content-Disposition'] = (
+            'attachment; filename="profile-{0}.prof"'.format(dump.pk))
+        return response
+
+    def download(self, dump):
+        return format_html(
+            '<a href="{0}">profile-{1}.prof</a>',
+            reverse('admin:rango_profiledump_download', args=[dump.pk]),
+            dump.pk)
+
+    def sql(self, dump):
+        return format_html(
+            '<pre>{0}</pre>',
+            format_html_join('\n', '{0:.4f}s  {1}',
+                             ((query['time'], query['sql'])
+                              for query in json.loads(dump.queries))))
+    sql.short_description = 'SQL'
 
 
 # register my models
 
 admin.site.register(Category, CatAdmin)
 admin.site.register(Page, PageAdmin)
+admin.site.register(ProfileDump, ProfileDumpAdmin)
 admin.site.register(UserProfile)
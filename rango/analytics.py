@@ -0,0 +1,282 @@
+"""
+Distribution report of page views and category likes.
+
+Columns are read with `values_list` in primary key chunks of
+RANGO_ANALYTICS_CHUNK_SIZE rows and folded into fixed-size NumPy
+accumulators, so memory does not grow with the number of pages:
+
+* `Distribution` is a log-linear histogram (exact below 128, then 64
+  buckets per power of two, i.e. under 1.6% relative error), from
+  which percentiles, Gini coefficient and top-share concentration are
+  derived.
+* Per-category page counts, view sums and maxima are arrays indexed
+  by category id.
+
+`build_report` stores the result in the RANGO_REPORT_CACHE cache,
+where the admin view (`PageAdmin.analytics_view`) picks it up.
+
+Requires NumPy.
+"""
+import math
+
+import numpy as np
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max
+from django.utils import timezone
+
+from rango.models import Category, Page
+
+
+REPORT_KEY = 'rango:analytics'
+
+# Log-linear buckets: values below EXACT get their own bucket, every
+# further power of two is split into SUB_BUCKETS.
+EXACT = 128
+SUB_BUCKETS = 64
+BUCKETS = EXACT + (64 - 7) * SUB_BUCKETS
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def get_chunk_size():
+    return getattr(settings, 'RANGO_ANALYTICS_CHUNK_SIZE', 100000)
+
+
+def get_report_cache():
+    return caches[getattr(settings, 'RANGO_REPORT_CACHE', 'default')]
+
+
+def bucket_index(values):
+    """
+    Maps array of non-negative integers to bucket indices.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    mantissa, exponent = np.frexp(values)
+    # v = (SUB_BUCKETS + sub) * 2 ** (exponent - 7) for v >= EXACT.
+    sub = ((mantissa - 0.5) * 2 * SUB_BUCKETS).astype(np.int64)
+    index = EXACT + (exponent - 8) * SUB_BUCKETS + sub
+    return np.where(values < EXACT, values, index)
+
+
+def bucket_bounds():
+    """
+    Returns `(low, high)` arrays, bucket `i` holds `[low, high)`.
+    """
+    index = np.arange(BUCKETS)
+    exponent = (index - EXACT) // SUB_BUCKETS + 8
+    sub = (index - EXACT) % SUB_BUCKETS
+    low = np.where(index < EXACT, index,
+                   (SUB_BUCKETS + sub) * 2.0 ** (exponent - 7))
+    width = np.where(index < EXACT, 1, 2.0 ** (exponent - 7))
+    return low, low + width
+
+
+class Distribution(object):
+    """
+    Fixed-size histogram of non-negative integers fed in chunks.
+    Values in a bucket are treated as equal to the bucket mean.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(BUCKETS, dtype=np.int64)
+        self.sums = np.zeros(BUCKETS)
+        self.min = None
+        self.max = None
+
+    def add(self, values):
+        values = np.maximum(np.asarray(values, dtype=np.int64), 0)
+        if not len(values):
+            return
+
+        index = bucket_index(values)
+        self.counts += np.bincount(index, minlength=BUCKETS)
+        self.sums += np.bincount(index, weights=values, minlength=BUCKETS)
+
+        low, high = int(values.min()), int(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    @property
+    def total(self):
+        return float(self.sums.sum())
+
+    def percentile(self, q):
+        """
+        Returns `q`-th percentile, interpolated within its bucket.
+        """
+        n = self.count
+        if not n:
+            return 0.0
+
+        rank = q / 100.0 * (n - 1)
+        cumulative = np.cumsum(self.counts)
+        i = int(np.searchsorted(cumulative, rank, side='right'))
+        if i < EXACT:
+            return float(i)
+
+        low, high = bucket_bounds()
+        within = rank - (cumulative[i] - self.counts[i])
+        value = low[i] + (within + 0.5) / self.counts[i] * (high[i] - low[i])
+        return float(min(max(value, self.min), self.max))
+
+    def histogram(self):
+        """
+        Returns `[(low, high, count)]` over power of two ranges
+        `[0, 1), [1, 2), [2, 4), ...`, empty ranges at the top cut.
+        """
+        low = bucket_bounds()[0]
+        group = np.where(low < 1, 0,
+                         np.floor(np.log2(np.maximum(low, 1))) + 1)
+        counts = np.bincount(group.astype(np.int64), weights=self.counts)
+        used = np.flatnonzero(counts)
+        if not len(used):
+            return []
+
+        return [(0 if g == 0 else 2 ** (g - 1), 2 ** g, int(counts[g]))
+                for g in range(used[-1] + 1)]
+
+    def gini(self):
+        """
+        Gini coefficient: 0 when all values are equal, close to 1 when
+        one item holds everything.
+        """
+        n, total = self.count, self.total
+        if not n or not total:
+            return 0.0
+
+        cumulative = np.cumsum(self.sums)
+        previous = cumulative - self.sums
+        area = (self.counts * (previous + cumulative)).sum()
+        return float(1 - area / (n * total))
+
+    def top_share(self, fraction):
+        """
+        Share of the total held by the top `fraction` of items.
+        """
+        n, total = self.count, self.total
+        if not n or not total:
+            return 0.0
+
+        wanted = int(math.ceil(n * fraction))
+        counts, sums = self.counts[::-1], self.sums[::-1]
+        cumulative = np.cumsum(counts)
+        i = int(np.searchsorted(cumulative, wanted))
+        taken = sums[:i].sum()
+        remaining = wanted - (cumulative[i - 1] if i else 0)
+        taken += remaining * sums[i] / counts[i]
+        return float(taken / total)
+
+    def summary(self):
+        n = self.count
+        return {
+            'count': n,
+            'total': int(self.total),
+            'mean': self.total / n if n else 0.0,
+            'min': self.min or 0,
+            'max': self.max or 0,
+            'percentiles': [(q, self.percentile(q)) for q in PERCENTILES],
+            'histogram': self.histogram(),
+            'gini': self.gini(),
+            'top_1_share': self.top_share(0.01),
+            'top_10_share': self.top_share(0.1),
+        }
+
+
+def iter_columns(queryset, fields, chunk_size):
+    """
+    Yields 2-d int64 arrays of `('id',) + fields` columns of
+    `queryset`, walking the primary key in chunks.
+    """
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by('id')
+                            .values_list('id', *fields)[:chunk_size])
+        if not rows:
+            return
+        chunk = np.array(rows, dtype=np.int64)
+        yield chunk
+        last_id = int(chunk[-1, 0])
+
+
+def page_stats(chunk_size, top):
+    """
+    Returns `(views distribution, top categories by views,
+    category concentration)` in one pass over pages.
+    """
+    views = Distribution()
+    size = (Category.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+    pages = np.zeros(size, dtype=np.int64)
+    totals = np.zeros(size, dtype=np.int64)
+    maxima = np.zeros(size, dtype=np.int64)
+
+    for chunk in iter_columns(Page.objects.all(), ('category_id', 'views'),
+                              chunk_size):
+        categories, page_views = chunk[:, 1], chunk[:, 2]
+        views.add(page_views)
+        pages += np.bincount(categories, minlength=size)
+        totals += np.bincount(categories, weights=page_views,
+                              minlength=size).astype(np.int64)
+
+        order = np.argsort(categories, kind='mergesort')
+        ids, starts = np.unique(categories[order], return_index=True)
+        maxima[ids] = np.maximum(
+            maxima[ids], np.maximum.reduceat(page_views[order], starts))
+
+    category_views = Distribution()
+    category_views.add(totals[pages > 0])
+
+    best = np.argsort(-totals, kind='mergesort')[:top]
+    best = best[pages[best] > 0]
+    categories = Category.objects.in_bulk(best.tolist())
+    total = float(totals.sum()) or 1.0
+    rows = [{
+        'name': categories[i].name if i in categories else i,
+        'likes': categories[i].likes if i in categories else 0,
+        'pages': int(pages[i]),
+        'views': int(totals[i]),
+        'mean': float(totals[i]) / pages[i],
+        'max': int(maxima[i]),
+        'share': totals[i] / total,
+    } for i in best.tolist()]
+
+    return views, rows, category_views
+
+
+def build_report(chunk_size=None, top=20):
+    """
+    Computes the report and stores it in the report cache.
+    """
+    if chunk_size is None:
+        chunk_size = get_chunk_size()
+
+    views, top_categories, category_views = page_stats(chunk_size, top)
+
+    likes = Distribution()
+    for chunk in iter_columns(Category.objects.all(), ('likes',),
+                              chunk_size):
+        likes.add(chunk[:, 1])
+
+    report = {
+        'generated': timezone.now(),
+        'page_views': views.summary(),
+        'category_views': category_views.summary(),
+        'category_likes': likes.summary(),
+        'top_categories': top_categories,
+    }
+    get_report_cache().set(
+        REPORT_KEY, report,
+        getattr(settings, 'RANGO_ANALYTICS_REPORT_TTL', 24 * 3600))
+    return report
+
+
+def get_report():
+    """
+    Returns the cached report or None.
+    """
+    return get_report_cache().get(REPORT_KEY)
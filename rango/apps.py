@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class RangoConfig(AppConfig):
+    name = 'rango'
+    verbose_name = 'Rango'
+
+    def ready(self):
+        from rango.sqlite_tuning import configure_connection
+        connection_created.connect(configure_connection,
+                                   dispatch_uid='rango_sqlite_tuning')
+
+        from rango import metrics
+        metrics.install()
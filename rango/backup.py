@@ -0,0 +1,226 @@
+"""
+Streaming dump and restore of Rango data, behind `manage.py rango_dump`
+and `manage.py rango_restore`.
+
+A dump is JSON lines, gzipped if the file name ends in .gz: a format
+line, then per model a line naming the model and its fields followed by
+one JSON array per row::
+
+    {"format": "rango", "version": 1}
+    {"model": "rango.category", "fields": ["id", "name", ...]}
+    [1, "Python", ...]
+    {"model": "rango.page", "fields": ["id", "category_id", ...]}
+    ...
+
+Rows are read in primary key chunks (SQLite reads a whole result even
+with `.iterator()`) and written one line each, and are restored in
+chunks with `bulk_create`, keeping ids and foreign keys, so memory does
+not grow with the database. Fields are matched by name, so a dump
+restores into a schema with fields added since (they get defaults).
+"""
+import json
+from collections import Counter, defaultdict
+from datetime import date
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import (DEFAULT_DB_ALIAS, connections, models, reset_queries,
+                       transaction)
+
+from rango.canonical import url_hash
+from rango.counters import repair_category_counters
+from rango.models import Category, Page, UserProfile, validate_page_url
+
+
+FORMAT = 'rango'
+VERSION = 1
+
+# In foreign key order.
+MODELS = (Category, Page, UserProfile)
+
+
+def get_label(model):
+    return '{0}.{1}'.format(model._meta.app_label, model._meta.model_name)
+
+
+def get_fields(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def encode(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def write_line(output, value):
+    output.write(json.dumps(value, default=encode, separators=(',', ':')))
+    output.write('\n')
+
+
+def iter_rows(model, fields, chunk_size, using=DEFAULT_DB_ALIAS):
+    """
+    Yields `fields` of all rows of `model` in primary key order, one
+    query per `chunk_size` rows.
+    """
+    pk = fields.index(model._meta.pk.attname)
+    queryset = model._default_manager.using(using).order_by('pk')
+    last_pk = None
+    while True:
+        chunk = queryset
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        count = 0
+        for row in chunk.values_list(*fields)[:chunk_size].iterator():
+            yield row
+            last_pk = row[pk]
+            count += 1
+        if count < chunk_size:
+            return
+        # With DEBUG on, the query log would keep every chunk's SQL.
+        reset_queries()
+
+
+def dump(output, chunk_size=2000, using=DEFAULT_DB_ALIAS):
+    """
+    Writes MODELS to `output`. Returns `{model label: rows}`.
+    """
+    counts = {}
+    write_line(output, {'format': FORMAT, 'version': VERSION})
+    for model in MODELS:
+        label, fields = get_label(model), get_fields(model)
+        write_line(output, {'model': label, 'fields': fields})
+        counts[label] = 0
+        for row in iter_rows(model, fields, chunk_size, using):
+            write_line(output, row)
+            counts[label] += 1
+    return counts
+
+
+class Restore(object):
+    """
+    Restores a dump line by line, collecting rows of the current model
+    and writing them every `chunk_size` rows.
+    """
+
+    def __init__(self, chunk_size=2000, using=DEFAULT_DB_ALIAS):
+        self.chunk_size = chunk_size
+        self.using = using
+        self.counts = {}
+        # {model label: Counter of reasons}
+        self.skipped = defaultdict(Counter)
+        # Categories whose dumped counters include skipped pages.
+        self.stale_categories = set()
+        self.model = None
+        self.pending = []
+
+    def run(self, lines):
+        lines = iter(lines)
+        header = self.parse(next(lines, 'null'))
+        if (not isinstance(header, dict) or header.get('format') != FORMAT or
+                header.get('version') != VERSION):
+            raise ValueError('Not a rango dump of version {0}.'.format(
+                VERSION))
+        self.check_empty()
+
+        with transaction.atomic(using=self.using):
+            for line in lines:
+                if not line.strip():
+                    continue
+                value = self.parse(line)
+                if isinstance(value, dict):
+                    self.start_model(value)
+                elif isinstance(value, list) and self.model is not None:
+                    self.add(value)
+                else:
+                    raise ValueError('Unexpected line: {0}'.format(
+                        line[:80]))
+            self.flush()
+            if self.stale_categories:
+                repair_category_counters(self.stale_categories,
+                                         using=self.using)
+
+        connection = connections[self.using]
+        statements = connection.ops.sequence_reset_sql(no_style(), MODELS)
+        if statements:
+            cursor = connection.cursor()
+            for sql in statements:
+                cursor.execute(sql)
+        return self.counts
+
+    def parse(self, line):
+        try:
+            return json.loads(line)
+        except ValueError:
+            raise ValueError('Cut or corrupt dump: {0}'.format(line[:80]))
+
+    def check_empty(self):
+        for model in MODELS:
+            if model._default_manager.using(self.using).exists():
+                raise ValueError('{0} already has rows, restore into an '
+                                 'empty database.'.format(get_label(model)))
+
+    def start_model(self, header):
+        self.flush()
+        try:
+            model = apps.get_model(header['model'])
+        except (KeyError, LookupError, ValueError):
+            raise ValueError('Unknown model {0}.'.format(header.get('model')))
+        if model not in MODELS:
+            raise ValueError('Unknown model {0}.'.format(header['model']))
+
+        self.model = model
+        current = dict((field.attname, field)
+                       for field in model._meta.concrete_fields)
+        # (position in row, field) of dumped fields that still exist.
+        self.fields = [(i, current[name])
+                       for i, name in enumerate(header['fields'])
+                       if name in current]
+        self.counts[get_label(model)] = 0
+
+        self.user_ids = None
+        if model is UserProfile:
+            # Users are not dumped, profiles need them to exist.
+            self.user_ids = set(User.objects.using(self.using)
+                                .values_list('pk', flat=True))
+
+    def add(self, row):
+        values = {}
+        for i, field in self.fields:
+            value = row[i]
+            if value is not None and isinstance(field, (models.DateField,
+                                                        models.TimeField)):
+                value = field.to_python(value)
+            values[field.attname] = value
+
+        if self.model is Page:
+            try:
+                validate_page_url(values['url'])
+            except ValidationError:
+                self.stale_categories.add(values['category_id'])
+                return self.skip('with invalid URL')
+            if not values.get('url_hash'):
+                # Dumped before pages had URL hashes.
+                values['url_hash'] = url_hash(values['url'])
+
+        if self.user_ids is not None and \
+                values['user_id'] not in self.user_ids:
+            return self.skip('without user')
+
+        self.pending.append(self.model(**values))
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def skip(self, reason):
+        self.skipped[get_label(self.model)][reason] += 1
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.model._default_manager.using(self.using).bulk_create(
+            self.pending)
+        self.counts[get_label(self.model)] += len(self.pending)
+        self.pending = []
+        reset_queries()
@@ -0,0 +1,186 @@
+"""
+Latency and query count benchmark of Rango views and API.
+
+Every scenario requests one URL `repeat` times through the test client
+after a warm-up request, and records wall time percentiles and the
+number of queries. `run_scales` does this on throwaway databases
+filled by `rango.datagen.generate` with a given number of pages (and a
+hundredth as many categories), so results of different scales, machines or
+releases can be put side by side.
+
+`compare` flags scenarios whose median got slower than a baseline by
+more than a factor (ignoring differences below a noise floor), or that
+issue more queries than before.
+"""
+import platform
+import sqlite3
+import time
+from collections import namedtuple
+
+import django
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from rango import datagen
+from rango.models import Page
+
+
+Scenario = namedtuple('Scenario', 'name method path params login')
+
+PERCENTILES = (50, 95)
+
+# Features that would skew or stop repeated requests of one client.
+QUIET_SETTINGS = {
+    'RANGO_THROTTLES': {},
+    'RANGO_SHED_LEVELS': (),
+    'RANGO_PROFILE_SAMPLE_EVERY': 0,
+    'RANGO_REQUEST_LOG_SAMPLE': 0,
+    'RANGO_TRAFFIC_RECORD': 0,
+    # No buffer timers or exit flushes outliving the scratch database.
+    'RANGO_BUFFER_AUTO_FLUSH': False,
+}
+
+USERNAME = 'benchmark'
+PASSWORD = 'benchmark'
+
+
+def get_scenarios(category, page):
+    """
+    Returns one scenario per Rango URL, reading `category` and `page`.
+    """
+    cat_args = [category.slug]
+    return [
+        Scenario('index', 'get', reverse('index'), {}, False),
+        Scenario('category', 'get', reverse('category', args=cat_args),
+                 {}, False),
+        Scenario('category_pages', 'get',
+                 reverse('category_pages', args=cat_args), {}, False),
+        Scenario('trending', 'get', reverse('trending'), {}, False),
+        Scenario('suggest_category', 'get', reverse('suggest_category'),
+                 {'suggestion': category.name[:5]}, False),
+        Scenario('goto', 'get', reverse('goto'), {'page_id': page.id},
+                 False),
+        Scenario('like_category', 'get', reverse('like_category'),
+                 {'category_id': category.id}, True),
+        Scenario('auto_add_page', 'get', reverse('auto_add_page'),
+                 {'catid_data': category.id, 'title_data': 'Benchmark',
+                  'url_data': 'http://example.com/benchmark'}, True),
+        Scenario('cat-list', 'get', reverse('cat-list'), {}, False),
+        Scenario('cat-most-viewed', 'get', reverse('cat-most-viewed'),
+                 {}, False),
+        Scenario('cat-trending', 'get', reverse('cat-trending'), {}, False),
+        Scenario('page-list', 'get', reverse('page-list'), {}, False),
+        Scenario('page-trending', 'get', reverse('page-trending'), {},
+                 False),
+        Scenario('specific-cat', 'get',
+                 reverse('specific-cat', args=[category.id]), {}, False),
+        Scenario('specific-page', 'get',
+                 reverse('specific-page', args=[page.id]), {}, False),
+    ]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[int(round(q / 100.0 * (len(values) - 1)))]
+
+
+def measure(client, scenario, repeat):
+    send = getattr(client, scenario.method)
+    send(scenario.path, scenario.params)
+
+    times = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.time()
+            response = send(scenario.path, scenario.params)
+            times.append(time.time() - start)
+
+    stats = {
+        'status': response.status_code,
+        'queries': len(queries),
+        'mean': sum(times) / len(times),
+        'max': max(times),
+    }
+    for q in PERCENTILES:
+        stats['p{0}'.format(q)] = percentile(times, q)
+    return stats
+
+
+def run(repeat=20, names=None):
+    """
+    Benchmarks scenarios (all, or those in `names`) on the current
+    database, which needs at least one page. Returns `{name: stats}`.
+    """
+    page = Page.objects.select_related('category').order_by('id').first()
+    if page is None:
+        raise ValueError('Benchmarks need at least one page.')
+    category = page.category
+
+    if not User.objects.filter(username=USERNAME).exists():
+        User.objects.create_user(USERNAME, password=PASSWORD)
+    anonymous, logged_in = Client(), Client()
+    logged_in.login(username=USERNAME, password=PASSWORD)
+
+    results = {}
+    with override_settings(**QUIET_SETTINGS):
+        for scenario in get_scenarios(category, page):
+            if names and scenario.name not in names:
+                continue
+            client = logged_in if scenario.login else anonymous
+            results[scenario.name] = measure(client, scenario, repeat)
+    return results
+
+
+def run_scales(scales, repeat=20, names=None, log=None):
+    """
+    Runs `run` on a scratch database per number of pages in `scales`.
+    Returns `{'meta': ..., 'scales': {pages: {name: stats}}}`.
+    """
+    results = {'meta': get_meta(repeat), 'scales': {}}
+    for scale in scales:
+        with datagen.scratch_database():
+            start = time.time()
+            datagen.generate(max(scale // 100, 1), scale)
+            if log:
+                log('Seeded {0} pages in {1:.1f}s.'.format(
+                    scale, time.time() - start))
+            results['scales'][str(scale)] = run(repeat, names)
+    return results
+
+
+def get_meta(repeat):
+    return {
+        'created': timezone.now().isoformat(),
+        'repeat': repeat,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'machine': platform.node(),
+    }
+
+
+def compare(baseline, current, threshold=1.25, min_delta=0.001):
+    """
+    Returns `[(scale, name, metric, before, after)]` of scenarios run in
+    both results whose median slowed down by more than `threshold` times
+    and `min_delta` seconds, or that issue more queries.
+    """
+    regressions = []
+    for scale, scenarios in sorted(current['scales'].items()):
+        base_scenarios = baseline['scales'].get(scale, {})
+        for name, stats in sorted(scenarios.items()):
+            base = base_scenarios.get(name)
+            if base is None:
+                continue
+            if (stats['p50'] > base['p50'] * threshold and
+                    stats['p50'] - base['p50'] > min_delta):
+                regressions.append((scale, name, 'p50', base['p50'],
+                                    stats['p50']))
+            if stats['queries'] > base['queries']:
+                regressions.append((scale, name, 'queries',
+                                    base['queries'], stats['queries']))
+    return regressions
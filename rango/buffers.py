@@ -0,0 +1,225 @@
+"""
+Write-behind buffering of counter increments and event rows.
+
+Increments are coalesced per key (events are queued) in process memory
+and written in bulk once the buffer holds enough items or its oldest
+item is max age seconds old, so counting a hit does not cost a DB
+write per request. The age limit is kept by a timer thread, also when
+no more items arrive, and whatever is pending is written at interpreter
+exit (RANGO_BUFFER_AUTO_FLUSH). A worker killed outright, without
+running exit handlers, loses up to max age seconds of buffered writes,
+which is fine for popularity counters and click logs.
+"""
+import abc
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+from django.utils import six
+
+from rango.models import Category
+
+
+logger = logging.getLogger(__name__)
+
+
+# Every buffer created, see `clear_buffers`.
+buffers = []
+
+
+def get_auto_flush():
+    return getattr(settings, 'RANGO_BUFFER_AUTO_FLUSH', True)
+
+
+@six.add_metaclass(abc.ABCMeta)
+class WriteBehindBuffer(object):
+    """
+    Thread-safe in-memory buffer flushed with `flush_func(pending)`
+    once it holds `max_pending_setting` items or its oldest item is
+    `max_age_setting` seconds old.
+    """
+
+    def __init__(self, flush_func, max_age_setting, max_pending_setting):
+        self.flush_func = flush_func
+        self.max_age_setting = max_age_setting
+        self.max_pending_setting = max_pending_setting
+        self.lock = threading.Lock()
+        self.pending = self.new_pending()
+        # When the oldest pending item was put.
+        self.oldest = None
+        self.timer = None
+        buffers.append(self)
+        atexit.register(self.flush_at_exit)
+
+    @abc.abstractmethod
+    def new_pending(self):
+        """
+        Returns an empty collection of pending items.
+        """
+
+    @abc.abstractmethod
+    def put(self, pending, item):
+        """
+        Adds `item` to `pending`.
+        """
+
+    @abc.abstractmethod
+    def merge(self, pending):
+        """
+        Puts items of a failed flush back, before newer ones.
+        """
+
+    def get_max_age(self):
+        return getattr(settings, self.max_age_setting, 5)
+
+    def push(self, *items):
+        max_age = self.get_max_age()
+        max_pending = getattr(settings, self.max_pending_setting, 1000)
+
+        with self.lock:
+            now = time.time()
+            if not self.pending:
+                self.oldest = now
+            for item in items:
+                self.put(self.pending, item)
+            due = (len(self.pending) >= max_pending or
+                   now - self.oldest >= max_age)
+            if not due:
+                self.schedule(max_age)
+        if due:
+            self.flush()
+
+    def schedule(self, max_age):
+        """
+        Starts a timer flushing pending items after `max_age` seconds,
+        unless one is running. Call with the lock held.
+        """
+        if self.timer is None and get_auto_flush():
+            self.timer = threading.Timer(max_age, self.flush_from_timer)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush_from_timer(self):
+        with self.lock:
+            self.timer = None
+        try:
+            self.flush()
+        finally:
+            # Timer threads are not request threads, nothing else
+            # closes their connections.
+            for connection in connections.all():
+                connection.close()
+
+    def flush_at_exit(self):
+        if get_auto_flush():
+            self.flush()
+
+    def clear(self):
+        """
+        Drops everything pending without writing it and stops the timer.
+        """
+        with self.lock:
+            self.pending = self.new_pending()
+            self.oldest = None
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+    def flush(self):
+        """
+        Writes everything pending. On DB errors items are put back
+        and retried with the next flush.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, self.new_pending()
+            self.oldest = None
+        if not pending:
+            return
+
+        try:
+            self.flush_func(pending)
+        except DatabaseError:
+            logger.exception('Failed to flush %d buffered items, '
+                             'will retry.', len(pending))
+            with self.lock:
+                self.merge(pending)
+                # Retried by the timer, not by the next push.
+                self.oldest = time.time()
+                self.schedule(self.get_max_age())
+
+
+class CounterBuffer(WriteBehindBuffer):
+    """
+    Coalesces increments per key: `{key: n}`.
+    """
+
+    def new_pending(self):
+        return defaultdict(int)
+
+    def put(self, pending, item):
+        key, n = item
+        pending[key] += n
+
+    def merge(self, pending):
+        for key, n in pending.items():
+            self.pending[key] += n
+
+    def add(self, key, n=1):
+        self.push((key, n))
+
+
+class EventBuffer(WriteBehindBuffer):
+    """
+    Keeps rows in arrival order, to be written with one bulk insert.
+    """
+
+    def new_pending(self):
+        return []
+
+    def put(self, pending, item):
+        pending.append(item)
+
+    def merge(self, pending):
+        self.pending[:0] = pending
+
+    def append(self, event):
+        self.push(event)
+
+    def extend(self, events):
+        self.push(*events)
+
+
+def clear_buffers():
+    """
+    Clears all buffers, e.g. before the database they write to goes
+    away.
+    """
+    for buffer in buffers:
+        buffer.clear()
+
+
+def group_by_increment(pending):
+    """
+    Turns `{key: n}` into `{n: [keys]}`, so every distinct increment
+    needs one UPDATE.
+    """
+    groups = defaultdict(list)
+    for key, n in pending.items():
+        groups[n].append(key)
+    return groups
+
+
+def flush_category_views(pending):
+    with transaction.atomic():
+        for n, ids in group_by_increment(pending).items():
+            Category.objects.filter(id__in=ids).update(views=F('views') + n)
+
+
+category_views = CounterBuffer(flush_category_views,
+                               'RANGO_VIEW_BUFFER_MAX_AGE',
+                               'RANGO_VIEW_BUFFER_MAX_PENDING')
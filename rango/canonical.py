@@ -0,0 +1,67 @@
+"""
+Canonical form and hash of page URLs.
+
+Two URLs are considered the same page if their canonical forms match:
+
+* scheme and host are lowercased, default ports dropped,
+* trailing slashes of the path are dropped (an empty path is "/"),
+* query parameters of RANGO_URL_TRACKING_PARAMS (a trailing "*" matches
+  a prefix) are dropped and the rest sorted,
+* the fragment is dropped.
+
+`Page.url_hash` stores the SHA-1 of the canonical URL, so duplicates
+and all pages of a URL are found with an index lookup (see
+`rango.dedup`). Changing the rules or the setting invalidates stored
+hashes, run `manage.py dedupe_pages --rehash` afterwards.
+"""
+import hashlib
+
+from django.conf import settings
+from django.utils.six.moves.urllib.parse import urlsplit, urlunsplit
+
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+
+def get_tracking_params():
+    return getattr(settings, 'RANGO_URL_TRACKING_PARAMS',
+                   ('utm_*', 'fbclid', 'gclid'))
+
+
+def is_tracking(name, patterns):
+    name = name.lower()
+    return any(name == pattern or
+               (pattern.endswith('*') and name.startswith(pattern[:-1]))
+               for pattern in patterns)
+
+
+def canonicalize(url):
+    """
+    Returns canonical form of `url`. Query values are compared as
+    written, without decoding escapes.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+
+    userinfo, at, host = parts.netloc.rpartition('@')
+    host = host.lower()
+    port = DEFAULT_PORTS.get(scheme)
+    if port and host.endswith(':' + port):
+        host = host[:-len(port) - 1]
+
+    path = parts.path.rstrip('/') or '/'
+
+    patterns = get_tracking_params()
+    params = sorted(param for param in parts.query.split('&')
+                    if param and
+                    not is_tracking(param.partition('=')[0], patterns))
+
+    return urlunsplit((scheme, userinfo + at + host, path,
+                       '&'.join(params), ''))
+
+
+def url_hash(url):
+    """
+    Returns SHA-1 hex digest of the canonical form of `url`.
+    """
+    return hashlib.sha1(canonicalize(url).encode('utf-8')).hexdigest()
@@ -0,0 +1,171 @@
+"""
+Append-only click log with hourly and daily rollups.
+
+`track_url` queues a `ClickEvent` per click into `click_events`, which
+writes them with one bulk insert per flush. `rollup` (run from cron via
+`manage.py rollup_clicks`) folds events of completed hours into hourly
+and daily per-page and per-category buckets, `compact` deletes raw
+events and old hourly buckets. Time window queries (`views_in_window`)
+read rollups only, so the current, not yet rolled up hour is not
+counted.
+"""
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from rango.buffers import EventBuffer
+from rango.models import (ClickEvent, PageViewRollup, CategoryViewRollup,
+                          ViewRollup)
+
+
+def flush_click_events(events):
+    ClickEvent.objects.bulk_create(events)
+
+
+click_events = EventBuffer(flush_click_events,
+                           'RANGO_CLICK_BUFFER_MAX_AGE',
+                           'RANGO_CLICK_BUFFER_MAX_PENDING')
+
+
+def log_clicks(clicks, categories, now=None, session_key=''):
+    """
+    Queues a ClickEvent per click of `{page_id: clicks}`, `categories`
+    maps page ids to category ids.
+    """
+    now = now or timezone.now()
+    click_events.extend([
+        ClickEvent(page_id=page_id, category_id=categories[page_id],
+                   created=now, session_key=session_key or '')
+        for page_id, n in clicks.items() for _ in range(n)])
+
+
+def hour_start(dt):
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(dt):
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def upsert_rollups(model, key_field, counts):
+    """
+    Adds `counts` (`{(key, period, start): views}`) to rollup rows.
+    """
+    for (key, period, start), views in counts.items():
+        lookup = {key_field: key, 'period': period, 'start': start}
+        updated = model.objects.filter(**lookup).update(
+            views=F('views') + views)
+        if not updated:
+            model.objects.create(views=views, **lookup)
+
+
+def rollup(now=None, chunk_size=5000):
+    """
+    Aggregates not yet rolled up events of completed hours.
+    Every chunk is rolled up and marked in one transaction, so events
+    are counted exactly once. Returns number of events rolled up.
+    """
+    cutoff = hour_start(now or timezone.now())
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            pending = ClickEvent.objects.filter(
+                rolled_up=False, created__lt=cutoff).order_by('id')
+            events = list(pending.values_list(
+                'id', 'page_id', 'category_id', 'created')[:chunk_size])
+            if not events:
+                break
+
+            pages = defaultdict(int)
+            categories = defaultdict(int)
+            for event_id, page_id, category_id, created in events:
+                buckets = ((ViewRollup.HOURLY, hour_start(created)),
+                           (ViewRollup.DAILY, day_start(created)))
+                for period, start in buckets:
+                    pages[page_id, period, start] += 1
+                    categories[category_id, period, start] += 1
+
+            upsert_rollups(PageViewRollup, 'page_id', pages)
+            upsert_rollups(CategoryViewRollup, 'category_id', categories)
+
+            ClickEvent.objects.filter(
+                id__gte=events[0][0], id__lte=events[-1][0],
+                rolled_up=False, created__lt=cutoff).update(rolled_up=True)
+
+        total += len(events)
+
+    return total
+
+
+def compact(now=None):
+    """
+    Applies retention policy: deletes rolled up raw events older than
+    RANGO_CLICK_EVENT_RETENTION hours and hourly rollups older than
+    RANGO_HOURLY_ROLLUP_RETENTION days. Daily rollups are kept.
+    Returns `(events, hourly_rollups)` deleted.
+    """
+    now = now or timezone.now()
+    event_retention = datetime.timedelta(
+        hours=getattr(settings, 'RANGO_CLICK_EVENT_RETENTION', 24))
+    hourly_retention = datetime.timedelta(
+        days=getattr(settings, 'RANGO_HOURLY_ROLLUP_RETENTION', 30))
+
+    events = ClickEvent.objects.filter(rolled_up=True,
+                                       created__lt=now - event_retention)
+    events_count = events.count()
+    events.delete()
+
+    hourly_count = 0
+    for model in (PageViewRollup, CategoryViewRollup):
+        hourly = model.objects.filter(period=ViewRollup.HOURLY,
+                                      start__lt=now - hourly_retention)
+        hourly_count += hourly.count()
+        hourly.delete()
+
+    return events_count, hourly_count
+
+
+def views_in_window(start, end, page=None, category=None):
+    """
+    Returns number of views in `[start, end)` (hour precision) of the
+    given page or category, or of all pages. Full days are read from
+    daily rollups, partial days at the edges from hourly ones.
+    """
+    if page is not None:
+        rollups = PageViewRollup.objects.filter(page=page)
+    elif category is not None:
+        rollups = CategoryViewRollup.objects.filter(category=category)
+    else:
+        rollups = PageViewRollup.objects.all()
+
+    start = hour_start(start)
+    end = hour_start(end)
+    if start >= end:
+        return 0
+
+    # First and last midnight within the window.
+    first_day = day_start(start)
+    if first_day < start:
+        first_day += datetime.timedelta(days=1)
+    last_day = day_start(end)
+
+    if first_day >= last_day:
+        spans = [(ViewRollup.HOURLY, start, end)]
+    else:
+        spans = [(ViewRollup.HOURLY, start, first_day),
+                 (ViewRollup.DAILY, first_day, last_day),
+                 (ViewRollup.HOURLY, last_day, end)]
+
+    total = 0
+    for period, span_start, span_end in spans:
+        if span_start < span_end:
+            views = rollups.filter(
+                period=period, start__gte=span_start,
+                start__lt=span_end).aggregate(views=Sum('views'))['views']
+            total += views or 0
+    return total
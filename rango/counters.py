@@ -0,0 +1,66 @@
+"""
+Bulk recomputation of denormalized Category counters.
+"""
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from rango.models import Category, Page
+
+
+def iter_id_chunks(queryset, chunk_size):
+    """
+    Yields lists of ids of `queryset` in ascending order, walking
+    the primary key instead of using OFFSET.
+    """
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last_id).order_by('id')
+                           .values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def repair_category_counters(category_ids=None, chunk_size=500,
+                             using=None):
+    """
+    Recomputes `page_count`, `total_page_views` and `last_activity`
+    with one GROUP BY query per chunk of categories and updates rows
+    that drifted. Returns number of updated categories.
+    """
+    categories = Category.objects.using(using)
+    if category_ids is not None:
+        categories = categories.filter(id__in=category_ids)
+
+    repaired = 0
+    for ids in iter_id_chunks(categories, chunk_size):
+        stats = dict(
+            (row['category'], row) for row in
+            Page.objects.using(using).filter(category__in=ids)
+                        .values('category')
+                        .annotate(count=Count('id'),
+                                  views=Sum('views'),
+                                  last_visit=Max('last_visit'),
+                                  first_visit=Max('first_visit')))
+
+        current = categories.filter(id__in=ids).values_list(
+            'id', 'page_count', 'total_page_views', 'last_activity')
+
+        with transaction.atomic(using=using):
+            for cat_id, count, views, last_activity in current:
+                row = stats.get(cat_id, {})
+                activity = [d for d in (row.get('last_visit'),
+                                        row.get('first_visit')) if d]
+                expected = (row.get('count', 0),
+                            row.get('views') or 0,
+                            max(activity) if activity else None)
+
+                if expected != (count, views, last_activity):
+                    categories.filter(id=cat_id).update(
+                        page_count=expected[0],
+                        total_page_views=expected[1],
+                        last_activity=expected[2])
+                    repaired += 1
+
+    return repaired
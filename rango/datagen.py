@@ -0,0 +1,214 @@
+"""
+Synthetic Rango data for audits and benchmarks.
+
+`populate` spreads pages evenly with uniform views. `generate` builds a
+realistic skewed data set fast enough for millions of pages, see
+`manage.py generate_rango_data`.
+"""
+import random
+from array import array
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.template.defaultfilters import slugify
+from django.utils import timezone
+
+from rango.buffers import clear_buffers
+from rango.canonical import url_hash
+from rango.models import Category, Page
+
+# Zipf exponent of category popularity (share of pages).
+CATEGORY_SKEW = 1.1
+# Pareto shape of page views, 1.16 gives the 80/20 rule.
+VIEWS_SHAPE = 1.16
+VIEWS_SCALE = 20
+MAX_VIEWS = 10 ** 7
+# Mean age of the last visit of a page, and oldest first visit.
+MEAN_VISIT_AGE = 7 * 86400
+MAX_VISIT_AGE = 365 * 86400
+
+PAGE_FIELDS = ('category', 'title', 'url', 'url_hash', 'views',
+               'last_visit', 'first_visit', 'trending', 'link_error',
+               'link_failures')
+
+
+def populate(categories, pages, seed=0, batch_size=1000):
+    """
+    Fills DB with `categories` categories and `pages` pages spread
+    across them. Rows are written with `bulk_create`, bypassing
+    model `save()`.
+    """
+    rnd = random.Random(seed)
+
+    with transaction.atomic():
+        cats = []
+        for i in range(categories):
+            name = 'Category {0}'.format(i)
+            cats.append(Category(name=name, slug=slugify(name),
+                                 views=rnd.randint(0, 1000),
+                                 likes=rnd.randint(0, 100)))
+        # Django sizes INSERT batches within SQLite limits.
+        Category.objects.bulk_create(cats)
+
+        cat_ids = list(Category.objects.values_list('id', flat=True))
+
+        batch = []
+        for i in range(pages):
+            url = 'http://example.com/{0}'.format(i)
+            batch.append(Page(category_id=rnd.choice(cat_ids),
+                              title='Page {0}'.format(i), url=url,
+                              url_hash=url_hash(url),
+                              views=rnd.randint(0, 10000)))
+            if len(batch) == batch_size:
+                Page.objects.bulk_create(batch)
+                batch = []
+        Page.objects.bulk_create(batch)
+
+
+@contextmanager
+def scratch_database(using=DEFAULT_DB_ALIAS):
+    """
+    Runs the block against a freshly migrated throwaway test database,
+    so synthetic data never touches the real one. Writes still buffered
+    for it are dropped at the end.
+    """
+    connection = connections[using]
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                       serialize=False)
+    try:
+        yield connection
+    finally:
+        clear_buffers()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def category_weights(n, rnd):
+    """
+    Returns Zipf popularity weights of `n` categories in random order.
+    """
+    weights = [1.0 / (rank + 1) ** CATEGORY_SKEW for rank in range(n)]
+    rnd.shuffle(weights)
+    return weights
+
+
+def draw_views(rnd):
+    return min(int((rnd.paretovariate(VIEWS_SHAPE) - 1) * VIEWS_SCALE),
+               MAX_VIEWS)
+
+
+def generate(categories, pages, users=0, seed=0, chunk_size=10000,
+             now=None, password='password'):
+    """
+    Fills a database without categories with `categories` categories,
+    `pages` pages and `users` users (`user0`, `user1`, ... sharing
+    `password`). The same `seed` gives the same data.
+
+    Pages go to categories by Zipf popularity, their views follow a
+    Pareto distribution, visit times are recent for most pages and
+    category views and likes follow their pages. Page rows are drawn
+    into compact arrays first, so categories are inserted with correct
+    `page_count`, `total_page_views` and `last_activity`, and then
+    written in chunks of `chunk_size` rows with one `executemany` each,
+    as `bulk_create` spends most of its time compiling SQL per row.
+    Model `save()` is bypassed. Returns ids of the new categories.
+    """
+    if Category.objects.exists():
+        raise ValueError('Generate into a database without categories.')
+    rnd = random.Random(seed)
+    now = now or timezone.now()
+
+    cumulative = []
+    total = 0.0
+    for weight in category_weights(categories, rnd):
+        total += weight
+        cumulative.append(total)
+
+    # Per page: category index, views, seconds since last and first
+    # visit (-1 for never visited).
+    page_cats, views = array('i'), array('i')
+    last_ages, first_ages = array('i'), array('i')
+    page_counts = [0] * categories
+    view_sums = [0] * categories
+    newest = [None] * categories
+    for _ in range(pages):
+        cat = min(bisect(cumulative, rnd.random() * total), categories - 1)
+        page_views = draw_views(rnd)
+        last_age = first_age = -1
+        if page_views:
+            last_age = min(int(rnd.expovariate(1.0 / MEAN_VISIT_AGE)),
+                           MAX_VISIT_AGE)
+            first_age = rnd.randint(last_age, MAX_VISIT_AGE)
+            if newest[cat] is None or last_age < newest[cat]:
+                newest[cat] = last_age
+
+        page_cats.append(cat)
+        views.append(page_views)
+        last_ages.append(last_age)
+        first_ages.append(first_age)
+        page_counts[cat] += 1
+        view_sums[cat] += page_views
+
+    with transaction.atomic():
+        cats = []
+        for i in range(categories):
+            cat_views = int(view_sums[i] * rnd.uniform(0.1, 0.3))
+            cats.append(Category(
+                name='Category {0}'.format(i),
+                slug='category-{0}'.format(i),
+                views=cat_views,
+                likes=int(cat_views * rnd.uniform(0.01, 0.05)),
+                page_count=page_counts[i],
+                total_page_views=view_sums[i],
+                last_activity=(None if newest[i] is None else
+                               now - timedelta(seconds=newest[i]))))
+        Category.objects.bulk_create(cats)
+        slugs = dict(Category.objects.values_list('slug', 'id'))
+        cat_ids = [slugs['category-{0}'.format(i)] for i in range(categories)]
+
+        insert_pages(cat_ids, page_cats, views, last_ages, first_ages, now,
+                     chunk_size)
+
+        if users:
+            # Hashing is slow on purpose, do it once.
+            hashed = make_password(password)
+            User.objects.bulk_create([
+                User(username='user{0}'.format(i),
+                     email='user{0}@example.com'.format(i),
+                     password=hashed, date_joined=now)
+                for i in range(users)])
+
+    return cat_ids
+
+
+def insert_pages(cat_ids, page_cats, views, last_ages, first_ages, now,
+                 chunk_size):
+    connection = connections[router.db_for_write(Page)]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {0} ({1}) VALUES ({2})'.format(
+        quote(Page._meta.db_table),
+        ', '.join(quote(Page._meta.get_field(name).column)
+                  for name in PAGE_FIELDS),
+        ', '.join(['%s'] * len(PAGE_FIELDS)))
+
+    def visit(age):
+        if age < 0:
+            return None
+        return connection.ops.value_to_db_datetime(
+            now - timedelta(seconds=age))
+
+    def row(i):
+        url = 'http://example.com/{0}'.format(i)
+        return (cat_ids[page_cats[i]], 'Page {0}'.format(i), url,
+                url_hash(url), views[i], visit(last_ages[i]),
+                visit(first_ages[i]), 0.0, '', 0)
+
+    cursor = connection.cursor()
+    for start in range(0, len(page_cats), chunk_size):
+        cursor.executemany(sql, [
+            row(i)
+            for i in range(start, min(start + chunk_size, len(page_cats)))])
@@ -0,0 +1,175 @@
+"""
+Duplicate pages, i.e. pages of a category with the same canonical URL
+(see `rango.canonical`).
+
+`find_duplicate` is the index lookup `add_page` and `auto_add_page` do
+before adding a page, `pages_for_url` finds the pages of a URL in all
+categories.
+
+`dedupe` merges duplicates already stored into the oldest page of each
+group: views are summed, visits widened and trending scores combined,
+and clicks, rollups and user histories are moved over before the other
+pages are deleted. `rehash` recomputes stored hashes after the
+canonicalization rules or RANGO_URL_TRACKING_PARAMS changed.
+"""
+from collections import defaultdict
+from functools import reduce
+
+from django.db import connections, router, transaction
+from django.db.models import Count, F
+
+from rango.canonical import url_hash
+from rango.clicklog import upsert_rollups
+from rango.counters import iter_id_chunks
+from rango.history import parse_ids
+from rango.models import (Category, ClickEvent, Page, PageHistory,
+                          PageViewRollup)
+from rango.trending import log_add
+
+
+def pages_for_url(url):
+    return Page.objects.filter(url_hash=url_hash(url))
+
+
+def find_duplicate(category, url):
+    """
+    Returns the oldest page of `category` with the canonical URL of
+    `url`, or None.
+    """
+    return pages_for_url(url).filter(category=category).order_by(
+        'id').first()
+
+
+def duplicate_groups(chunk_size=500):
+    """
+    Yields lists of ids of pages that share category and canonical
+    URL, oldest first.
+    """
+    keys = [(row['category'], row['url_hash']) for row in
+            Page.objects.exclude(url_hash='')
+                        .values('category', 'url_hash')
+                        .annotate(count=Count('id'))
+                        .filter(count__gt=1).order_by()]
+    for start in range(0, len(keys), chunk_size):
+        chunk = set(keys[start:start + chunk_size])
+        groups = defaultdict(list)
+        pages = Page.objects.filter(
+            url_hash__in=set(key[1] for key in chunk)).order_by('id')
+        for page_id, cat_id, hash_ in pages.values_list(
+                'id', 'category_id', 'url_hash'):
+            if (cat_id, hash_) in chunk:
+                groups[cat_id, hash_].append(page_id)
+        for key in sorted(groups):
+            yield groups[key]
+
+
+def merge_pages(page_ids):
+    """
+    Merges pages of `page_ids` into the first one in one transaction.
+    """
+    keep, drop = page_ids[0], page_ids[1:]
+    with transaction.atomic():
+        # The first write takes SQLite's database write lock, so the
+        # pages read below cannot change until commit (other backends
+        # lock the rows with select_for_update).
+        ClickEvent.objects.filter(page__in=drop).update(page=keep)
+        pages = list(Page.objects.select_for_update().filter(
+            id__in=page_ids).values_list(
+                'id', 'category_id', 'views', 'first_visit', 'last_visit',
+                'trending'))
+        cat_id = next(page[1] for page in pages if page[0] == keep)
+        first_visits = [page[3] for page in pages if page[3]]
+        last_visits = [page[4] for page in pages if page[4]]
+        dropped_views = sum(page[2] for page in pages if page[0] != keep)
+
+        Page.objects.filter(id=keep).update(
+            views=F('views') + dropped_views,
+            first_visit=min(first_visits) if first_visits else None,
+            last_visit=max(last_visits) if last_visits else None,
+            trending=reduce(log_add, [page[5] for page in pages]))
+
+        rollups = PageViewRollup.objects.filter(page__in=drop)
+        counts = defaultdict(int)
+        for period, start, views in rollups.values_list('period', 'start',
+                                                        'views'):
+            counts[keep, period, start] += views
+        rollups.delete()
+        upsert_rollups(PageViewRollup, 'page_id', counts)
+
+        # Deleting takes the pages and their views off the category
+        # counters, but the views now count on the kept page.
+        Page.objects.filter(id__in=drop).delete()
+        Category.objects.filter(id=cat_id).update(
+            total_page_views=F('total_page_views') + dropped_views)
+
+
+def merge_histories(merged, chunk_size=500):
+    """
+    Replaces ids of merged pages (`{old id: kept id}`) in user
+    histories. Returns number of updated histories.
+    """
+    updated = 0
+    for ids in iter_id_chunks(PageHistory.objects.all(), chunk_size):
+        for history_id, old in PageHistory.objects.filter(
+                id__in=ids).values_list('id', 'page_ids'):
+            page_ids = []
+            for page_id in parse_ids(old):
+                page_id = merged.get(page_id, page_id)
+                if page_id not in page_ids:
+                    page_ids.append(page_id)
+            new = ','.join(str(i) for i in page_ids)
+            # Conditional, like `rango.history`, so a concurrent visit
+            # is not overwritten; it may keep an old id, which
+            # `get_recent_pages` skips.
+            if new != old and PageHistory.objects.filter(
+                    id=history_id, page_ids=old).update(page_ids=new):
+                updated += 1
+    return updated
+
+
+def dedupe(dry_run=False, log=None):
+    """
+    Merges every group of duplicates into its oldest page. Returns
+    `(groups, deleted pages)`.
+    """
+    groups = deleted = 0
+    merged = {}
+    for page_ids in duplicate_groups():
+        groups += 1
+        deleted += len(page_ids) - 1
+        if log:
+            log(page_ids)
+        if not dry_run:
+            merge_pages(page_ids)
+            merged.update((page_id, page_ids[0]) for page_id in page_ids[1:])
+    if merged:
+        merge_histories(merged)
+    return groups, deleted
+
+
+def rehash(chunk_size=500):
+    """
+    Recomputes `url_hash` of all pages, with one executemany per chunk.
+    Returns number of changed ones.
+    """
+    using = router.db_for_write(Page)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {0} SET {1} = %s WHERE {2} = %s'.format(
+        quote(Page._meta.db_table),
+        quote(Page._meta.get_field('url_hash').column),
+        quote(Page._meta.pk.column))
+
+    changed = 0
+    pages = Page.objects.using(using)
+    for ids in iter_id_chunks(pages.all(), chunk_size):
+        with transaction.atomic(using=using):
+            params = []
+            for page_id, url, old in pages.filter(id__in=ids).values_list(
+                    'id', 'url', 'url_hash'):
+                new = url_hash(url)
+                if new != old:
+                    params.append((new, page_id))
+            connection.cursor().executemany(sql, params)
+            changed += len(params)
+    return changed
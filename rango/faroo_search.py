@@ -1,7 +1,10 @@
 import os
+import time
 import urllib
 import requests
 
+from rango.metrics import record_external
+
 
 def get_key(filename):
     """
@@ -64,6 +67,7 @@ def run_query(search_terms, api_key):
                                            compose_params(params))
 
     # GET and fetch JSON.
+    start = time.time()
     try:
         # `params` is not used since it's incorrectly encodes API key.
         r = requests.get(search_url)
@@ -77,6 +81,9 @@ def run_query(search_terms, api_key):
     else:
         return r.json()
 
+    finally:
+        record_external('faroo', time.time() - start)
+
 
 #
 # Get API key.
@@ -32,7 +32,8 @@ class PageForm(forms.ModelForm):
         # We don't need every field in the model present.
         # Here, we are hiding the foreign key.
         # we can either exclude the category field from the form:
-        exclude = ('category', 'first_visit', 'last_visit', 'views')
+        exclude = ('category', 'first_visit', 'last_visit', 'views',
+                   'trending')
         # or specify the fields to include:
         # fields = ('title', 'url', 'views')
 
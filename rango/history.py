@@ -0,0 +1,82 @@
+"""
+Per-user "recently visited" pages.
+
+Every user has at most one `PageHistory` row holding up to
+RANGO_RECENT_PAGES page ids, most recent first. A revisited page moves
+to the front, the oldest id drops off the end, so a click costs one
+read and one UPDATE of a bounded row however long the user has been
+around. Concurrent clicks of the same user (several tabs) are merged
+with a conditional UPDATE retried on conflict, not overwritten.
+"""
+import logging
+
+from django.conf import settings
+from django.db import router
+
+from rango.models import Page, PageHistory
+
+
+logger = logging.getLogger(__name__)
+
+# Conditional updates retried on concurrent writes before giving up.
+MAX_RETRIES = 10
+
+
+def get_max_pages():
+    return getattr(settings, 'RANGO_RECENT_PAGES', 10)
+
+
+def parse_ids(value):
+    return [int(i) for i in value.split(',') if i]
+
+
+def push_id(page_ids, page_id, size):
+    """
+    Returns `page_ids` with `page_id` moved (or added) to the front,
+    cut to `size` ids.
+    """
+    return ([page_id] + [i for i in page_ids if i != page_id])[:size]
+
+
+def record_visit(user, page):
+    return record_visits(user, [page.id])
+
+
+def record_visits(user, visited_ids):
+    """
+    Adds pages of `visited_ids` (oldest first) to the history of
+    `user`. Returns False if retries ran out.
+    """
+    rows = PageHistory.objects.using(router.db_for_write(PageHistory))
+
+    for _ in range(MAX_RETRIES):
+        old = rows.filter(user=user).values_list('page_ids',
+                                                 flat=True).first()
+        if old is None:
+            # First visit ever; a concurrent create makes this a get.
+            old = rows.get_or_create(user=user)[0].page_ids
+
+        page_ids = parse_ids(old)
+        for page_id in visited_ids:
+            page_ids = push_id(page_ids, page_id, get_max_pages())
+        new = ','.join(str(i) for i in page_ids)
+        if new == old or rows.filter(user=user, page_ids=old).update(
+                page_ids=new):
+            return True
+
+    logger.warning('Gave up updating page history of user %s.', user.pk)
+    return False
+
+
+def get_recent_pages(user):
+    """
+    Returns recently visited pages of `user` that still exist.
+    """
+    page_ids = PageHistory.objects.filter(user=user).values_list(
+        'page_ids', flat=True).first()
+    if not page_ids:
+        return []
+
+    page_ids = parse_ids(page_ids)
+    pages = Page.objects.select_related('category').in_bulk(page_ids)
+    return [pages[i] for i in page_ids if i in pages]
@@ -0,0 +1,527 @@
+"""
+Bulk import of pages, behind `manage.py import_pages` and the
+`api/pages/import/` endpoint.
+
+Rows are dicts with `category` (name), `title`, `url` and optionally
+`views`, `first_visit` and `last_visit` (ISO 8601, naive times are in
+TIME_ZONE). They are imported in batches, each in one transaction:
+
+* Fields are validated row by row, rows with errors are rejected.
+* The visit rules of `Page.save` (no visit in the future, no first
+  visit after the last) are applied to NumPy arrays of the batch, for
+  existing pages to the given visits merged with the stored ones.
+* A row whose category already has a page with that title updates the
+  page with the fields it gives, the other rows are written with
+  `bulk_create`. Within a batch the last row of a page wins.
+* Updates and category counter changes are written with executemany,
+  one statement per set of given fields.
+
+Rejected rows and cleaned fields are reported per batch to the
+`rango.ingest` logger.
+
+`import_file` splits a file into batches of raw records and can parse,
+validate and clean them in a pool of worker processes, which never
+touch the database; this process stays the single writer, in file
+order. Parsing is then no longer the limit, writes are (see
+`manage.py bench_import`).
+
+Requires NumPy.
+"""
+import csv
+import json
+import logging
+from collections import Counter, OrderedDict, defaultdict, deque, namedtuple
+from datetime import datetime, time
+from multiprocessing import Pool
+
+import numpy as np
+
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.utils import six, timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.encoding import force_text
+
+from rango.canonical import url_hash
+from rango.models import Category, Page, validate_page_url
+
+
+logger = logging.getLogger(__name__)
+
+VISIT_FIELDS = ('first_visit', 'last_visit')
+
+TITLE_LENGTH = Page._meta.get_field('title').max_length
+URL_LENGTH = Page._meta.get_field('url').max_length
+
+# Keeps IN lists below SQLite's limit of 999 variables.
+LOOKUP_CHUNK = 500
+
+# Rejected rows kept in an ImportResult, and quoted per logged batch.
+MAX_ERRORS = 100
+LOGGED_ERRORS = 5
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def csv_row(header, values):
+    """
+    Returns row of CSV `values` under `header`. Empty cells are left
+    out, as if the column was missing.
+    """
+    return dict((force_text(key), force_text(value))
+                for key, value in zip(header, values) if key and value)
+
+
+def json_row(line):
+    """
+    Returns row of a JSON line, or `None` if it does not parse, which
+    gets rejected as a row.
+    """
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def iter_records(stream, format):
+    """
+    Returns `(header, records)` of a CSV (`format` 'csv') or JSON-lines
+    file. CSV records are split by the csv module, as fields may span
+    lines, JSON lines are passed on as text. Blank lines are skipped.
+    """
+    if format == 'csv':
+        reader = csv.reader(stream)
+        return next(reader, []), (values for values in reader if values)
+    return None, (line for line in stream if line.strip())
+
+
+def parse_record(format, header, record):
+    if format == 'csv':
+        return csv_row(header, record)
+    return json_row(record)
+
+
+def read_csv(stream):
+    """
+    Yields rows of a CSV file with a header line.
+    """
+    header, records = iter_records(stream, 'csv')
+    for values in records:
+        yield csv_row(header, values)
+
+
+def read_ndjson(stream):
+    """
+    Yields rows of a JSON-lines file.
+    """
+    for line in iter_records(stream, 'ndjson')[1]:
+        yield json_row(line)
+
+
+def parse_visit(value):
+    """
+    Returns aware datetime of an ISO 8601 date or date and time,
+    raises ValueError if it is malformed.
+    """
+    if value is None or isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, six.string_types):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(value)
+            parsed = datetime.combine(day, time())
+    else:
+        raise ValueError(value)
+
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed,
+                                     timezone.get_default_timezone())
+    return parsed
+
+
+def clean_row(row):
+    """
+    Returns page field values of `row` (and its category name), raises
+    ValueError naming the first field that is missing or invalid.
+    """
+    if not isinstance(row, dict):
+        raise ValueError('not an object')
+
+    fields = {}
+    for name in ('category', 'title', 'url'):
+        value = row.get(name)
+        if not isinstance(value, six.string_types) or not value.strip():
+            raise ValueError('missing {0}'.format(name))
+        fields[name] = value.strip()
+
+    if len(fields['title']) > TITLE_LENGTH:
+        raise ValueError('title longer than {0} characters'.format(
+            TITLE_LENGTH))
+    try:
+        if len(fields['url']) > URL_LENGTH:
+            raise ValidationError('too long')
+        validate_page_url(fields['url'])
+    except ValidationError:
+        raise ValueError('invalid url')
+    fields['url_hash'] = url_hash(fields['url'])
+
+    if row.get('views') is not None:
+        try:
+            fields['views'] = int(row['views'])
+        except (TypeError, ValueError):
+            raise ValueError('invalid views')
+        if fields['views'] < 0:
+            raise ValueError('negative views')
+
+    for name in VISIT_FIELDS:
+        if name in row:
+            try:
+                fields[name] = parse_visit(row[name])
+            except ValueError:
+                raise ValueError('invalid {0}'.format(name))
+    return fields
+
+
+def to_seconds(values):
+    """
+    Returns array of Unix times of aware datetimes, NaN for None.
+    """
+    return np.array([(value - EPOCH).total_seconds() if value else np.nan
+                     for value in values], dtype=np.float64)
+
+
+def clean_visits(rows, now):
+    """
+    Applies the visit rules of `Page.save` to the fields of `rows` in
+    place: visits after `now`, and then a first visit after the last,
+    are set to None. Returns Counter of changes by reason.
+    """
+    cleaned = Counter()
+    if not rows:
+        return cleaned
+
+    first = to_seconds([row.get('first_visit') for row in rows])
+    last = to_seconds([row.get('last_visit') for row in rows])
+    limit = (now - EPOCH).total_seconds()
+
+    # Comparisons with NaN, i.e. without a visit, are false.
+    with np.errstate(invalid='ignore'):
+        future_last = last > limit
+        future_first = first > limit
+        last[future_last] = np.nan
+        first[future_first] = np.nan
+        reversed_visits = first > last
+
+    for mask, name, reason in (
+            (future_last, 'last_visit', 'last_visit in the future'),
+            (future_first, 'first_visit', 'first_visit in the future'),
+            (reversed_visits, 'first_visit', 'first_visit after last_visit')):
+        for i in np.flatnonzero(mask):
+            rows[i][name] = None
+        if mask.any():
+            cleaned[reason] = int(mask.sum())
+    return cleaned
+
+
+Prepared = namedtuple('Prepared', 'first last rows errors cleaned')
+
+
+class ImportResult(object):
+    """
+    Counts of an import, with the first MAX_ERRORS rejected rows as
+    `(row number, error)`.
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.rejected = 0
+        self.cleaned = Counter()
+        self.errors = []
+
+    def reject(self, errors):
+        self.rejected += len(errors)
+        self.errors.extend(errors[:MAX_ERRORS - len(self.errors)])
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'rejected': self.rejected,
+            'cleaned': dict(self.cleaned),
+            'errors': [{'row': number, 'error': error}
+                       for number, error in self.errors],
+        }
+
+
+def import_pages(rows, batch_size=500, now=None):
+    """
+    Imports pages from iterable of `rows` in batches of `batch_size`.
+    Rows are numbered from 1 in errors. Returns ImportResult.
+    """
+    result = ImportResult()
+    batch = []
+    for number, row in enumerate(rows, 1):
+        batch.append((number, row))
+        if len(batch) >= batch_size:
+            import_batch(batch, result, now)
+            batch = []
+    if batch:
+        import_batch(batch, result, now)
+    return result
+
+
+def prepare_batch(batch, now):
+    """
+    Validates `[(row number, row)]` and applies the visit rules without
+    touching the database, so it can run in a worker process. Returns
+    Prepared with `[(row number, fields)]` of the valid rows.
+    """
+    errors = []
+    valid = []
+    for number, row in batch:
+        try:
+            valid.append((number, clean_row(row)))
+        except ValueError as e:
+            errors.append((number, str(e)))
+    cleaned = clean_visits([fields for _, fields in valid], now)
+    return Prepared(batch[0][0], batch[-1][0], valid, errors, cleaned)
+
+
+def import_batch(batch, result, now=None):
+    """
+    Imports `[(row number, row)]` in one transaction and adds the
+    outcome to `result`.
+    """
+    if now is None:
+        now = timezone.now()
+    write_batch(prepare_batch(batch, now), result, now)
+
+
+def write_batch(prepared, result, now):
+    """
+    Writes a Prepared batch in one transaction and adds the outcome to
+    `result`.
+    """
+    errors = list(prepared.errors)
+    categories = get_category_ids(
+        set(fields['category'] for _, fields in prepared.rows))
+
+    # (category id, title) -> fields, the last row of a page wins.
+    pages = OrderedDict()
+    cleaned = Counter(prepared.cleaned)
+    for number, fields in prepared.rows:
+        cat_id = categories.get(fields.pop('category'))
+        if cat_id is None:
+            errors.append((number, 'unknown category'))
+            continue
+        key = (cat_id, fields['title'])
+        if key in pages:
+            cleaned['superseded by a later row'] += 1
+        pages[key] = fields
+
+    existing = get_existing_pages(pages)
+    # A visit given for an existing page must agree with the stored one
+    # it leaves in place, so both are written once cleaned together.
+    merged = []
+    for key, fields in pages.items():
+        if key in existing and any(name in fields for name in VISIT_FIELDS):
+            stored = dict(zip(VISIT_FIELDS, existing[key][2:]))
+            for name in VISIT_FIELDS:
+                fields.setdefault(name, stored[name])
+            merged.append(fields)
+    cleaned.update(clean_visits(merged, now))
+
+    counters = defaultdict(lambda: [0, 0, None])
+    new_pages = []
+    updates = []
+    for key, fields in pages.items():
+        cat_id = key[0]
+        if key in existing:
+            page_id, views = existing[key][:2]
+            updates.append((page_id, fields))
+            counters[cat_id][1] += fields.get('views', views) - views
+        else:
+            new_pages.append(Page(category_id=cat_id, **fields))
+            counters[cat_id][0] += 1
+            counters[cat_id][1] += fields.get('views', 0)
+        visit = fields.get('last_visit') or fields.get('first_visit')
+        if visit and (counters[cat_id][2] is None or
+                      visit > counters[cat_id][2]):
+            counters[cat_id][2] = visit
+
+    using = router.db_for_write(Page)
+    with transaction.atomic(using=using):
+        Page.objects.using(using).bulk_create(new_pages)
+        update_pages(connections[using], updates)
+        update_counters(connections[using], counters)
+
+    errors.sort()
+    result.created += len(new_pages)
+    result.updated += len(pages) - len(new_pages)
+    result.cleaned.update(cleaned)
+    result.reject(errors)
+
+    rows = 'Rows {0}-{1}'.format(prepared.first, prepared.last)
+    if errors:
+        logger.warning('%s: rejected %d: %s%s', rows, len(errors),
+                       '; '.join('row {0}: {1}'.format(*error)
+                                 for error in errors[:LOGGED_ERRORS]),
+                       '; ...' if len(errors) > LOGGED_ERRORS else '')
+    if cleaned:
+        logger.warning('%s: cleaned %s.', rows, ', '.join(
+            '{0} {1}'.format(count, reason)
+            for reason, count in sorted(cleaned.items())))
+    logger.info('%s: %d created, %d updated.', rows, len(new_pages),
+                len(pages) - len(new_pages))
+
+
+def prepare_chunk(args):
+    """
+    Pool task: parses and prepares `[(row number, raw record)]`.
+    """
+    format, header, records, now = args
+    return prepare_batch([(number, parse_record(format, header, record))
+                          for number, record in records], now)
+
+
+def iter_chunks(records, chunk_size):
+    """
+    Yields lists of `(row number, record)`, numbered from 1.
+    """
+    chunk = []
+    for number, record in enumerate(records, 1):
+        chunk.append((number, record))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def prepare_file(stream, format, batch_size=500, workers=1, now=None):
+    """
+    Yields Prepared batches of a CSV or JSON-lines file in order. With
+    more than one worker, batches are parsed and prepared in a process
+    pool, with up to two per worker in flight so memory stays flat.
+    """
+    if now is None:
+        now = timezone.now()
+    header, records = iter_records(stream, format)
+    chunks = ((format, header, chunk, now)
+              for chunk in iter_chunks(records, batch_size))
+
+    if workers <= 1:
+        for args in chunks:
+            yield prepare_chunk(args)
+        return
+
+    # Workers do not touch the database, forking with open
+    # connections is fine.
+    pool = Pool(workers)
+    try:
+        pending = deque()
+        for args in chunks:
+            pending.append(pool.apply_async(prepare_chunk, (args,)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def import_file(stream, format, batch_size=500, workers=1, now=None):
+    """
+    Imports a CSV or JSON-lines file, preparing batches in `workers`
+    processes while this one writes them. Returns ImportResult.
+    """
+    if now is None:
+        now = timezone.now()
+    result = ImportResult()
+    for prepared in prepare_file(stream, format, batch_size, workers, now):
+        write_batch(prepared, result, now)
+    return result
+
+
+def update_pages(connection, updates):
+    """
+    Sets fields of pages from `[(page id, fields)]`, with one
+    executemany per set of fields.
+    """
+    groups = defaultdict(list)
+    for page_id, fields in updates:
+        names = tuple(sorted(fields))
+        groups[names].append(
+            [Page._meta.get_field(name).get_db_prep_save(fields[name],
+                                                         connection)
+             for name in names] + [page_id])
+
+    quote = connection.ops.quote_name
+    cursor = connection.cursor()
+    for names, params in groups.items():
+        cursor.executemany('UPDATE {0} SET {1} WHERE {2} = %s'.format(
+            quote(Page._meta.db_table),
+            ', '.join('{0} = %s'.format(
+                quote(Page._meta.get_field(name).column)) for name in names),
+            quote(Page._meta.pk.column)), params)
+
+
+def update_counters(connection, counters):
+    """
+    Adds `{category id: [pages, views, latest visit]}` to category
+    counters and moves last activity forward to the latest visit, in
+    one executemany.
+    """
+    quote = connection.ops.quote_name
+    last_activity = quote('last_activity')
+    sql = ('UPDATE {0} SET {1} = {1} + %s, {2} = {2} + %s, '
+           '{3} = CASE WHEN %s IS NOT NULL AND ({3} IS NULL OR {3} < %s) '
+           'THEN %s ELSE {3} END WHERE {4} = %s').format(
+               quote(Category._meta.db_table), quote('page_count'),
+               quote('total_page_views'), last_activity,
+               quote(Category._meta.pk.column))
+    field = Category._meta.get_field('last_activity')
+    params = []
+    for cat_id, (pages, views, visit) in counters.items():
+        if pages or views or visit:
+            visit = field.get_db_prep_save(visit, connection)
+            params.append((pages, views, visit, visit, visit, cat_id))
+    connection.cursor().executemany(sql, params)
+
+
+def get_category_ids(names):
+    """
+    Returns `{name: id}` of the categories with those names.
+    """
+    names = list(names)
+    ids = {}
+    for start in range(0, len(names), LOOKUP_CHUNK):
+        ids.update(Category.objects.filter(
+            name__in=names[start:start + LOOKUP_CHUNK]).values_list(
+                'name', 'id'))
+    return ids
+
+
+def get_existing_pages(keys):
+    """
+    Returns `{(category id, title): (page id, views, visits...)}` of
+    the pages among `keys` that exist, the oldest of duplicates, with
+    visits in VISIT_FIELDS order.
+    """
+    titles = list(set(title for _, title in keys))
+    existing = {}
+    for start in range(0, len(titles), LOOKUP_CHUNK):
+        # Uses the (title, category) index.
+        pages = Page.objects.filter(
+            title__in=titles[start:start + LOOKUP_CHUNK]).order_by('id')
+        for row in pages.values_list('id', 'category_id', 'title', 'views',
+                                     *VISIT_FIELDS):
+            page_id, cat_id, title = row[:3]
+            if (cat_id, title) in keys:
+                existing.setdefault((cat_id, title),
+                                    (page_id,) + tuple(row[3:]))
+    return existing
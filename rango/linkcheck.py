@@ -0,0 +1,416 @@
+"""
+Health checks of page URLs, behind `manage.py check_links`.
+
+Run the command from cron: it checks pages that are due, i.e. never
+checked or past `link_next_check`, and stores status, error and the
+next check on the page. Working links are checked again after
+RANGO_LINK_CHECK_INTERVAL, broken ones (no answer or status >= 400)
+after RANGO_LINK_CHECK_RETRY, doubling per consecutive failure up to
+the interval.
+
+Requests are sent from a pool of worker threads, at most
+RANGO_LINK_CHECK_PER_HOST at once per host. Each link gets a HEAD
+request, and a GET (body not read) if HEAD fails or gets no answer, as
+some servers reject or mishandle HEAD. Only the calling thread reads and
+writes the database: pages are loaded in primary key chunks,
+interleaved by host so workers rarely wait for the same host, and
+results saved in one transaction per chunk.
+
+Only http(s) URLs of hosts that resolve to public addresses are
+requested, checked again at each redirect, so page URLs cannot make the
+checker probe internal services. Connections go to the address that
+was checked rather than resolving the host again, which a host could
+answer with another address. RANGO_LINK_CHECK_ALLOW_PRIVATE lifts the
+address check, e.g. for a site on a private network.
+"""
+import binascii
+import logging
+import socket
+import threading
+import time
+from collections import Counter, OrderedDict, deque, namedtuple
+from datetime import timedelta
+from itertools import islice
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import reset_queries, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.six.moves import queue
+from django.utils.six.moves.urllib.parse import urljoin, urlsplit
+
+from rango.models import Page
+
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Rango link checker'
+
+Result = namedtuple('Result', 'page_id status error failures')
+
+# Private, loopback, link-local, shared, documentation, multicast and
+# reserved networks, which link checks never connect to.
+BLOCKED_NETWORKS = (
+    '0.0.0.0/8', '10.0.0.0/8', '100.64.0.0/10', '127.0.0.0/8',
+    '169.254.0.0/16', '172.16.0.0/12', '192.0.0.0/24', '192.0.2.0/24',
+    '192.168.0.0/16', '198.18.0.0/15', '198.51.100.0/24',
+    '203.0.113.0/24', '224.0.0.0/4', '240.0.0.0/4',
+    '::/128', '::1/128', '::ffff:0:0/96', '64:ff9b::/96', '100::/64',
+    '2001:db8::/32', 'fc00::/7', 'fe80::/10', 'ff00::/8',
+)
+
+
+def get_timeout():
+    return getattr(settings, 'RANGO_LINK_CHECK_TIMEOUT', 10)
+
+
+def get_per_host():
+    return getattr(settings, 'RANGO_LINK_CHECK_PER_HOST', 2)
+
+
+def get_interval():
+    return getattr(settings, 'RANGO_LINK_CHECK_INTERVAL', 7 * 86400)
+
+
+def get_retry():
+    return getattr(settings, 'RANGO_LINK_CHECK_RETRY', 3600)
+
+
+def get_allow_private():
+    return getattr(settings, 'RANGO_LINK_CHECK_ALLOW_PRIVATE', False)
+
+
+def get_host(url):
+    return urlsplit(url).netloc.lower()
+
+
+def is_broken(status):
+    return status is None or status >= 400
+
+
+def next_check(now, failures):
+    """
+    Returns when to check a link again after `failures` consecutive
+    failed checks.
+    """
+    seconds = get_interval()
+    if failures:
+        seconds = min(get_retry() * 2 ** min(failures - 1, 30), seconds)
+    return now + timedelta(seconds=seconds)
+
+
+def address_to_int(family, address):
+    return int(binascii.hexlify(socket.inet_pton(family, address)), 16)
+
+
+def parse_networks(networks):
+    """
+    Returns `(family, network >> shift, shift)` of CIDR `networks`.
+    """
+    result = []
+    for network in networks:
+        address, prefix = network.split('/')
+        family, bits = ((socket.AF_INET6, 128) if ':' in address
+                        else (socket.AF_INET, 32))
+        shift = bits - int(prefix)
+        result.append((family, address_to_int(family, address) >> shift,
+                       shift))
+    return result
+
+
+blocked_networks = parse_networks(BLOCKED_NETWORKS)
+
+
+def is_public_address(address):
+    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+    value = address_to_int(family, address)
+    return not any(value >> shift == network
+                   for network_family, network, shift in blocked_networks
+                   if network_family == family)
+
+
+def get_addresses(host):
+    """
+    Returns the IP addresses `host` resolves to, without IPv6 scopes.
+    """
+    return [info[4][0].partition('%')[0]
+            for info in socket.getaddrinfo(host, None)]
+
+
+class RefusedURL(Exception):
+    """
+    URL the checker does not request, the message is the error stored.
+    """
+
+
+def check_target(url):
+    """
+    Returns the address to connect to for `url`. Raises RefusedURL
+    unless it is an http(s) URL of a host that resolves to public
+    addresses only.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise RefusedURL('invalid URL')
+    try:
+        addresses = get_addresses(parts.hostname)
+    except UnicodeError:
+        raise RefusedURL('invalid URL')
+    except socket.error:
+        raise RefusedURL('connection failed')
+    if not get_allow_private() and not all(
+            is_public_address(address) for address in addresses):
+        raise RefusedURL('private address')
+    return addresses[0]
+
+
+def get_host_header(url):
+    parts = urlsplit(url)
+    host = parts.hostname
+    if ':' in host:
+        host = '[{0}]'.format(host)
+    if parts.port is not None:
+        host = '{0}:{1}'.format(host, parts.port)
+    return host
+
+
+class CheckedAdapter(HTTPAdapter):
+    """
+    Transport adapter connecting to the address `check_target` returns
+    for each request, keeping the URL's host in the Host header and,
+    for https, in SNI and certificate matching. Proxies are not used.
+    """
+
+    def send(self, request, **kwargs):
+        request.headers['Host'] = get_host_header(request.url)
+        return super(CheckedAdapter, self).send(request, **kwargs)
+
+    def get_connection(self, url, proxies=None):
+        address = check_target(url)
+        parts = urlsplit(url)
+        pool_kwargs = {}
+        if parts.scheme == 'https':
+            pool_kwargs = {'server_hostname': parts.hostname,
+                           'assert_hostname': parts.hostname}
+        return self.poolmanager.connection_from_host(
+            address, parts.port or (443 if parts.scheme == 'https' else 80),
+            parts.scheme, pool_kwargs=pool_kwargs)
+
+
+def new_session():
+    """
+    Returns a session sending requests through `CheckedAdapter`.
+    """
+    session = requests.Session()
+    session.trust_env = False
+    session.headers['User-Agent'] = USER_AGENT
+    session.mount('http://', CheckedAdapter())
+    session.mount('https://', CheckedAdapter())
+    return session
+
+
+def fetch(session, method, url, timeout):
+    """
+    Sends a `method` request to `url` and follows redirects one at a
+    time, so `session` (from `new_session`) checks every URL. Returns
+    the last response, closed without reading the body.
+    """
+    for _ in range(session.max_redirects + 1):
+        response = session.request(method, url, timeout=timeout,
+                                   allow_redirects=False, stream=True)
+        response.close()
+        location = session.get_redirect_target(response)
+        if location is None:
+            return response
+        url = urljoin(url, location)
+    raise requests.TooManyRedirects()
+
+
+def check_url(session, url, timeout):
+    """
+    Returns `(status, error)` of `url`, following redirects. Status is
+    None if there was no answer or the URL was refused.
+    """
+    try:
+        try:
+            response = fetch(session, 'HEAD', url, timeout)
+            if not is_broken(response.status_code):
+                return response.status_code, ''
+        except requests.RequestException:
+            # Some servers drop or time out on HEAD, GET decides.
+            pass
+        return fetch(session, 'GET', url, timeout).status_code, ''
+    except RefusedURL as e:
+        return None, str(e)
+    except requests.Timeout:
+        return None, 'timeout'
+    except requests.TooManyRedirects:
+        return None, 'too many redirects'
+    except (requests.exceptions.MissingSchema,
+            requests.exceptions.InvalidSchema,
+            requests.exceptions.InvalidURL):
+        return None, 'invalid URL'
+    except requests.ConnectionError:
+        return None, 'connection failed'
+
+
+class HostLimits(object):
+    """
+    Thread-safe semaphores limiting requests in flight per host.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.semaphores = {}
+
+    def get(self, host):
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(
+                    self.limit)
+            return self.semaphores[host]
+
+
+class CheckStats(object):
+    """
+    Checked and broken links and counts per status (or error).
+    """
+
+    def __init__(self):
+        self.checked = self.broken = 0
+        self.statuses = Counter()
+        self.started = self.finished = time.time()
+
+    def add(self, result):
+        self.checked += 1
+        if is_broken(result.status):
+            self.broken += 1
+        self.statuses[result.status or result.error] += 1
+
+    @property
+    def seconds(self):
+        return self.finished - self.started
+
+    @property
+    def rate(self):
+        return self.checked / max(self.seconds, 1e-6)
+
+
+def due_pages(now=None, check_all=False, chunk_size=500):
+    """
+    Yields `(id, url, link_failures)` of pages due for a check (all
+    pages with `check_all`) in id order, one query per chunk.
+    """
+    pages = Page.objects.all()
+    if not check_all:
+        pages = pages.filter(Q(link_next_check__isnull=True) |
+                             Q(link_next_check__lte=now or timezone.now()))
+    last_id = 0
+    while True:
+        rows = list(pages.filter(id__gt=last_id).order_by('id').values_list(
+            'id', 'url', 'link_failures')[:chunk_size])
+        if not rows:
+            return
+        for row in rows:
+            yield row
+        last_id = rows[-1][0]
+
+
+def interleave(rows):
+    """
+    Returns `rows` reordered round-robin by host.
+    """
+    hosts = OrderedDict()
+    for row in rows:
+        hosts.setdefault(get_host(row[1]), deque()).append(row)
+    result = []
+    while hosts:
+        for host in list(hosts):
+            result.append(hosts[host].popleft())
+            if not hosts[host]:
+                del hosts[host]
+    return result
+
+
+def save_results(results):
+    now = timezone.now()
+    with transaction.atomic():
+        for result in results:
+            Page.objects.filter(id=result.page_id).update(
+                link_status=result.status, link_error=result.error,
+                link_checked=now, link_failures=result.failures,
+                link_next_check=next_check(now, result.failures))
+    # With DEBUG on, the query log would keep every chunk's SQL.
+    reset_queries()
+
+
+def check_links(pages, workers=16, per_host=None, timeout=None,
+                chunk_size=500):
+    """
+    Checks `pages` (`(id, url, link_failures)`, e.g. from `due_pages`)
+    from `workers` threads, saves the results and returns `CheckStats`.
+    """
+    per_host = per_host or get_per_host()
+    timeout = timeout or get_timeout()
+    limits = HostLimits(per_host)
+    pending = queue.Queue()
+    done = queue.Queue()
+    local = threading.local()
+
+    def work():
+        while True:
+            row = pending.get()
+            if row is None:
+                return
+            page_id, url, failures = row
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = new_session()
+            try:
+                with limits.get(get_host(url)):
+                    status, error = check_url(session, url, timeout)
+            except Exception:
+                logger.exception('Check of %s failed.', url)
+                status, error = None, 'check failed'
+            failures = failures + 1 if is_broken(status) else 0
+            done.put(Result(page_id, status, error, failures))
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    stats = CheckStats()
+    pages = iter(pages)
+    in_flight = 0
+    results = []
+    try:
+        while True:
+            # Queue the next chunk before workers run dry, so they
+            # keep going while results are saved.
+            if in_flight <= chunk_size:
+                rows = interleave(islice(pages, chunk_size))
+                for row in rows:
+                    pending.put(row)
+                in_flight += len(rows)
+            if not in_flight:
+                break
+
+            result = done.get()
+            in_flight -= 1
+            stats.add(result)
+            results.append(result)
+            if len(results) >= chunk_size:
+                save_results(results)
+                results = []
+        save_results(results)
+    finally:
+        for _ in threads:
+            pending.put(None)
+    for thread in threads:
+        thread.join()
+    stats.finished = time.time()
+    return stats
@@ -0,0 +1,87 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rango.requestlog import (METRICS, LogAnalysis, find_regressions,
+                              format_header, format_row, iter_records,
+                              parse_time)
+
+
+class Command(BaseCommand):
+    args = '<log file> [<log file> ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--metric', action='store', dest='metric',
+                    type='choice', choices=METRICS, default='total',
+                    help='Seconds to analyze: {0} (default: total).'.format(
+                        ', '.join(METRICS))),
+        make_option('--hourly', action='store_true', dest='hourly',
+                    default=False,
+                    help='Also print percentiles per view and hour.'),
+        make_option('--baseline', action='store', dest='baseline',
+                    nargs=2, default=None, metavar='FROM TO',
+                    help='Window to compare against, UTC times like '
+                         '2015-06-01T14.'),
+        make_option('--window', action='store', dest='window',
+                    nargs=2, default=None, metavar='FROM TO',
+                    help='Window checked for regressions.'),
+        make_option('--threshold', action='store', dest='threshold',
+                    type='float', default=1.2,
+                    help='Slowdown of a percentile flagged as regression.'),
+        make_option('--percentile', action='store', dest='percentile',
+                    type='float', default=95,
+                    help='Percentile compared between windows.'),
+        make_option('--min-count', action='store', dest='min_count',
+                    type='int', default=20,
+                    help='Requests a view needs in both windows.'),
+    )
+    help = ('Computes latency percentiles per view (and hour) from '
+            'JSON-lines request logs, "-" reads stdin, .gz files are '
+            'unpacked. With --baseline and --window, flags views that '
+            'got slower.')
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError('Give at least one log file.')
+        if bool(options['baseline']) != bool(options['window']):
+            raise CommandError('--baseline and --window go together.')
+
+        windows = {}
+        try:
+            for name in ('baseline', 'window'):
+                if options[name]:
+                    windows[name] = tuple(parse_time(value)
+                                          for value in options[name])
+        except ValueError as err:
+            raise CommandError(err)
+
+        analysis = LogAnalysis(options['metric'], windows,
+                               options['hourly']).add_all(iter_records(args))
+
+        self.stdout.write('{0} requests, {1} seconds'.format(
+            analysis.records, options['metric']))
+        header = format_header()
+        self.stdout.write(header)
+        for view, hist in sorted(analysis.views.items()):
+            self.stdout.write(format_row(view, hist.summary()))
+
+        if options['hourly']:
+            self.stdout.write('')
+            self.stdout.write(header)
+            for (view, hour), hist in sorted(analysis.hourly.items()):
+                self.stdout.write(format_row(
+                    '{0} @ {1:%Y-%m-%d %H}h'.format(view, hour),
+                    hist.summary()))
+
+        if windows:
+            q = options['percentile']
+            regressions = find_regressions(
+                analysis.windowed['baseline'], analysis.windowed['window'],
+                options['threshold'], options['min_count'], q)
+            self.stdout.write('')
+            if not regressions:
+                self.stdout.write('No regressions of p{0:g}.'.format(q))
+            for view, before, after in regressions:
+                self.stdout.write(
+                    'REGRESSION {0}: p{1:g} {2:.4f}s -> {3:.4f}s '
+                    '(x{4:.2f})'.format(view, q, before, after,
+                                        after / max(before, 1e-6)))
@@ -0,0 +1,65 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from rango import datagen
+from rango.query_audit import audit
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--scale', action='store', dest='scale', type='int',
+                    default=0,
+                    help='Audit a throwaway database seeded with SCALE '
+                         'synthetic pages instead of the real one.'),
+        make_option('--analyze', action='store_true', dest='analyze',
+                    default=False,
+                    help='Run ANALYZE before auditing (implied by --scale).'),
+        make_option('--fail', action='store_true', dest='fail',
+                    default=False,
+                    help='Exit with error if any hot query scans or sorts '
+                         'through a temporary B-tree.'),
+    )
+    help = ('Runs EXPLAIN QUERY PLAN for every query issued by Rango views '
+            'and API and reports full scans and temporary sorts.')
+
+    def handle_noargs(self, **options):
+        scale = options.get('scale')
+        verbosity = int(options.get('verbosity'))
+
+        if scale > 0:
+            with datagen.scratch_database() as connection:
+                datagen.populate(max(scale // 100, 1), scale)
+                results = self.run_audit(connection, True)
+        else:
+            connection = connections[DEFAULT_DB_ALIAS]
+            results = self.run_audit(connection, options.get('analyze'))
+
+        problems = []
+        for query, plan, query_problems in results:
+            status = 'FAIL' if query_problems else 'ok'
+            self.stdout.write('{0:<4} {1}'.format(status, query.name))
+
+            if verbosity > 1 or query_problems:
+                for detail in plan:
+                    self.stdout.write('       ' + detail)
+            if query.allow_scan and verbosity > 1:
+                self.stdout.write('       (scan allowed: {0})'.format(
+                    query.allow_scan))
+
+            problems.extend(query_problems)
+
+        if problems and options.get('fail'):
+            raise CommandError('{0} hot query problem(s): {1}'.format(
+                len(problems),
+                ', '.join('{0} ({1})'.format(p.query, p.kind)
+                          for p in problems)))
+
+    def run_audit(self, connection, analyze):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Query audit supports SQLite only.')
+
+        if analyze:
+            connection.cursor().execute('ANALYZE')
+        return audit()
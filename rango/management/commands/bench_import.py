@@ -0,0 +1,99 @@
+import json
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand, CommandError
+from django.utils import timezone
+
+from rango import datagen, ingest
+
+
+def write_rows(output, rows, categories, seed=0):
+    """
+    Writes `rows` synthetic pages of existing `datagen` categories as
+    JSON lines, with some invalid rows and future visits.
+    """
+    rnd = random.Random(seed)
+    now = timezone.now()
+    for i in range(rows):
+        last = now - timedelta(seconds=rnd.randint(-3600, 90 * 86400))
+        row = {
+            'category': 'Category {0}'.format(rnd.randrange(categories)),
+            'title': 'Imported page {0}'.format(i),
+            'url': 'http://example.com/imported/{0}'.format(i),
+            'views': datagen.draw_views(rnd),
+            'first_visit': (last - timedelta(days=rnd.randint(0, 30)))
+            .isoformat(),
+            'last_visit': last.isoformat(),
+        }
+        if rnd.random() < 0.01:
+            row['url'] = 'not a url'
+        output.write(json.dumps(row) + '\n')
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--rows', action='store', dest='rows', type='int',
+                    default=100000,
+                    help='Number of synthetic rows.'),
+        make_option('--workers', action='store', dest='workers',
+                    default='1,2,4',
+                    help='Comma separated numbers of worker processes.'),
+        make_option('--batch-size', action='store', dest='batch_size',
+                    type='int', default=500,
+                    help='Rows per batch.'),
+        make_option('--categories', action='store', dest='categories',
+                    type='int', default=100,
+                    help='Number of categories pages go to.'),
+    )
+    help = ('Times import_pages on a synthetic JSON-lines file per '
+            'number of worker processes: rows/s of parsing and '
+            'validating alone, and of the whole import into a scratch '
+            'database.')
+
+    def handle_noargs(self, **options):
+        try:
+            counts = [int(n) for n in options['workers'].split(',')]
+        except ValueError:
+            raise CommandError('--workers takes numbers of processes.')
+        rows, batch_size = options['rows'], options['batch_size']
+
+        # The rejected rows are on purpose.
+        handler = logging.NullHandler()
+        ingest.logger.addHandler(handler)
+        fd, path = tempfile.mkstemp(suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as output:
+                write_rows(output, rows, options['categories'])
+
+            self.stdout.write('{0} rows, {1} CPUs'.format(
+                rows, multiprocessing.cpu_count()))
+            self.stdout.write('{0:>8} {1:>12} {2:>12}'.format(
+                'workers', 'prepare/s', 'import/s'))
+            for workers in counts:
+                with open(path) as stream:
+                    start = time.time()
+                    for _ in ingest.prepare_file(stream, 'ndjson',
+                                                 batch_size, workers):
+                        pass
+                    prepare = time.time() - start
+
+                with datagen.scratch_database():
+                    datagen.generate(options['categories'], 0)
+                    with open(path) as stream:
+                        start = time.time()
+                        ingest.import_file(stream, 'ndjson', batch_size,
+                                           workers)
+                        total = time.time() - start
+
+                self.stdout.write('{0:>8} {1:>12.0f} {2:>12.0f}'.format(
+                    workers, rows / prepare, rows / total))
+        finally:
+            os.remove(path)
+            ingest.logger.removeHandler(handler)
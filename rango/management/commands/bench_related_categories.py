@@ -0,0 +1,122 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from rango.datagen import generate, scratch_database
+from rango.models import ClickEvent, Page
+
+EVENT_FIELDS = ('page', 'category', 'created', 'rolled_up', 'session_key')
+
+
+def generate_visits(rnd, events, categories, clicks_per_session):
+    """
+    Returns synthetic `(sessions, categories)` click arrays with
+    Zipf-distributed category popularity.
+    """
+    sessions = rnd.randint(0, max(1, events // clicks_per_session), events)
+    popular = (rnd.zipf(1.5, events) - 1) % categories
+    return sessions, popular
+
+
+def insert_events(sessions, categories, cat_ids, page_ids, now,
+                  chunk_size=10000):
+    """
+    Inserts click events of session and category index arrays with one
+    executemany per chunk.
+    """
+    connection = connections[router.db_for_write(ClickEvent)]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {0} ({1}) VALUES ({2})'.format(
+        quote(ClickEvent._meta.db_table),
+        ', '.join(quote(ClickEvent._meta.get_field(name).column)
+                  for name in EVENT_FIELDS),
+        ', '.join(['%s'] * len(EVENT_FIELDS)))
+    created = connection.ops.value_to_db_datetime(now)
+    cursor = connection.cursor()
+    with transaction.atomic():
+        for start in range(0, len(sessions), chunk_size):
+            cursor.executemany(sql, [
+                (page_ids[cat], cat_ids[cat], created, False,
+                 's{0}'.format(session))
+                for session, cat in zip(
+                    sessions[start:start + chunk_size].tolist(),
+                    categories[start:start + chunk_size].tolist())])
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--sizes', action='store', dest='sizes',
+                    default='10000,100000,1000000,10000000',
+                    help='Comma separated numbers of click events.'),
+        make_option('--categories', action='store', dest='categories',
+                    type='int', default=1000,
+                    help='Number of distinct categories.'),
+        make_option('--clicks-per-session', action='store',
+                    dest='clicks_per_session', type='int', default=5,
+                    help='Average clicks per session.'),
+        make_option('--top-k', action='store', dest='top_k',
+                    type='int', default=5,
+                    help='Neighbours kept per category.'),
+        make_option('--compute-only', action='store_true',
+                    dest='compute_only', default=False,
+                    help='Time the in-memory step only, without writing '
+                         'and loading click events.'),
+    )
+    help = ('Times build_related_categories on synthetic click events: '
+            'loading the events from a scratch database and computing '
+            'the co-visitation matrix and top-K selection.')
+
+    def handle_noargs(self, **options):
+        if options.get('compute_only'):
+            self.run(options)
+        else:
+            with scratch_database():
+                self.run(options)
+
+    def run(self, options):
+        import numpy as np
+        from rango.recommendations import load_visits, related_categories
+
+        rnd = np.random.RandomState(0)
+        n_categories = options.get('categories')
+        compute_only = options.get('compute_only')
+        now = timezone.now()
+        if not compute_only:
+            cat_ids = generate(n_categories, n_categories, now=now)
+            # A page of each category, any page for categories without.
+            pages = dict(Page.objects.values_list('category_id', 'id'))
+            any_page = next(iter(pages.values()))
+            page_ids = [pages.get(cat_id, any_page) for cat_id in cat_ids]
+
+        self.stdout.write('{0:>10} {1:>9} {2:>9} {3:>9} {4:>9} {5:>12}'.format(
+            'events', 'load', 'compute', 'total', 'related', 'events/s'))
+
+        # Events accumulate, each size adds the difference.
+        inserted = 0
+        for events in sorted(int(size) for size in
+                             options.get('sizes').split(',')):
+            sessions, categories = generate_visits(
+                rnd, events, n_categories, options.get('clicks_per_session'))
+
+            load = 0.0
+            if not compute_only:
+                insert_events(sessions[inserted:], categories[inserted:],
+                              cat_ids, page_ids, now)
+                inserted = events
+                start = time.time()
+                sessions, categories = load_visits()
+                load = time.time() - start
+
+            start = time.time()
+            neighbours = related_categories(sessions, categories,
+                                            options.get('top_k'))
+            compute = time.time() - start
+
+            total = load + compute
+            self.stdout.write(
+                '{0:>10} {1:>9.3f} {2:>9.3f} {3:>9.3f} {4:>9} '
+                '{5:>12.0f}'.format(events, load, compute, total,
+                                    len(neighbours[0]), events / total))
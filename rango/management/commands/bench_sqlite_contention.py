@@ -0,0 +1,152 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from multiprocessing import Pool
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from rango.sqlite_tuning import get_pragmas, pragma_statements
+
+
+PAGES = 1000
+CATEGORIES = 20
+
+
+def create_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE page (id INTEGER PRIMARY KEY, url TEXT, '
+                 'views INTEGER, last_visit TEXT)')
+    conn.execute('CREATE TABLE category (id INTEGER PRIMARY KEY, '
+                 'likes INTEGER)')
+    conn.executemany('INSERT INTO page VALUES (?, ?, 0, NULL)',
+                     [(i, 'http://example.com/{0}'.format(i))
+                      for i in range(1, PAGES + 1)])
+    conn.executemany('INSERT INTO category VALUES (?, 0)',
+                     [(i,) for i in range(1, CATEGORIES + 1)])
+    conn.commit()
+    conn.close()
+
+
+def connect(path, pragmas, timeout):
+    # Autocommit, as Django runs outside of atomic blocks.
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    for statement in pragma_statements(pragmas):
+        conn.execute(statement)
+    return conn
+
+
+def run_worker(args):
+    """
+    Emulates `track_url` (3 of 4 requests) and `like_category`
+    requests. Returns `(latencies, locked_errors)`.
+    """
+    path, pragmas, persistent, timeout, writes, seed = args
+    rnd = random.Random(seed)
+    latencies = []
+    locked = 0
+    conn = connect(path, pragmas, timeout) if persistent else None
+
+    for i in range(writes):
+        start = time.time()
+        request_conn = conn or connect(path, pragmas, timeout)
+        try:
+            if i % 4:
+                page_id = rnd.randint(1, PAGES)
+                request_conn.execute('SELECT url FROM page WHERE id = ?',
+                                     (page_id,)).fetchone()
+                request_conn.execute(
+                    'UPDATE page SET views = views + 1, last_visit = ? '
+                    'WHERE id = ?', (time.time(), page_id))
+            else:
+                cat_id = rnd.randint(1, CATEGORIES)
+                request_conn.execute(
+                    'UPDATE category SET likes = likes + 1 WHERE id = ?',
+                    (cat_id,))
+                request_conn.execute(
+                    'SELECT likes FROM category WHERE id = ?',
+                    (cat_id,)).fetchone()
+        except sqlite3.OperationalError as err:
+            if 'locked' not in str(err):
+                raise
+            locked += 1
+        else:
+            latencies.append(time.time() - start)
+        finally:
+            if not persistent:
+                request_conn.close()
+
+    if conn:
+        conn.close()
+    return latencies, locked
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--processes', action='store', dest='processes',
+                    type='int', default=8,
+                    help='Number of concurrent writer processes.'),
+        make_option('--writes', action='store', dest='writes',
+                    type='int', default=500,
+                    help='Requests issued by every process.'),
+        make_option('--timeout', action='store', dest='timeout',
+                    type='float', default=5.0,
+                    help='sqlite3 busy timeout in seconds.'),
+    )
+    help = ('Compares write throughput of concurrent track_url/like_category '
+            'style requests with SQLite defaults and with SQLITE_PRAGMAS '
+            'plus persistent connections.')
+
+    def handle_noargs(self, **options):
+        processes = options.get('processes')
+        writes = options.get('writes')
+        timeout = options.get('timeout')
+
+        profiles = [
+            # name, pragmas, persistent connection
+            ('default', (), False),
+            ('tuned', get_pragmas(), True),
+        ]
+
+        self.stdout.write('{0:<8} {1:>9} {2:>10} {3:>8} {4:>8} {5:>7}'.format(
+            'profile', 'processes', 'requests/s', 'p50 ms', 'p99 ms',
+            'locked'))
+
+        tmp_dir = tempfile.mkdtemp(prefix='rango-bench-')
+        try:
+            for name, pragmas, persistent in profiles:
+                path = os.path.join(tmp_dir, name + '.sqlite3')
+                create_db(path)
+
+                pool = Pool(processes)
+                start = time.time()
+                results = pool.map(
+                    run_worker,
+                    [(path, pragmas, persistent, timeout, writes, seed)
+                     for seed in range(processes)])
+                elapsed = time.time() - start
+                pool.close()
+                pool.join()
+
+                latencies = [lat for lats, _ in results for lat in lats]
+                locked = sum(errors for _, errors in results)
+
+                self.stdout.write(
+                    '{0:<8} {1:>9} {2:>10.0f} {3:>8.2f} {4:>8.2f} '
+                    '{5:>7}'.format(name, processes,
+                                    len(latencies) / elapsed,
+                                    percentile(latencies, 0.5) * 1000,
+                                    percentile(latencies, 0.99) * 1000,
+                                    locked))
+        finally:
+            shutil.rmtree(tmp_dir)
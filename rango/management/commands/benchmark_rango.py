@@ -0,0 +1,90 @@
+import json
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand, CommandError
+
+from rango import benchmark
+
+
+def load(path):
+    with open(path) as results:
+        return json.load(results)
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--scales', action='store', dest='scales',
+                    default='100,10000',
+                    help='Comma separated numbers of synthetic pages, '
+                         'e.g. 100,10000,1000000 (default: 100,10000).'),
+        make_option('--repeat', action='store', dest='repeat', type='int',
+                    default=20,
+                    help='Measured requests per scenario.'),
+        make_option('--scenario', action='store', dest='scenarios',
+                    default=None,
+                    help='Comma separated scenarios to run (default: all).'),
+        make_option('--output', action='store', dest='output',
+                    default=None,
+                    help='Write results as JSON to this file.'),
+        make_option('--baseline', action='store', dest='baseline',
+                    default=None,
+                    help='Fail on regressions against this results file.'),
+        make_option('--compare', action='store', dest='compare', nargs=2,
+                    default=None, metavar='BASELINE RESULTS',
+                    help='Compare two results files instead of running.'),
+        make_option('--threshold', action='store', dest='threshold',
+                    type='float', default=1.25,
+                    help='Slowdown of the median flagged as regression.'),
+        make_option('--min-delta', action='store', dest='min_delta',
+                    type='float', default=0.001,
+                    help='Slowdowns below this many seconds are noise.'),
+    )
+    help = ('Benchmarks latency and queries of every Rango URL and API '
+            'endpoint on throwaway databases seeded at several scales.')
+
+    def handle_noargs(self, **options):
+        if options['compare']:
+            baseline, results = [load(path) for path in options['compare']]
+        else:
+            try:
+                scales = [int(scale) for scale in
+                          options['scales'].split(',')]
+            except ValueError:
+                raise CommandError('--scales takes numbers of pages.')
+            names = None
+            if options['scenarios']:
+                names = set(options['scenarios'].split(','))
+
+            results = benchmark.run_scales(scales, options['repeat'], names,
+                                           log=self.stdout.write)
+            self.report(results)
+            if options['output']:
+                with open(options['output'], 'w') as output:
+                    json.dump(results, output, indent=2, sort_keys=True)
+            if not options['baseline']:
+                return
+            baseline = load(options['baseline'])
+
+        regressions = benchmark.compare(baseline, results,
+                                        options['threshold'],
+                                        options['min_delta'])
+        for scale, name, metric, before, after in regressions:
+            self.stdout.write(
+                'REGRESSION {0} @ {1} pages: {2} {3:g} -> {4:g}'.format(
+                    name, scale, metric, before, after))
+        if regressions:
+            raise CommandError('{0} regression(s).'.format(len(regressions)))
+        self.stdout.write('No regressions.')
+
+    def report(self, results):
+        for scale, scenarios in sorted(results['scales'].items(),
+                                       key=lambda item: int(item[0])):
+            self.stdout.write('{0} pages:'.format(scale))
+            self.stdout.write('  {0:<18} {1:>6} {2:>8} {3:>9} {4:>9} '
+                              '{5:>9}'.format('scenario', 'status',
+                                              'queries', 'p50', 'p95',
+                                              'max'))
+            for name, stats in sorted(scenarios.items()):
+                self.stdout.write(
+                    '  {0:<18} {status:>6} {queries:>8} {p50:>9.4f} '
+                    '{p95:>9.4f} {max:>9.4f}'.format(name, **stats))
@@ -0,0 +1,24 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--top-k', action='store', dest='top_k',
+                    type='int', default=None,
+                    help='Neighbours stored per category '
+                         '(default: RANGO_RELATED_CATEGORIES).'),
+    )
+    help = ('Recomputes related categories from co-visitation of '
+            'categories in the same session. Requires NumPy and SciPy.')
+
+    def handle_noargs(self, **options):
+        # Optional dependencies, only needed by this job.
+        from rango.recommendations import build
+
+        stats = build(options.get('top_k'))
+        self.stdout.write(
+            'Stored {related} related categories from {visits} visits '
+            '(load {load:.2f}s, compute {compute:.2f}s, '
+            'store {store:.2f}s).'.format(**stats))
@@ -0,0 +1,54 @@
+from itertools import islice
+from optparse import make_option
+
+from django.core.management.base import CommandError, NoArgsCommand
+
+from rango.linkcheck import check_links, due_pages
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--all', action='store_true', dest='all',
+                    default=False,
+                    help='Check all pages, not only those due.'),
+        make_option('--limit', action='store', dest='limit',
+                    type='int', default=None,
+                    help='Check at most N pages.'),
+        make_option('--workers', action='store', dest='workers',
+                    type='int', default=16,
+                    help='Requests in flight at once.'),
+        make_option('--per-host', action='store', dest='per_host',
+                    type='int', default=None,
+                    help='Requests in flight at once per host '
+                         '(default: RANGO_LINK_CHECK_PER_HOST).'),
+        make_option('--timeout', action='store', dest='timeout',
+                    type='float', default=None,
+                    help='Seconds per request '
+                         '(default: RANGO_LINK_CHECK_TIMEOUT).'),
+    )
+    help = ('Checks page URLs that are due for a check and stores status '
+            'and next check on the pages. Meant to run from cron.')
+
+    def handle_noargs(self, **options):
+        for name in ('workers', 'per_host', 'limit'):
+            if options.get(name) is not None and options[name] < 1:
+                raise CommandError('--{0} must be at least 1.'.format(
+                    name.replace('_', '-')))
+
+        pages = due_pages(check_all=options.get('all'))
+        if options.get('limit') is not None:
+            pages = islice(pages, options['limit'])
+
+        stats = check_links(pages, workers=options.get('workers', 16),
+                            per_host=options.get('per_host'),
+                            timeout=options.get('timeout'))
+
+        self.stdout.write(
+            'Checked {0} links in {1:.2f}s, {2:.1f} URLs/s, {3} '
+            'broken.'.format(stats.checked, stats.seconds, stats.rate,
+                             stats.broken))
+        if stats.statuses:
+            self.stdout.write(', '.join(
+                '{0}: {1}'.format(status, count)
+                for status, count in sorted(stats.statuses.items(),
+                                            key=lambda item: str(item[0]))))
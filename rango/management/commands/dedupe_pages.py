@@ -0,0 +1,34 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from rango import dedup
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--dry-run', action='store_true', dest='dry_run',
+                    default=False,
+                    help='Only list groups of duplicate pages.'),
+        make_option('--rehash', action='store_true', dest='rehash',
+                    default=False,
+                    help='Recompute URL hashes first, e.g. after '
+                         'RANGO_URL_TRACKING_PARAMS changed.'),
+    )
+    help = ('Merges pages of a category with the same canonical URL into '
+            'the oldest one, moving their views, clicks, rollups and '
+            'history entries over.')
+
+    def handle_noargs(self, **options):
+        if options['rehash']:
+            self.stdout.write('Rehashed {0} pages.'.format(dedup.rehash()))
+
+        def log(page_ids):
+            self.stdout.write('{0} <- {1}'.format(
+                page_ids[0], ', '.join(str(i) for i in page_ids[1:])))
+
+        verbose = int(options['verbosity']) > 1 or options['dry_run']
+        groups, deleted = dedup.dedupe(options['dry_run'],
+                                       log if verbose else None)
+        self.stdout.write('{0} {1} duplicates in {2} groups.'.format(
+            'Found' if options['dry_run'] else 'Merged', deleted, groups))
@@ -0,0 +1,52 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand, CommandError
+
+from rango import datagen
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--categories', action='store', dest='categories',
+                    type='int', default=None,
+                    help='Number of categories (default: pages / 100).'),
+        make_option('--pages', action='store', dest='pages', type='int',
+                    default=10000,
+                    help='Number of pages.'),
+        make_option('--users', action='store', dest='users', type='int',
+                    default=0,
+                    help='Number of users user0, user1, ...'),
+        make_option('--password', action='store', dest='password',
+                    default='password',
+                    help='Password of the generated users.'),
+        make_option('--seed', action='store', dest='seed', type='int',
+                    default=0,
+                    help='Random seed, the same seed gives the same data.'),
+        make_option('--chunk-size', action='store', dest='chunk_size',
+                    type='int', default=10000,
+                    help='Pages inserted per statement.'),
+    )
+    help = ('Fills an empty database with synthetic categories, pages '
+            'and users with skewed views and likes.')
+
+    def handle_noargs(self, **options):
+        pages = options['pages']
+        categories = options['categories']
+        if categories is None:
+            categories = max(pages // 100, 1)
+        if categories < 1 or pages < 0 or options['users'] < 0:
+            raise CommandError('Need at least one category.')
+
+        start = time.time()
+        try:
+            datagen.generate(categories, pages, options['users'],
+                             options['seed'], options['chunk_size'],
+                             password=options['password'])
+        except ValueError as err:
+            raise CommandError(err)
+
+        self.stdout.write(
+            'Generated {0} categories, {1} pages and {2} users in '
+            '{3:.1f}s.'.format(categories, pages, options['users'],
+                               time.time() - start))
@@ -0,0 +1,75 @@
+import logging
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rango import ingest
+from rango.requestlog import open_log
+
+
+FORMATS = ('csv', 'ndjson')
+
+
+def get_format(path):
+    if path.endswith(('.csv', '.csv.gz')):
+        return 'csv'
+    return 'ndjson'
+
+
+class Command(BaseCommand):
+    args = '<file> [<file> ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--format', action='store', dest='format',
+                    type='choice', choices=FORMATS, default=None,
+                    help='csv or ndjson (default: csv for .csv files, '
+                         'else ndjson).'),
+        make_option('--batch-size', action='store', dest='batch_size',
+                    type='int', default=500,
+                    help='Rows imported per transaction.'),
+        make_option('--workers', action='store', dest='workers',
+                    type='int', default=1,
+                    help='Processes parsing and validating rows, '
+                         'one process writes (default: 1).'),
+    )
+    help = ('Creates or updates pages from CSV files with a header line '
+            'or JSON-lines files, with columns category (name), title, '
+            'url, views, first_visit and last_visit. "-" reads stdin, '
+            '.gz files are unpacked. Rejected rows are logged per batch.')
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError('Give at least one file.')
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be '
+                               'positive.')
+
+        # Batch reports go to stderr besides configured handlers.
+        handler = logging.StreamHandler(self.stderr)
+        handler.setLevel(logging.INFO if int(options['verbosity']) > 1
+                         else logging.WARNING)
+        level = ingest.logger.level
+        ingest.logger.addHandler(handler)
+        ingest.logger.setLevel(logging.INFO)
+        try:
+            for path in args:
+                self.import_file(path, options['format'] or get_format(path),
+                                 options['batch_size'], options['workers'])
+        finally:
+            ingest.logger.removeHandler(handler)
+            ingest.logger.setLevel(level)
+
+    def import_file(self, path, format, batch_size, workers):
+        try:
+            stream = open_log(path)
+        except IOError as e:
+            raise CommandError(e)
+        try:
+            result = ingest.import_file(stream, format, batch_size, workers)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.stdout.write(
+            '{0}: {1} created, {2} updated, {3} rejected.'.format(
+                path, result.created, result.updated, result.rejected))
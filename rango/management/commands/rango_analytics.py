@@ -0,0 +1,40 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', action='store', dest='chunk_size',
+                    type='int', default=None,
+                    help='Rows loaded per query '
+                         '(default: RANGO_ANALYTICS_CHUNK_SIZE).'),
+        make_option('--top', action='store', dest='top',
+                    type='int', default=20,
+                    help='Number of categories in the top list.'),
+    )
+    help = ('Computes distributions of page views and category likes '
+            'and caches the report for the admin. Requires NumPy.')
+
+    def handle_noargs(self, **options):
+        # Optional dependency, only needed by this report.
+        from rango.analytics import build_report
+
+        report = build_report(options.get('chunk_size'), options.get('top'))
+
+        for name in ('page_views', 'category_views', 'category_likes'):
+            stats = report[name]
+            self.stdout.write(
+                '{0}: count {count}, total {total}, mean {mean:.2f}, '
+                'max {max}, gini {gini:.3f}, top 1% {top_1_share:.1%}, '
+                'top 10% {top_10_share:.1%}'.format(name, **stats))
+            self.stdout.write('  percentiles: ' + ', '.join(
+                'p{0} {1:.1f}'.format(q, value)
+                for q, value in stats['percentiles']))
+
+        self.stdout.write('top categories:')
+        for row in report['top_categories']:
+            self.stdout.write(
+                '  {name}: {pages} pages, {views} views '
+                '({share:.1%}), mean {mean:.1f}, max {max}, '
+                '{likes} likes'.format(**row))
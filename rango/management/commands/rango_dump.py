@@ -0,0 +1,51 @@
+import gzip
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from rango import backup
+
+
+def open_output(path):
+    if path == '-':
+        return sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wb')
+    return open(path, 'wb')
+
+
+class Command(BaseCommand):
+    args = '<file>'
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', action='store', dest='chunk_size',
+                    type='int', default=2000,
+                    help='Rows read per query.'),
+        make_option('--database', action='store', dest='database',
+                    default=DEFAULT_DB_ALIAS,
+                    help='Database to dump (default: "default").'),
+    )
+    help = ('Streams categories, pages and user profiles to a JSON-lines '
+            'file, gzipped if it ends in .gz, "-" writes stdout. '
+            'Restore with rango_restore.')
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Give one output file.')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+
+        path = args[0]
+        output = open_output(path)
+        try:
+            counts = backup.dump(output, options['chunk_size'],
+                                 options['database'])
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        # Keep a dump to stdout clean.
+        report = self.stderr if path == '-' else self.stdout
+        for label, count in sorted(counts.items()):
+            report.write('{0}: {1} rows'.format(label, count))
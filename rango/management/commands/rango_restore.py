@@ -0,0 +1,52 @@
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from rango import backup
+from rango.requestlog import open_log
+
+
+class Command(BaseCommand):
+    args = '<file>'
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', action='store', dest='chunk_size',
+                    type='int', default=2000,
+                    help='Rows written per bulk insert.'),
+        make_option('--database', action='store', dest='database',
+                    default=DEFAULT_DB_ALIAS,
+                    help='Database to restore into (default: "default").'),
+    )
+    help = ('Restores a rango_dump file into a database without '
+            'categories, pages and profiles, keeping ids, in one '
+            'transaction. "-" reads stdin, .gz files are unpacked. '
+            'Profiles of users missing from the database, and pages '
+            'with URLs other than http(s), are skipped; counters of '
+            'categories with skipped pages are recomputed.')
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Give one dump file.')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+
+        try:
+            stream = open_log(args[0])
+        except IOError as e:
+            raise CommandError(e)
+        restore = backup.Restore(options['chunk_size'], options['database'])
+        try:
+            restore.run(stream)
+        except (IOError, ValueError) as e:
+            raise CommandError(e)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for label, count in sorted(restore.counts.items()):
+            self.stdout.write('{0}: {1} rows{2}'.format(
+                label, count, ''.join(
+                    ', skipped {0} {1}'.format(skipped, reason)
+                    for reason, skipped in sorted(
+                        restore.skipped[label].items()))))
@@ -0,0 +1,13 @@
+from django.core.management.base import NoArgsCommand
+
+from rango.trending import rebuild
+
+
+class Command(NoArgsCommand):
+    help = ('Recomputes trending scores of pages and categories from '
+            'click rollups and pending click events.')
+
+    def handle_noargs(self, **options):
+        pages, categories = rebuild()
+        self.stdout.write('Rebuilt trending scores of {0} pages and {1} '
+                          'categories.'.format(pages, categories))
@@ -0,0 +1,20 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from rango.counters import repair_category_counters
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', action='store', dest='chunk_size',
+                    type='int', default=500,
+                    help='Categories aggregated per GROUP BY query.'),
+    )
+    help = ('Recomputes denormalized page_count, total_page_views and '
+            'last_activity of categories.')
+
+    def handle_noargs(self, **options):
+        repaired = repair_category_counters(
+            chunk_size=options.get('chunk_size'))
+        self.stdout.write('Repaired {0} categories.'.format(repaired))
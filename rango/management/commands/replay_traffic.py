@@ -0,0 +1,71 @@
+import json
+from itertools import islice
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rango.requestlog import (Histogram, format_header, format_row,
+                              iter_records)
+from rango.traffic import HttpTarget, InProcessTarget, replay
+
+
+class Command(BaseCommand):
+    args = '<traffic file> [<traffic file> ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--url', action='store', dest='url', default=None,
+                    help='Base URL of a running server, e.g. '
+                         'http://127.0.0.1:8000 (default: in-process).'),
+        make_option('--concurrency', action='store', dest='concurrency',
+                    type='int', default=4,
+                    help='Requests in flight at once.'),
+        make_option('--speed', action='store', dest='speed',
+                    type='float', default=0,
+                    help='Replay at N times the recorded pace, 0 sends '
+                         'as fast as possible (default).'),
+        make_option('--limit', action='store', dest='limit',
+                    type='int', default=None,
+                    help='Replay only the first N requests.'),
+        make_option('--output', action='store', dest='output',
+                    default=None,
+                    help='Also write results as JSON to this file.'),
+    )
+    help = ('Replays recorded traffic (RANGO_TRAFFIC_RECORD) and reports '
+            'throughput and latency per URL name. Replayed requests '
+            'write to the database, use a copy of the data.')
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError('Give at least one traffic file.')
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1.')
+
+        records = iter_records(args, key='path')
+        if options['limit'] is not None:
+            records = islice(records, options['limit'])
+        if options['url']:
+            target = HttpTarget(options['url'])
+        else:
+            target = InProcessTarget()
+
+        results = replay(records, target, options['concurrency'],
+                         options['speed'])
+
+        self.stdout.write('{0} requests in {1:.2f}s, {2:.1f} req/s'.format(
+            results.count, results.seconds,
+            results.count / max(results.seconds, 1e-6)))
+        self.stdout.write(format_header() + ' {0:>9}  statuses'.format(
+            'req/s'))
+        total = Histogram()
+        for view, hist in sorted(results.latency.items()):
+            total.merge(hist)
+            self.stdout.write('{0} {1:>9.1f}  {2}'.format(
+                format_row(view, hist.summary()),
+                hist.count / max(results.seconds, 1e-6),
+                ', '.join('{0}: {1}'.format(status, count) for status, count
+                          in sorted(results.statuses[view].items()))))
+        self.stdout.write(format_row('all', total.summary()))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results.summary(), output, indent=2,
+                          sort_keys=True)
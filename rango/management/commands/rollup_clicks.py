@@ -0,0 +1,27 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from rango.clicklog import compact, rollup
+
+
+class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', action='store', dest='chunk_size',
+                    type='int', default=5000,
+                    help='Events rolled up per transaction.'),
+        make_option('--no-compact', action='store_false', dest='compact',
+                    default=True,
+                    help="Don't apply retention policy after rollup."),
+    )
+    help = ('Aggregates click events of completed hours into hourly and '
+            'daily rollups and deletes expired raw events.')
+
+    def handle_noargs(self, **options):
+        rolled_up = rollup(chunk_size=options.get('chunk_size'))
+        self.stdout.write('Rolled up {0} events.'.format(rolled_up))
+
+        if options.get('compact'):
+            events, hourly = compact()
+            self.stdout.write('Deleted {0} events and {1} hourly '
+                              'rollups.'.format(events, hourly))
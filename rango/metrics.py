@@ -0,0 +1,312 @@
+"""
+Per-view request metrics in Prometheus text format.
+
+`MetricsMiddleware` collects, for the request handled by the current
+thread, DB query count and time, template render time and time spent
+in outbound calls (FAROO search). Collection is thread-local and free
+of locks. When the response leaves, the request is folded into the
+process-wide `registry` under one lock, labelled with the URL name
+(`index`, `category`, `goto`, `cat-list`, `admin:index`, ...).
+
+DB cursors and `Template.render` are wrapped once by `install()`,
+called from `RangoConfig.ready`. Outside of a metered request the
+wrappers only check a thread-local.
+
+A RANGO_REQUEST_LOG_SAMPLE fraction of requests is also written to
+the JSON-lines request log, see `rango.requestlog`.
+
+`/metrics` serves the registry of the process handling the scrape;
+with several worker processes each keeps its own numbers.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.backends import BaseDatabaseWrapper
+from django.template.base import Template
+
+from rango.requestlog import log_request
+
+
+# Prometheus default latency buckets, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNRESOLVED = 'unresolved'
+
+_local = threading.local()
+
+
+class RequestStats(object):
+    """
+    Measurements of one request, touched by its thread only.
+    """
+
+    def __init__(self):
+        self.view = UNRESOLVED
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.external = defaultdict(lambda: [0, 0.0])
+
+
+def current_stats():
+    return getattr(_local, 'stats', None)
+
+
+def record_external(service, seconds):
+    """
+    Adds an outbound call to `service` to the current request.
+    """
+    stats = current_stats()
+    if stats is not None:
+        call = stats.external[service]
+        call[0] += 1
+        call[1] += seconds
+
+
+class ViewMetrics(object):
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.duration = 0.0
+        self.responses = defaultdict(int)
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.external = defaultdict(lambda: [0, 0.0])
+
+
+class Registry(object):
+    """
+    Process-wide aggregates per view, safe to update from many threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(ViewMetrics)
+
+    def observe(self, stats, duration, status):
+        with self.lock:
+            metrics = self.views[stats.view]
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    metrics.buckets[i] += 1
+            metrics.count += 1
+            metrics.duration += duration
+            metrics.responses[status] += 1
+            metrics.queries += stats.queries
+            metrics.query_time += stats.query_time
+            metrics.template_time += stats.template_time
+            for service, (calls, seconds) in stats.external.items():
+                metrics.external[service][0] += calls
+                metrics.external[service][1] += seconds
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+    def render(self, extra=()):
+        """
+        Returns all metrics in Prometheus text exposition format.
+        `extra` holds more `(name, type, help, [(labels, value)])`.
+        """
+        with self.lock:
+            views = sorted(self.views.items())
+
+            families = [
+                ('rango_requests_total', 'counter',
+                 'Responses per view and status code.',
+                 [({'view': view, 'status': status}, count)
+                  for view, m in views
+                  for status, count in sorted(m.responses.items())]),
+                ('rango_db_queries_total', 'counter',
+                 'DB queries run while handling requests.',
+                 [({'view': view}, m.queries) for view, m in views]),
+                ('rango_db_query_seconds_total', 'counter',
+                 'Time spent in DB queries.',
+                 [({'view': view}, m.query_time) for view, m in views]),
+                ('rango_template_render_seconds_total', 'counter',
+                 'Time spent rendering templates.',
+                 [({'view': view}, m.template_time) for view, m in views]),
+                ('rango_external_calls_total', 'counter',
+                 'Outbound calls to external services.',
+                 [({'view': view, 'service': service}, calls)
+                  for view, m in views
+                  for service, (calls, _) in sorted(m.external.items())]),
+                ('rango_external_seconds_total', 'counter',
+                 'Time spent in outbound calls to external services.',
+                 [({'view': view, 'service': service}, seconds)
+                  for view, m in views
+                  for service, (_, seconds) in sorted(m.external.items())]),
+            ]
+
+            lines = ['# HELP rango_request_duration_seconds '
+                     'Request latency per view.',
+                     '# TYPE rango_request_duration_seconds histogram']
+            for view, m in views:
+                for bound, count in zip(BUCKETS, m.buckets):
+                    lines.append(sample(
+                        'rango_request_duration_seconds_bucket',
+                        {'view': view, 'le': repr(bound)}, count))
+                lines.append(sample('rango_request_duration_seconds_bucket',
+                                    {'view': view, 'le': '+Inf'}, m.count))
+                lines.append(sample('rango_request_duration_seconds_sum',
+                                    {'view': view}, m.duration))
+                lines.append(sample('rango_request_duration_seconds_count',
+                                    {'view': view}, m.count))
+
+        for name, kind, help_text, samples in families + list(extra):
+            lines.append('# HELP {0} {1}'.format(name, help_text))
+            lines.append('# TYPE {0} {1}'.format(name, kind))
+            for labels, value in samples:
+                lines.append(sample(name, labels, value))
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+                      .replace('\n', '\\n'))
+
+
+def sample(name, labels, value):
+    if labels:
+        name += '{' + ','.join(
+            '{0}="{1}"'.format(key, escape(labels[key]))
+            for key in sorted(labels)) + '}'
+    return '{0} {1}'.format(name, repr(float(value)))
+
+
+class MeteredCursor(object):
+    """
+    Times `execute` and `executemany` of the wrapped cursor.
+    """
+
+    def __init__(self, cursor, stats):
+        self.cursor = cursor
+        self.stats = stats
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return self.cursor.__exit__(type, value, traceback)
+
+    def timed(self, method, *args):
+        start = time.time()
+        try:
+            return method(*args)
+        finally:
+            self.stats.queries += 1
+            self.stats.query_time += time.time() - start
+
+    def execute(self, sql, params=None):
+        return self.timed(self.cursor.execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self.timed(self.cursor.executemany, sql, param_list)
+
+
+def install():
+    """
+    Wraps DB cursors and template rendering. Safe to call twice.
+    """
+    if getattr(BaseDatabaseWrapper.cursor, 'rango_metered', False):
+        return
+
+    original_cursor = BaseDatabaseWrapper.cursor
+    original_render = Template.render
+
+    def cursor(self):
+        cursor = original_cursor(self)
+        stats = current_stats()
+        if stats is None:
+            return cursor
+        return MeteredCursor(cursor, stats)
+
+    def render(self, context):
+        stats = current_stats()
+        # Only the outermost template: includes are part of it.
+        if stats is None or stats.template_depth:
+            return original_render(self, context)
+
+        stats.template_depth += 1
+        start = time.time()
+        try:
+            return original_render(self, context)
+        finally:
+            stats.template_depth -= 1
+            stats.template_time += time.time() - start
+
+    cursor.rango_metered = True
+    BaseDatabaseWrapper.cursor = cursor
+    Template.render = render
+
+
+class MetricsMiddleware(object):
+    """
+    Meters every request, see module docstring.
+    Put it first, so the whole middleware stack is timed.
+    """
+
+    def process_request(self, request):
+        _local.stats = RequestStats()
+        request._rango_metrics_start = time.time()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = current_stats()
+        if stats is not None:
+            stats.view = request.resolver_match.view_name
+
+    def process_response(self, request, response):
+        start = getattr(request, '_rango_metrics_start', None)
+        stats = current_stats()
+        _local.stats = None
+
+        if start is not None and stats is not None:
+            duration = time.time() - start
+            registry.observe(stats, duration, response.status_code)
+            log_request(stats.view, request.method, response.status_code,
+                        duration, stats, response)
+        return response
+
+
+def exposition():
+    """
+    Returns the registry plus throttling and load shedding state.
+    """
+    from rango.shedding import tracker
+    from rango.throttling import counters
+
+    throttled = sorted(counters.snapshot().items())
+    return registry.render([
+        ('rango_throttle_requests_total', 'counter',
+         'Requests passing throttled views per scope and outcome.',
+         [({'scope': scope, 'outcome': outcome}, count)
+          for scope, counts in throttled
+          for outcome, count in sorted(counts.items())]),
+        ('rango_requests_in_flight', 'gauge',
+         'Requests being handled by this process.',
+         [({}, tracker.in_flight)]),
+    ])
+
+
+def allowed(request):
+    """
+    Whether the client may scrape `/metrics`.
+    """
+    allowed_ips = getattr(settings, 'RANGO_METRICS_ALLOWED_IPS', None)
+    return (allowed_ips is None or
+            request.META.get('REMOTE_ADDR') in allowed_ips)
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0005_auto_20150705_0947'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='page',
+            index_together=set([('category', 'views', 'id')]),
+        ),
+    ]
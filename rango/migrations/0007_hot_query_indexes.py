@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0006_page_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='likes',
+            field=models.IntegerField(default=0, db_index=True),
+            preserve_default=True,
+        ),
+        migrations.AlterField(
+            model_name='page',
+            name='category',
+            field=models.ForeignKey(to='rango.Category', db_index=False),
+            preserve_default=True,
+        ),
+        migrations.AlterField(
+            model_name='page',
+            name='views',
+            field=models.IntegerField(default=0, db_index=True),
+            preserve_default=True,
+        ),
+        migrations.AlterIndexTogether(
+            name='page',
+            index_together=set([('title', 'category'), ('category', 'views', 'id')]),
+        ),
+    ]
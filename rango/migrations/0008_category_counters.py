@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.db.models import Count, Max, Sum
+
+
+def fill_counters(apps, schema_editor):
+    Category = apps.get_model('rango', 'Category')
+    Page = apps.get_model('rango', 'Page')
+
+    stats = (Page.objects.values('category')
+                         .annotate(count=Count('id'),
+                                   views=Sum('views'),
+                                   last_visit=Max('last_visit'),
+                                   first_visit=Max('first_visit')))
+    for row in stats:
+        activity = [d for d in (row['last_visit'], row['first_visit']) if d]
+        Category.objects.filter(id=row['category']).update(
+            page_count=row['count'],
+            total_page_views=row['views'] or 0,
+            last_activity=max(activity) if activity else None)
+
+
+def drop_counters(apps, schema_editor):
+    # Columns are removed by reversing AddField.
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0007_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='last_activity',
+            field=models.DateTimeField(db_index=True, null=True, verbose_name=b'last activity', blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='page_count',
+            field=models.IntegerField(default=0),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='total_page_views',
+            field=models.IntegerField(default=0),
+            preserve_default=True,
+        ),
+        migrations.RunPython(fill_counters, drop_counters),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0008_category_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='views',
+            field=models.IntegerField(default=0, db_index=True),
+            preserve_default=True,
+        ),
+    ]
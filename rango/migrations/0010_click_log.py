@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0009_category_views_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryViewRollup',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('period', models.CharField(max_length=1, choices=[(b'h', b'hourly'), (b'd', b'daily')])),
+                ('start', models.DateTimeField()),
+                ('views', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(to='rango.Category')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='ClickEvent',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('created', models.DateTimeField(db_index=True)),
+                ('rolled_up', models.BooleanField(default=False)),
+                ('category', models.ForeignKey(to='rango.Category', db_index=False)),
+                ('page', models.ForeignKey(to='rango.Page')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='PageViewRollup',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('period', models.CharField(max_length=1, choices=[(b'h', b'hourly'), (b'd', b'daily')])),
+                ('start', models.DateTimeField()),
+                ('views', models.IntegerField(default=0)),
+                ('page', models.ForeignKey(to='rango.Page')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='pageviewrollup',
+            unique_together=set([('page', 'period', 'start')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='pageviewrollup',
+            index_together=set([('period', 'start')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='clickevent',
+            index_together=set([('rolled_up', 'id')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='categoryviewrollup',
+            unique_together=set([('category', 'period', 'start')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='categoryviewrollup',
+            index_together=set([('period', 'start')]),
+        ),
+    ]
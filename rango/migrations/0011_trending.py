@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0010_click_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='trending',
+            field=models.FloatField(default=0, db_index=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='trending',
+            field=models.FloatField(default=0, db_index=True),
+            preserve_default=True,
+        ),
+    ]
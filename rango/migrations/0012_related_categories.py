@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0011_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedCategory',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('category', models.ForeignKey(related_name='related', to='rango.Category', db_index=False)),
+                ('related', models.ForeignKey(related_name='+', to='rango.Category')),
+            ],
+            options={
+                'ordering': ('rank',),
+                'verbose_name_plural': 'Related categories',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='relatedcategory',
+            unique_together=set([('category', 'rank')]),
+        ),
+        migrations.AddField(
+            model_name='clickevent',
+            name='session_key',
+            field=models.CharField(max_length=40, blank=True),
+            preserve_default=True,
+        ),
+    ]
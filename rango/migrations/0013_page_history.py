@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('rango', '0012_related_categories'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageHistory',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('page_ids', models.CommaSeparatedIntegerField(max_length=255, blank=True)),
+                ('user', models.OneToOneField(related_name='page_history', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Page histories',
+            },
+            bases=(models.Model,),
+        ),
+    ]
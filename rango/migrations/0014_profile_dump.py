@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.db.models.deletion
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('rango', '0013_page_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileDump',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('created', models.DateTimeField(db_index=True)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=255)),
+                ('view', models.CharField(max_length=100)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('sampled', models.BooleanField(default=False)),
+                ('duration', models.FloatField()),
+                ('query_count', models.IntegerField()),
+                ('query_time', models.FloatField()),
+                ('queries', models.TextField()),
+                ('summary', models.TextField()),
+                ('stats', models.BinaryField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.SET_NULL, blank=True, to=settings.AUTH_USER_MODEL, null=True)),
+            ],
+            options={
+                'ordering': ('-created',),
+            },
+            bases=(models.Model,),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+from rango.canonical import url_hash
+
+
+def fill_url_hashes(apps, schema_editor):
+    Page = apps.get_model('rango', 'Page')
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {0} SET {1} = %s WHERE {2} = %s'.format(
+        quote(Page._meta.db_table), quote('url_hash'), quote('id'))
+    cursor = connection.cursor()
+
+    # One executemany per chunk of pages.
+    pages = Page.objects.using(connection.alias)
+    last_id = 0
+    while True:
+        chunk = list(pages.filter(id__gt=last_id).order_by('id')
+                          .values_list('id', 'url')[:2000])
+        if not chunk:
+            return
+        cursor.executemany(sql, [(url_hash(url), page_id)
+                                 for page_id, url in chunk])
+        last_id = chunk[-1][0]
+
+
+def drop_url_hashes(apps, schema_editor):
+    # Column is removed by reversing AddField.
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0014_profile_dump'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='url_hash',
+            field=models.CharField(max_length=40, editable=False, blank=True),
+            preserve_default=True,
+        ),
+        # Before the index, which is then built once.
+        migrations.RunPython(fill_url_hashes, drop_url_hashes),
+        migrations.AlterIndexTogether(
+            name='page',
+            index_together=set([('url_hash', 'category'), ('title', 'category'), ('category', 'views', 'id')]),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0015_page_url_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='link_checked',
+            field=models.DateTimeField(null=True, editable=False, blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='link_error',
+            field=models.CharField(max_length=100, editable=False, blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='link_failures',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='link_next_check',
+            field=models.DateTimeField(null=True, editable=False, blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='link_status',
+            field=models.PositiveSmallIntegerField(null=True, editable=False, blank=True),
+            preserve_default=True,
+        ),
+    ]
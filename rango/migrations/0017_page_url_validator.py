@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.core.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rango', '0016_page_link_check'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='page',
+            name='url',
+            field=models.URLField(validators=[django.core.validators.URLValidator(schemes=[b'http', b'https'])]),
+            preserve_default=True,
+        ),
+    ]
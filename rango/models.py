@@ -1,15 +1,40 @@
-from django.db import models
+import logging
+
+from django.core.validators import URLValidator
+from django.db import models, router, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.template.defaultfilters import slugify
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+from rango.canonical import url_hash
+
+
+logger = logging.getLogger(__name__)
+
+# Page URLs are rendered as plain links, only web URLs are allowed.
+validate_page_url = URLValidator(schemes=['http', 'https'])
+
 
 class Category(models.Model):
     name = models.CharField(max_length=128, unique=True)
-    views = models.IntegerField(default=0)
-    likes = models.IntegerField(default=0)
+    views = models.IntegerField(default=0, db_index=True)
+    likes = models.IntegerField(default=0, db_index=True)
     slug = models.SlugField(unique=True)
 
+    # Denormalized from pages, kept in step by Page save/delete and
+    # `rango.tracking`; `manage.py repair_category_counters` rebuilds them.
+    page_count = models.IntegerField(default=0)
+    total_page_views = models.IntegerField(default=0)
+    # Latest visit to any of its pages, None without visits.
+    last_activity = models.DateTimeField('last activity', blank=True,
+                                         null=True, db_index=True)
+
+    # Log-space time-decayed score, see `rango.trending`.
+    trending = models.FloatField(default=0, db_index=True)
+
     def save(self, *args, **kwargs):
         self.slug = slugify(self.name)
 
@@ -27,41 +52,177 @@ class Category(models.Model):
 
 
 class Page(models.Model):
-    category = models.ForeignKey(Category)
+    # Covered by the composite indexes below, which start with category.
+    category = models.ForeignKey(Category, db_index=False)
     title = models.CharField(max_length=128)
-    url = models.URLField()
-    views = models.IntegerField(default=0)
+    url = models.URLField(validators=[validate_page_url])
+    views = models.IntegerField(default=0, db_index=True)
+    # SHA-1 of the canonical URL, see `rango.canonical`.
+    url_hash = models.CharField(max_length=40, blank=True, editable=False)
 
     # Make these fields optional.
     last_visit = models.DateTimeField('last visit', blank=True, null=True)
     first_visit = models.DateTimeField('first visit', blank=True, null=True)
 
+    # Log-space time-decayed score, see `rango.trending`.
+    trending = models.FloatField(default=0, db_index=True)
+
+    # Last link check, see `rango.linkcheck`. Status is None if the
+    # server did not answer, `link_error` then says why. Not indexed,
+    # due pages are found walking the primary key.
+    link_status = models.PositiveSmallIntegerField(
+        blank=True, null=True, editable=False)
+    link_error = models.CharField(max_length=100, blank=True, editable=False)
+    link_checked = models.DateTimeField(blank=True, null=True,
+                                        editable=False)
+    link_failures = models.PositiveSmallIntegerField(default=0,
+                                                     editable=False)
+    link_next_check = models.DateTimeField(blank=True, null=True,
+                                           editable=False)
+
     def save(self, *args, **kwargs):
         now = timezone.now()
+        self.url_hash = url_hash(self.url)
 
         # Ensure visits are not in the future.
         if self.last_visit:
             if self.last_visit > now:
                 self.last_visit = None
-                print("***Warning: last_visit > now, field set to 'None'")
+                logger.warning("last_visit > now, field set to 'None'")
 
         if self.first_visit:
             if self.first_visit > now:
                 self.first_visit = None
-                print("***Warning: first_visit > now, field set to 'None'")
+                logger.warning("first_visit > now, field set to 'None'")
 
         # Ensure first_visit < last_visit.
         if self.first_visit and self.last_visit:
             if self.first_visit > self.last_visit:
                 self.first_visit = None
-                print(
-                    "***Warning: first_visit > last_visit, field set to 'None'")
+                logger.warning(
+                    "first_visit > last_visit, field set to 'None'")
+
+        using = kwargs.get('using') or router.db_for_write(Page, instance=self)
 
-        super(Page, self).save(*args, **kwargs)
+        with transaction.atomic(using=using):
+            # Stored category and views, None for a new page.
+            stored = None
+            if self.pk is not None:
+                stored = Page.objects.using(using).select_for_update() \
+                    .filter(pk=self.pk).values_list('category_id',
+                                                    'views').first()
+            super(Page, self).save(*args, **kwargs)
+
+            categories = Category.objects.using(using).filter(
+                pk=self.category_id)
+            if stored is None or stored[0] != self.category_id:
+                if stored is not None:
+                    Category.objects.using(using).filter(
+                        pk=stored[0]).update(
+                            page_count=F('page_count') - 1,
+                            total_page_views=F('total_page_views') -
+                            stored[1])
+                categories.update(
+                    page_count=F('page_count') + 1,
+                    total_page_views=F('total_page_views') + self.views)
+            elif stored[1] != self.views:
+                categories.update(total_page_views=F('total_page_views') +
+                                  self.views - stored[1])
+
+            # Moves last_activity forward to the latest visit, which is
+            # last_visit if set (first_visit is not after it by now).
+            visit = self.last_visit or self.first_visit
+            if visit:
+                categories.filter(Q(last_activity__isnull=True) |
+                                  Q(last_activity__lt=visit)).update(
+                                      last_activity=visit)
 
     def __unicode__(self):  # use __str__ in Python 3
         return self.title
 
+    class Meta:
+        index_together = [
+            # Keyset pagination of category pages (see rango.pagination).
+            ('category', 'views', 'id'),
+            # Duplicate lookup in `auto_add_page`. Leading with category
+            # would make SQLite pick it for the pagination query too.
+            ('title', 'category'),
+            # Pages of a URL, and duplicates within a category.
+            ('url_hash', 'category'),
+        ]
+
+
+@receiver(post_delete, sender=Page)
+def page_deleted(sender, instance, using, **kwargs):
+    # Sent inside the deletion transaction, also for queryset deletes.
+    Category.objects.using(using).filter(pk=instance.category_id).update(
+        page_count=F('page_count') - 1,
+        total_page_views=F('total_page_views') - instance.views)
+
+
+class ClickEvent(models.Model):
+    """
+    Raw click on a page, appended in batches by `track_url` and
+    aggregated into rollups by `manage.py rollup_clicks`.
+    """
+    page = models.ForeignKey(Page)
+    category = models.ForeignKey(Category, db_index=False)
+    created = models.DateTimeField(db_index=True)
+    rolled_up = models.BooleanField(default=False)
+    # Empty for clients without a session, e.g. crawlers.
+    session_key = models.CharField(max_length=40, blank=True)
+
+    class Meta:
+        # Rollup job walks pending events in insertion order.
+        index_together = [('rolled_up', 'id')]
+
+
+class ViewRollup(models.Model):
+    HOURLY = 'h'
+    DAILY = 'd'
+    PERIOD_CHOICES = ((HOURLY, 'hourly'), (DAILY, 'daily'))
+
+    period = models.CharField(max_length=1, choices=PERIOD_CHOICES)
+    start = models.DateTimeField()
+    views = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class PageViewRollup(ViewRollup):
+    page = models.ForeignKey(Page)
+
+    class Meta:
+        unique_together = ('page', 'period', 'start')
+        index_together = [('period', 'start')]
+
+
+class CategoryViewRollup(ViewRollup):
+    category = models.ForeignKey(Category)
+
+    class Meta:
+        unique_together = ('category', 'period', 'start')
+        index_together = [('period', 'start')]
+
+
+class RelatedCategory(models.Model):
+    """
+    Precomputed neighbour of a category by co-visitation, written by
+    `manage.py build_related_categories`.
+    """
+    category = models.ForeignKey(Category, related_name='related',
+                                 db_index=False)
+    related = models.ForeignKey(Category, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        # Neighbours of a category are read in rank order.
+        unique_together = ('category', 'rank')
+        ordering = ('rank',)
+        verbose_name_plural = 'Related categories'
+
 
 class UserProfile(models.Model):
     # Link UserProfile to a User model instance.
@@ -73,3 +234,43 @@ class UserProfile(models.Model):
 
     def __unicode__(self):
         return self.user.username
+
+
+class PageHistory(models.Model):
+    """
+    Recently visited pages of a user, most recent first, capped at
+    RANGO_RECENT_PAGES ids in one row (see `rango.history`).
+    """
+    user = models.OneToOneField(User, related_name='page_history')
+    page_ids = models.CommaSeparatedIntegerField(max_length=255, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Page histories'
+
+
+class ProfileDump(models.Model):
+    """
+    cProfile stats and SQL of one profiled request, written by
+    `rango.profiling` and downloadable from the admin.
+    """
+    created = models.DateTimeField(db_index=True)
+    user = models.ForeignKey(User, blank=True, null=True,
+                             on_delete=models.SET_NULL)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    view = models.CharField(max_length=100)
+    status = models.PositiveSmallIntegerField()
+    # Picked by RANGO_PROFILE_SAMPLE_EVERY rather than asked for.
+    sampled = models.BooleanField(default=False)
+    duration = models.FloatField()
+    query_count = models.IntegerField()
+    query_time = models.FloatField()
+    # JSON list of {"sql": ..., "time": seconds} in execution order.
+    queries = models.TextField()
+    # Top functions by cumulative time, as printed by pstats.
+    summary = models.TextField()
+    # Marshalled pstats data, the format of `cProfile.Profile.dump_stats`.
+    stats = models.BinaryField()
+
+    class Meta:
+        ordering = ('-created',)
@@ -0,0 +1,70 @@
+"""
+Keyset (a.k.a. seek) pagination for the pages of a category.
+
+Pages are listed by `(-views, -id)`. Instead of OFFSET, every chunk
+remembers the `(views, id)` of its last page and the next chunk starts
+strictly after it, so fetching chunk N costs the same as chunk 1 and
+is served by the `(category_id, views, id)` index on `rango_page`.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from rango.models import Page
+
+
+def get_chunk_size():
+    """
+    Number of pages per chunk, configurable via RANGO_PAGE_CHUNK_SIZE.
+    """
+    return getattr(settings, 'RANGO_PAGE_CHUNK_SIZE', 20)
+
+
+def encode_cursor(page):
+    """
+    Builds an opaque cursor `<views>_<id>` pointing right after `page`.
+    """
+    return '{0}_{1}'.format(page.views, page.id)
+
+
+def decode_cursor(cursor):
+    """
+    Parses cursor built by `encode_cursor`.
+    Returns `(views, id)` tuple or None if cursor is malformed.
+    """
+    try:
+        views, page_id = cursor.rsplit('_', 1)
+        return int(views), int(page_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def get_page_chunk(category, cursor=None, size=None):
+    """
+    Returns `(pages, next_cursor)` for the given category.
+
+    `pages` is a list of at most `size` pages following `cursor`
+    (or from the top when cursor is None). `next_cursor` is None
+    when there are no more pages.
+    """
+    if size is None:
+        size = get_chunk_size()
+
+    pages = Page.objects.filter(category=category)
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        views, page_id = position
+        # Same as `views < v OR (views = v AND id < i)`, but the
+        # leading `views <= v` lets the index seek to the cursor.
+        pages = pages.filter(views__lte=views).filter(
+            Q(views__lt=views) | Q(id__lt=page_id))
+
+    # Fetch one extra row to find out whether the next chunk exists.
+    pages = list(pages.order_by('-views', '-id')[:size + 1])
+
+    next_cursor = None
+    if len(pages) > size:
+        pages = pages[:size]
+        next_cursor = encode_cursor(pages[-1])
+
+    return pages, next_cursor
@@ -0,0 +1,157 @@
+"""
+On-demand profiling of single requests.
+
+A staff user asks for a profile by sending the `X-Rango-Profile` header
+or adding `?_profile=1` to the URL. `ProfilingMiddleware` then runs the
+view (and template rendering of its response) under cProfile, logs the
+SQL it runs with timings, and stores both as a `ProfileDump` that the
+admin lists and offers for download. The `.prof` file loads in
+`pstats`, snakeviz or flameprof (flame graphs).
+
+With RANGO_PROFILE_SAMPLE_EVERY = N, one request in N is profiled as
+well, whoever sent it. Without the flag and with sampling off, a
+request costs one header and one query string lookup.
+
+Only the newest RANGO_PROFILE_KEEP dumps are kept.
+"""
+import cProfile
+import json
+import marshal
+import pstats
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from rango.models import ProfileDump
+
+
+FLAG_HEADER = 'HTTP_X_RANGO_PROFILE'
+FLAG_PARAM = '_profile'
+
+# Functions listed in the summary of a dump.
+SUMMARY_LINES = 40
+
+
+class Sampler(object):
+    """
+    Thread-safe counter picking one call in `every`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def pick(self, every):
+        with self.lock:
+            self.count += 1
+            return self.count % every == 0
+
+    def clear(self):
+        with self.lock:
+            self.count = 0
+
+
+sampler = Sampler()
+
+
+def get_sample_every():
+    return getattr(settings, 'RANGO_PROFILE_SAMPLE_EVERY', 0)
+
+
+def get_keep():
+    return getattr(settings, 'RANGO_PROFILE_KEEP', 50)
+
+
+def requested(request):
+    return FLAG_HEADER in request.META or FLAG_PARAM in request.GET
+
+
+class RequestProfile(object):
+    """
+    cProfile and SQL log of one request, from `start` to `stop`.
+    """
+
+    def __init__(self, request, sampled):
+        self.request = request
+        self.sampled = sampled
+        self.profiler = cProfile.Profile()
+        # Django logs the queries of connections with a debug cursor.
+        self.connections = [(conn, conn.use_debug_cursor, len(conn.queries))
+                            for conn in connections.all()]
+
+    def start(self):
+        for conn, _, _ in self.connections:
+            conn.use_debug_cursor = True
+        self.started = time.time()
+        self.profiler.enable()
+
+    def stop(self, response):
+        """
+        Stops profiling and returns the saved `ProfileDump`.
+        """
+        self.profiler.disable()
+        duration = time.time() - self.started
+
+        queries = []
+        for conn, use_debug_cursor, offset in self.connections:
+            conn.use_debug_cursor = use_debug_cursor
+            queries.extend({'sql': query['sql'], 'time': float(query['time'])}
+                           for query in conn.queries[offset:])
+
+        summary = StringIO()
+        stats = pstats.Stats(self.profiler, stream=summary)
+        stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        self.profiler.create_stats()
+
+        user = getattr(self.request, 'user', None)
+        dump = ProfileDump.objects.create(
+            created=timezone.now(),
+            user=user if user and user.is_authenticated() else None,
+            method=self.request.method,
+            path=self.request.get_full_path()[:255],
+            view=self.request.resolver_match.view_name,
+            status=response.status_code,
+            sampled=self.sampled,
+            duration=duration,
+            query_count=len(queries),
+            query_time=sum(query['time'] for query in queries),
+            queries=json.dumps(queries),
+            summary=summary.getvalue(),
+            stats=marshal.dumps(self.profiler.stats))
+        prune(get_keep())
+        return dump
+
+
+def prune(keep):
+    stale = list(ProfileDump.objects.values_list('pk', flat=True)[keep:])
+    if stale:
+        ProfileDump.objects.filter(pk__in=stale).delete()
+
+
+class ProfilingMiddleware(object):
+    """
+    Profiles flagged or sampled requests, see module docstring.
+    Put it last, so only the view and its response are profiled.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        every = get_sample_every()
+        sampled = bool(every) and sampler.pick(every)
+        if not sampled and not (requested(request) and
+                                request.user.is_staff):
+            return None
+
+        request._rango_profile = RequestProfile(request, sampled)
+        request._rango_profile.start()
+
+    def process_response(self, request, response):
+        profile = getattr(request, '_rango_profile', None)
+        if profile is not None:
+            del request._rango_profile
+            dump = profile.stop(response)
+            response['X-Rango-Profile'] = str(dump.pk)
+        return response
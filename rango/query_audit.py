@@ -0,0 +1,136 @@
+"""
+EXPLAIN-based audit of the queries issued by Rango views and API.
+
+Every hot query is compiled to SQL and run through SQLite's
+`EXPLAIN QUERY PLAN`. Plans doing a full table scan or sorting
+through a temporary B-tree are reported as problems.
+"""
+import re
+from collections import namedtuple
+
+from django.db import connections
+from django.db.models import Q
+
+from rango.models import Category, Page, RelatedCategory
+
+
+# `allow_scan` holds the reason why a full scan is expected, if any.
+HotQuery = namedtuple('HotQuery', 'name queryset allow_scan')
+
+Problem = namedtuple('Problem', 'query detail kind')
+
+# "SCAN rango_page" (older SQLite: "SCAN TABLE rango_page"), but not
+# "SCAN rango_page USING INDEX ..." which walks an index in order.
+FULL_SCAN_RE = re.compile(r'^SCAN (TABLE )?\w+( AS \w+)?$')
+TEMP_SORT_RE = re.compile(r'USE TEMP B-TREE')
+
+
+def get_hot_queries():
+    """
+    Returns querysets mirroring the ones issued by `rango.views`.
+    Parameters are placeholders: plans do not depend on them.
+    """
+    return [
+        # index
+        HotQuery('index.top_categories',
+                 Category.objects.order_by('-likes')[:5], None),
+        HotQuery('index.most_viewed_categories',
+                 Category.objects.order_by('-views')[:5], None),
+        HotQuery('index.top_pages',
+                 Page.objects.order_by('-views')[:5], None),
+
+        # trending
+        HotQuery('trending.pages',
+                 Page.objects.select_related('category')
+                             .order_by('-trending')[:10], None),
+        HotQuery('trending.categories',
+                 Category.objects.order_by('-trending')[:10], None),
+
+        # category, category_pages
+        HotQuery('category.lookup',
+                 Category.objects.filter(slug='python'), None),
+        HotQuery('category.pages',
+                 Page.objects.filter(category_id=1)
+                             .order_by('-views', '-id')[:21], None),
+        HotQuery('category.pages_after',
+                 Page.objects.filter(category_id=1)
+                             .filter(views__lte=10)
+                             .filter(Q(views__lt=10) | Q(id__lt=100))
+                             .order_by('-views', '-id')[:21], None),
+        HotQuery('category.related',
+                 RelatedCategory.objects.filter(category_id=1)
+                                        .select_related('related'), None),
+
+        # goto, like_category
+        HotQuery('goto.page', Page.objects.filter(id=1), None),
+        HotQuery('like_category.category',
+                 Category.objects.filter(id=1), None),
+
+        # suggest_category
+        HotQuery('suggest_category.prefix',
+                 Category.objects.filter(name__istartswith='py')[:8],
+                 'case-insensitive LIKE cannot use the BINARY name index'),
+
+        # auto_add_page
+        HotQuery('auto_add_page.get_or_create',
+                 Page.objects.filter(category_id=1, title='Python'), None),
+
+        # API
+        HotQuery('cat-list', Category.objects.all(),
+                 'unpaginated list of all categories'),
+        HotQuery('cat-most-viewed',
+                 Category.objects.order_by('-views')[:10], None),
+        HotQuery('page-list', Page.objects.select_related('category'),
+                 'unpaginated list of all pages'),
+        HotQuery('specific-cat', Category.objects.filter(id=1), None),
+        HotQuery('specific-page',
+                 Page.objects.select_related('category').filter(id=1),
+                 None),
+    ]
+
+
+def explain(queryset):
+    """
+    Returns list of `EXPLAIN QUERY PLAN` detail lines for queryset.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'sqlite':
+        raise ValueError('EXPLAIN QUERY PLAN audit requires SQLite, '
+                         'got {0}'.format(connection.vendor))
+
+    sql, params = queryset.query.sql_with_params()
+    cursor = connection.cursor()
+    cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+    return [row[-1] for row in cursor.fetchall()]
+
+
+def find_problems(name, plan):
+    """
+    Returns list of problems found in the given query plan.
+    """
+    problems = []
+    for detail in plan:
+        if FULL_SCAN_RE.match(detail):
+            problems.append(Problem(name, detail, 'full scan'))
+        elif TEMP_SORT_RE.search(detail):
+            problems.append(Problem(name, detail, 'temporary sort'))
+    return problems
+
+
+def audit(queries=None):
+    """
+    Explains all hot queries.
+    Returns list of `(query, plan, problems)` tuples.
+    """
+    if queries is None:
+        queries = get_hot_queries()
+
+    results = []
+    for query in queries:
+        plan = explain(query.queryset)
+        problems = find_problems(query.name, plan)
+        if query.allow_scan:
+            problems = [p for p in problems if p.kind != 'full scan']
+        results.append((query, plan, problems))
+
+    return results
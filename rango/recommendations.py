@@ -0,0 +1,167 @@
+"""
+"Users who visited this category also visited..." recommendations.
+
+Offline job run by `manage.py build_related_categories`. The
+`(session, category)` pairs of click events of the last
+RANGO_RELATED_WINDOW hours, read in primary key chunks into NumPy
+arrays, form a sparse sessions x categories matrix `V`. The window
+defaults to RANGO_CLICK_EVENT_RETENTION, so results do not depend on
+whether `rollup_clicks` has compacted old events yet. `V.T * V` holds
+in cell `(i, j)` the number of sessions visiting both categories, its
+diagonal the sessions visiting each one. Co-visits are normalized to
+cosine similarity and the best K neighbours of every category are
+picked with a sort over all pairs, without Python loops. Results are
+stored in `RelatedCategory`, so the category view reads them with one
+query.
+
+Requires NumPy and SciPy, which the web views do not need.
+"""
+import time
+from datetime import timedelta
+
+import numpy as np
+from scipy import sparse
+
+from django.conf import settings
+from django.db import reset_queries, transaction
+from django.utils import timezone
+
+from rango.models import ClickEvent, RelatedCategory
+
+
+def get_top_k():
+    return getattr(settings, 'RANGO_RELATED_CATEGORIES', 5)
+
+
+def get_min_covisits():
+    return getattr(settings, 'RANGO_RELATED_MIN_COVISITS', 2)
+
+
+def get_window():
+    return getattr(settings, 'RANGO_RELATED_WINDOW',
+                   getattr(settings, 'RANGO_CLICK_EVENT_RETENTION', 24))
+
+
+def load_visits(since=None, chunk_size=100000):
+    """
+    Returns `(sessions, categories)` arrays: session index and
+    category id of each click with a session since `since`.
+    """
+    events = ClickEvent.objects.exclude(session_key='')
+    if since is not None:
+        events = events.filter(created__gte=since)
+
+    session_index = {}
+    sessions = []
+    categories = []
+    last_id = 0
+    while True:
+        rows = list(events.filter(id__gt=last_id).order_by('id').values_list(
+            'id', 'session_key', 'category_id')[:chunk_size])
+        if not rows:
+            break
+        ids, keys, chunk_categories = zip(*rows)
+        # Repeated visits are counted once by `covisitation`.
+        sessions.append(np.array(
+            [session_index.setdefault(key, len(session_index))
+             for key in keys], dtype=np.int64))
+        categories.append(np.array(chunk_categories, dtype=np.int64))
+        last_id = ids[-1]
+        # With DEBUG on, the query log would keep every chunk's SQL.
+        reset_queries()
+
+    if not sessions:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty
+    return np.concatenate(sessions), np.concatenate(categories)
+
+
+def covisitation(sessions, categories, n_categories):
+    """
+    Returns `(rows, cols, scores)` of category pairs visited in the
+    same session, scored by cosine similarity of their visitors.
+    `categories` are column indices in `[0, n_categories)`. Pairs
+    with less than RANGO_RELATED_MIN_COVISITS common sessions are
+    dropped as noise.
+    """
+    if not len(sessions) or not n_categories:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=np.float64)
+
+    visits = sparse.csr_matrix(
+        (np.ones(len(sessions), dtype=np.float64), (sessions, categories)),
+        shape=(sessions.max() + 1, n_categories))
+    # Duplicate pairs were summed, a session counts once.
+    visits.data[:] = 1
+
+    covisits = visits.T.dot(visits).tocoo()
+    visitors = covisits.diagonal()
+
+    rows, cols, counts = covisits.row, covisits.col, covisits.data
+    keep = (rows != cols) & (counts >= get_min_covisits())
+    rows, cols, counts = rows[keep], cols[keep], counts[keep]
+
+    scores = counts / np.sqrt(visitors[rows] * visitors[cols])
+    return rows, cols, scores
+
+
+def top_k(rows, cols, scores, k):
+    """
+    Keeps the `k` best scored pairs of every row.
+    Returns `(rows, cols, scores, ranks)`, ranks start at 0.
+    """
+    # By row, best score first, ties broken by column.
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+
+    # Position of each pair within its row.
+    ranks = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left')
+    keep = ranks < k
+    return rows[keep], cols[keep], scores[keep], ranks[keep]
+
+
+def related_categories(sessions, category_ids, k):
+    """
+    Returns `(category_ids, related_ids, scores, ranks)` arrays of
+    the `k` nearest neighbours of every visited category.
+    """
+    ids, columns = np.unique(category_ids, return_inverse=True)
+    rows, cols, scores = covisitation(sessions, columns, len(ids))
+    rows, cols, scores, ranks = top_k(rows, cols, scores, k)
+    return ids[rows], ids[cols], scores, ranks
+
+
+def build(k=None, now=None):
+    """
+    Recomputes and stores related categories.
+    Returns dict with numbers of visits, stored neighbours and
+    seconds spent in the load, compute and store steps.
+    """
+    if k is None:
+        k = get_top_k()
+    now = now or timezone.now()
+    stats = {}
+
+    start = time.time()
+    sessions, category_ids = load_visits(
+        since=now - timedelta(hours=get_window()))
+    stats['visits'] = len(sessions)
+    stats['load'] = time.time() - start
+
+    start = time.time()
+    neighbours = related_categories(sessions, category_ids, k)
+    stats['compute'] = time.time() - start
+
+    start = time.time()
+    with transaction.atomic():
+        RelatedCategory.objects.all().delete()
+        RelatedCategory.objects.bulk_create(
+            [RelatedCategory(category_id=category_id, related_id=related_id,
+                             score=score, rank=rank)
+             for category_id, related_id, score, rank in zip(
+                 *[a.tolist() for a in neighbours])],
+            batch_size=500)
+    stats['related'] = len(neighbours[0])
+    stats['store'] = time.time() - start
+
+    return stats
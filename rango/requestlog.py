@@ -0,0 +1,271 @@
+"""
+Sampled JSON-lines request log and its offline analysis.
+
+`MetricsMiddleware` hands every finished request to `log_request`,
+which writes a RANGO_REQUEST_LOG_SAMPLE fraction of them as one JSON
+object per line to the `rango.requests` logger (see LOGGING):
+
+    {"ts": 1434556800.1, "view": "category", "method": "GET",
+     "status": 200, "total": 0.0412, "db": 0.0061, "queries": 4,
+     "template": 0.0203, "external": 0.0, "bytes": 5130}
+
+Times are in seconds, `ts` is the Unix time the response left.
+
+`manage.py analyze_request_log` streams such files into `Histogram`s
+per view (and per view and hour), each holding at most a few hundred
+counters whatever the number of lines, and compares two time windows
+for regressions.
+"""
+import gzip
+import json
+import logging
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+
+
+logger = logging.getLogger('rango.requests')
+
+# Metrics of a record that can be analyzed.
+METRICS = ('total', 'db', 'template', 'external')
+
+PERCENTILES = (50, 95, 99)
+
+# Log-linear buckets over microseconds, the layout of
+# `rango.analytics.Distribution`: values below EXACT are exact, every
+# further power of two is split into SUB_BUCKETS (1.6% relative error).
+EXACT = 128
+SUB_BUCKETS = 64
+
+
+def get_sample_rate():
+    return getattr(settings, 'RANGO_REQUEST_LOG_SAMPLE', 0)
+
+
+def log_request(view, method, status, duration, stats, response):
+    """
+    Logs the request with probability RANGO_REQUEST_LOG_SAMPLE.
+    """
+    rate = get_sample_rate()
+    if not rate or random.random() >= rate:
+        return
+
+    size = None
+    if not getattr(response, 'streaming', False):
+        size = len(response.content)
+    logger.info(json.dumps({
+        'ts': round(time.time(), 3),
+        'view': view,
+        'method': method,
+        'status': status,
+        'total': round(duration, 6),
+        'db': round(stats.query_time, 6),
+        'queries': stats.queries,
+        'template': round(stats.template_time, 6),
+        'external': round(sum(seconds for _, seconds
+                              in stats.external.values()), 6),
+        'bytes': size,
+    }, sort_keys=True))
+
+
+def datetime_to_ts(value):
+    """
+    Unix time of a naive UTC datetime.
+    """
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+def bucket_index(value):
+    if value < EXACT:
+        return value
+    shift = value.bit_length() - 8
+    return EXACT + shift * SUB_BUCKETS + (value >> (shift + 1)) - SUB_BUCKETS
+
+
+def bucket_bounds(index):
+    """
+    Returns `(low, high)`, bucket `index` holds `[low, high)`.
+    """
+    if index < EXACT:
+        return index, index + 1
+    shift, sub = divmod(index - EXACT, SUB_BUCKETS)
+    width = 2 ** (shift + 1)
+    return (SUB_BUCKETS + sub) * width, (SUB_BUCKETS + sub + 1) * width
+
+
+class Histogram(object):
+    """
+    Sparse log-linear histogram of durations in seconds, stored as
+    microseconds.
+    """
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        micros = max(int(seconds * 1e6), 0)
+        self.counts[bucket_index(micros)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        """
+        Returns `q`-th percentile in seconds, interpolated within its
+        bucket, 0 when empty.
+        """
+        if not self.count:
+            return 0.0
+
+        rank = q / 100.0 * (self.count - 1)
+        seen = 0
+        for index in sorted(self.counts):
+            count = self.counts[index]
+            if seen + count > rank:
+                low, high = bucket_bounds(index)
+                value = low + (rank - seen + 0.5) / count * (high - low)
+                return min(value / 1e6, self.max)
+            seen += count
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'percentiles': [(q, self.percentile(q)) for q in PERCENTILES],
+        }
+
+
+def format_header(label='view'):
+    return '{0:<24} {1:>8} {2:>9} {3} {4:>9}'.format(
+        label, 'count', 'mean',
+        ' '.join('{0:>9}'.format('p{0}'.format(q)) for q in PERCENTILES),
+        'max')
+
+
+def format_row(label, summary):
+    """
+    Formats `Histogram.summary()` as a line under `format_header()`.
+    """
+    return '{0:<24} {1:>8} {2:>9.4f} {3} {4:>9.4f}'.format(
+        label, summary['count'], summary['mean'],
+        ' '.join('{0:>9.4f}'.format(value)
+                 for _, value in summary['percentiles']),
+        summary['max'])
+
+
+def open_log(path):
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def iter_records(paths, key='view'):
+    """
+    Yields records of JSON-lines files one by one. Lines that do not
+    parse, e.g. cut by a crash, or lack `key` are skipped.
+    """
+    for path in paths:
+        log = open_log(path)
+        try:
+            for line in log:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and key in record:
+                    yield record
+        finally:
+            if log is not sys.stdin:
+                log.close()
+
+
+def parse_time(value):
+    """
+    Parses `2015-06-01`, `2015-06-01T14` or `2015-06-01T14:30` (UTC)
+    into Unix time.
+    """
+    for fmt in ('%Y-%m-%dT%H:%M', '%Y-%m-%dT%H', '%Y-%m-%d'):
+        try:
+            return datetime_to_ts(datetime.strptime(value, fmt))
+        except ValueError:
+            pass
+    raise ValueError('Not a time: {0!r}'.format(value))
+
+
+def hour_of(ts):
+    return datetime.utcfromtimestamp(ts - ts % 3600)
+
+
+class LogAnalysis(object):
+    """
+    Histograms of one metric per view, per view and hour if `hourly`,
+    and per view within each of the named `windows`
+    (`{name: (start, end)}`).
+    """
+
+    def __init__(self, metric='total', windows=None, hourly=True):
+        self.metric = metric
+        self.windows = windows or {}
+        self.by_hour = hourly
+        self.views = defaultdict(Histogram)
+        self.hourly = defaultdict(Histogram)
+        self.windowed = defaultdict(lambda: defaultdict(Histogram))
+        self.records = 0
+
+    def add(self, record):
+        value = record.get(self.metric)
+        if value is None:
+            return
+
+        view, ts = record['view'], record.get('ts', 0)
+        self.records += 1
+        self.views[view].add(value)
+        if self.by_hour:
+            self.hourly[(view, hour_of(ts))].add(value)
+        for name, (start, end) in self.windows.items():
+            if start <= ts < end:
+                self.windowed[name][view].add(value)
+
+    def add_all(self, records):
+        for record in records:
+            self.add(record)
+        return self
+
+
+def find_regressions(baseline, current, threshold=1.2, min_count=20, q=95):
+    """
+    Returns `[(view, before, after)]` of views whose `q`-th percentile
+    in `current` exceeds that in `baseline` by more than `threshold`
+    times, worst first. Views with fewer than `min_count` requests in
+    either window are skipped.
+    """
+    regressions = []
+    for view, hist in current.items():
+        base = baseline.get(view)
+        if (base is None or base.count < min_count or
+                hist.count < min_count):
+            continue
+        before, after = base.percentile(q), hist.percentile(q)
+        if after > before * threshold:
+            regressions.append((view, before, after))
+    regressions.sort(key=lambda row: row[2] / max(row[1], 1e-6),
+                     reverse=True)
+    return regressions
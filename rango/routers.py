@@ -0,0 +1,114 @@
+"""
+Read-replica routing for Rango models.
+
+Reads of rango models go to a random alias from RANGO_READ_REPLICAS,
+writes always go to 'default'. After a rango write the current thread
+is pinned to 'default' for RANGO_REPLICA_LAG seconds, and
+`ReplicaPinMiddleware` carries the pin over to the next requests of the
+same client in a cookie, so users see their own writes (e.g. a page
+added with `add_page` or `auto_add_page`) even if replicas are behind.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+PIN_COOKIE = 'rango_db_pin'
+
+_local = threading.local()
+
+
+def get_replicas():
+    return getattr(settings, 'RANGO_READ_REPLICAS', ())
+
+
+def get_replica_lag():
+    """
+    Seconds for which replicas may lag behind 'default'.
+    """
+    return getattr(settings, 'RANGO_REPLICA_LAG', 5)
+
+
+def pin_to_primary(until=None):
+    """
+    Routes reads of the current thread to 'default' until given
+    timestamp (defaults to now + RANGO_REPLICA_LAG).
+    """
+    if until is None:
+        until = time.time() + get_replica_lag()
+    _local.pinned_until = max(until, getattr(_local, 'pinned_until', 0))
+
+
+def is_pinned():
+    return getattr(_local, 'pinned_until', 0) > time.time()
+
+
+def reset_pin():
+    _local.pinned_until = 0
+    _local.wrote = False
+
+
+class ReplicaRouter(object):
+
+    def is_rango_model(self, model):
+        return model._meta.app_label == 'rango'
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or not self.is_rango_model(model):
+            return None
+
+        if is_pinned():
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if not get_replicas() or not self.is_rango_model(model):
+            return None
+
+        # Read your writes: stick to primary while replicas catch up.
+        pin_to_primary()
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as primary.
+        databases = set(get_replicas())
+        databases.add(DEFAULT_DB_ALIAS)
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, model):
+        # Replicas are copies of primary, never migrated on their own.
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaPinMiddleware(object):
+    """
+    Keeps clients that have just written pinned to primary database
+    across requests.
+    """
+
+    def process_request(self, request):
+        reset_pin()
+
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        if pinned_until > time.time():
+            pin_to_primary(pinned_until)
+
+    def process_response(self, request, response):
+        if getattr(_local, 'wrote', False):
+            lag = get_replica_lag()
+            response.set_cookie(PIN_COOKIE, str(time.time() + lag),
+                                max_age=lag, httponly=True)
+        reset_pin()
+        return response
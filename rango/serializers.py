@@ -1,12 +1,15 @@
 from rest_framework import serializers
+
 from rango.models import Category, Page
+from rango.trending import heat
 
 
 class CatSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Category
-        fields = ('id', 'name', 'views', 'likes')
+        fields = ('id', 'name', 'views', 'likes',
+                  'page_count', 'total_page_views', 'last_activity')
 
 
 class PageSerializer(serializers.ModelSerializer):
@@ -15,3 +18,26 @@ class PageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Page
         fields = ('category', 'id', 'title', 'url', 'views')
+
+
+class HeatMixin(object):
+    """
+    Adds `heat`: decayed number of recent clicks (and likes).
+    """
+
+    def get_heat(self, obj):
+        return round(heat(obj.trending), 2)
+
+
+class TrendingCatSerializer(HeatMixin, CatSerializer):
+    heat = serializers.SerializerMethodField()
+
+    class Meta(CatSerializer.Meta):
+        fields = CatSerializer.Meta.fields + ('heat',)
+
+
+class TrendingPageSerializer(HeatMixin, PageSerializer):
+    heat = serializers.SerializerMethodField()
+
+    class Meta(PageSerializer.Meta):
+        fields = PageSerializer.Meta.fields + ('heat',)
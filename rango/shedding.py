@@ -0,0 +1,161 @@
+"""
+Load shedding of low-priority requests.
+
+`LoadSheddingMiddleware` counts requests in flight in this process and
+keeps the latencies of the last RANGO_SHED_WINDOW seconds, overall and
+per URL name. Their ratios to RANGO_SHED_MAX_IN_FLIGHT and
+RANGO_SHED_LATENCY_TARGET give the pressure:
+
+    pressure = max(in_flight / max_in_flight,
+                   max(latency, latency of the URL) / latency_target)
+
+A request of a priority class is answered with a fast 503 and
+`Retry-After` once pressure reaches the level of its class in
+RANGO_SHED_LEVELS. Searches on `category` go first, then
+`suggest_category`, then API lists. Everything else is core and always
+served. Latency samples come from served requests only and age out of
+the window, so shedding stops once a slow upstream recovers.
+
+Every request counted is finished in `process_response`, or on
+`got_request_exception` when an exception in another middleware or the
+view skips that.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.signals import got_request_exception
+from django.core.urlresolvers import Resolver404, resolve
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+
+API_LISTS = ('cat-list', 'cat-most-viewed', 'cat-trending',
+             'page-list', 'page-trending')
+
+# Latency samples kept per URL name.
+MAX_SAMPLES = 200
+
+
+def get_levels():
+    return dict(getattr(settings, 'RANGO_SHED_LEVELS',
+                        (('search', 1.0), ('suggest', 1.25), ('api', 1.5))))
+
+
+def get_priority(request, url_name):
+    """
+    Returns priority class of request, None for core requests.
+    """
+    if url_name == 'category' and request.method == 'POST':
+        return 'search'
+    if url_name == 'suggest_category':
+        return 'suggest'
+    if url_name in API_LISTS:
+        return 'api'
+    return None
+
+
+class LoadTracker(object):
+    """
+    Thread-safe in-flight counter and windowed latency samples.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+
+    def start(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def finish(self, url_name, latency, now):
+        with self.lock:
+            self.in_flight -= 1
+            self.samples[url_name].append((now, latency))
+            self.samples[None].append((now, latency))
+
+    def latency(self, url_name, now, window):
+        """
+        Mean latency of requests finished within `window` seconds,
+        0 without samples.
+        """
+        with self.lock:
+            recent = [latency for finished, latency
+                      in self.samples.get(url_name, ())
+                      if finished >= now - window]
+        return sum(recent) / len(recent) if recent else 0.0
+
+    def pressure(self, url_name, now):
+        max_in_flight = getattr(settings, 'RANGO_SHED_MAX_IN_FLIGHT', 16)
+        target = getattr(settings, 'RANGO_SHED_LATENCY_TARGET', 1.0)
+        window = getattr(settings, 'RANGO_SHED_WINDOW', 10)
+
+        latency = max(self.latency(None, now, window),
+                      self.latency(url_name, now, window))
+        return max(float(self.in_flight) / max_in_flight, latency / target)
+
+    def clear(self):
+        with self.lock:
+            self.in_flight = 0
+            self.samples.clear()
+
+
+tracker = LoadTracker()
+
+
+def service_unavailable():
+    response = HttpResponse('Server busy, try again later.', status=503,
+                            content_type='text/plain')
+    response['Retry-After'] = str(getattr(settings,
+                                          'RANGO_SHED_RETRY_AFTER', 5))
+    return response
+
+
+def finish_request(request):
+    """
+    Finishes the load of `request` in the tracker, once.
+    """
+    load = getattr(request, '_rango_load', None)
+    if load is not None:
+        url_name, started = load
+        now = time.time()
+        tracker.finish(url_name, now - started, now)
+        del request._rango_load
+
+
+@receiver(got_request_exception)
+def request_failed(sender, request=None, **kwargs):
+    # Sent before the 500 response, which may skip process_response.
+    if request is not None:
+        finish_request(request)
+
+
+class LoadSheddingMiddleware(object):
+    """
+    Sheds low-priority requests under load, see module docstring.
+    Put it first, so shed requests skip the other middleware.
+    """
+
+    def process_request(self, request):
+        # Resolved here, before sessions and auth, so shedding is cheap.
+        try:
+            url_name = resolve(request.path_info,
+                               getattr(request, 'urlconf', None)).url_name
+        except Resolver404:
+            url_name = None
+        now = time.time()
+
+        priority = get_priority(request, url_name)
+        if priority is not None:
+            level = get_levels().get(priority)
+            if level is not None and tracker.pressure(url_name, now) >= level:
+                return service_unavailable()
+
+        tracker.start()
+        request._rango_load = (url_name, now)
+
+    def process_response(self, request, response):
+        finish_request(request)
+        return response
@@ -0,0 +1,36 @@
+"""
+Per-connection SQLite tuning.
+
+`configure_connection` is connected to `connection_created` (see
+rango.apps) and applies `settings.SQLITE_PRAGMAS` to every new SQLite
+connection. With persistent connections (CONN_MAX_AGE) this happens
+once per worker thread rather than once per request.
+"""
+from django.conf import settings
+
+
+def get_pragmas():
+    """
+    Returns `(name, value)` pairs from SQLITE_PRAGMAS setting.
+    """
+    return getattr(settings, 'SQLITE_PRAGMAS', ())
+
+
+def pragma_statements(pragmas):
+    """
+    Turns `(name, value)` pairs into PRAGMA statements.
+    """
+    return ['PRAGMA {0} = {1}'.format(name, value)
+            for name, value in pragmas]
+
+
+def configure_connection(sender, connection, **kwargs):
+    """
+    `connection_created` signal handler.
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    cursor = connection.cursor()
+    for statement in pragma_statements(get_pragmas()):
+        cursor.execute(statement)
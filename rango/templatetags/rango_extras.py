@@ -1,5 +1,8 @@
 from django import template
-from rango.models import Category
+from django.core.exceptions import ValidationError
+from django.core.urlresolvers import reverse
+
+from rango.models import Category, validate_page_url
 
 
 register = template.Library()
@@ -8,3 +11,16 @@ register = template.Library()
 @register.inclusion_tag('rango/cats.html')
 def get_category_list(cat=None):
     return {'cats': Category.objects.all(), 'act_cat': cat}
+
+
+@register.filter
+def page_href(page):
+    """
+    Returns the link target of a page: its URL, or its goto link for
+    URLs other than http(s), stored before those were refused.
+    """
+    try:
+        validate_page_url(page.url)
+    except ValidationError:
+        return '{0}?page_id={1}'.format(reverse('goto'), page.id)
+    return page.url
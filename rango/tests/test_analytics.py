@@ -0,0 +1,138 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from rango.models import Page
+from rango.tests.test_views import add_cat, add_page
+
+try:
+    import numpy as np
+    from rango import analytics
+except ImportError:
+    np = None
+
+
+def exact_gini(values):
+    values = np.sort(np.asarray(values, dtype=np.float64))
+    n = len(values)
+    ranks = np.arange(1, n + 1)
+    return 2 * (ranks * values).sum() / (n * values.sum()) - (n + 1.0) / n
+
+
+@skipUnless(np, 'NumPy is required')
+class DistributionTests(TestCase):
+
+    def setUp(self):
+        self.rnd = np.random.RandomState(0)
+
+    def test_buckets(self):
+        """
+        Checks that every value falls into a bucket holding it and
+        buckets are narrow.
+        """
+        values = np.concatenate([np.arange(2000),
+                                 self.rnd.randint(0, 2 ** 62, 10000)])
+        index = analytics.bucket_index(values)
+        low, high = analytics.bucket_bounds()
+        self.assertTrue((index < analytics.BUCKETS).all())
+        self.assertTrue((low[index] <= values).all())
+        self.assertTrue((values < high[index]).all())
+        self.assertTrue(((high - low) / np.maximum(low, 1) <= 1 / 64.0)[
+            analytics.EXACT:].all())
+
+    def test_small_values_are_exact(self):
+        values = self.rnd.randint(0, 100, 1001)
+        dist = analytics.Distribution()
+        for chunk in np.array_split(values, 7):
+            dist.add(chunk)
+
+        self.assertEqual(dist.count, 1001)
+        self.assertEqual(dist.total, values.sum())
+        self.assertEqual((dist.min, dist.max), (values.min(), values.max()))
+        self.assertEqual(dist.percentile(50), np.percentile(
+            values, 50, interpolation='nearest'))
+        self.assertAlmostEqual(dist.gini(), exact_gini(values))
+
+        top = np.sort(values)[::-1][:101].sum() / float(values.sum())
+        self.assertAlmostEqual(dist.top_share(0.1), top)
+
+    def test_heavy_tail(self):
+        values = self.rnd.zipf(1.5, 100000)
+        dist = analytics.Distribution()
+        dist.add(values)
+
+        for q in (90, 99, 99.9):
+            expected = np.percentile(values, q)
+            self.assertAlmostEqual(dist.percentile(q) / expected, 1,
+                                   delta=0.02)
+        self.assertAlmostEqual(dist.gini(), exact_gini(values), places=2)
+
+    def test_histogram(self):
+        dist = analytics.Distribution()
+        dist.add([0, 1, 2, 3, 3, 7, 200])
+        self.assertEqual(dist.histogram()[:4],
+                         [(0, 1, 1), (1, 2, 1), (2, 4, 3), (4, 8, 1)])
+        self.assertEqual(dist.histogram()[-1], (128, 256, 1))
+
+    def test_empty(self):
+        summary = analytics.Distribution().summary()
+        self.assertEqual(summary['count'], 0)
+        self.assertEqual(summary['gini'], 0)
+        self.assertEqual(summary['histogram'], [])
+
+
+@skipUnless(np, 'NumPy is required')
+@override_settings(RANGO_REPORT_CACHE='default')
+class AnalyticsReportTests(TestCase):
+
+    def setUp(self):
+        analytics.get_report_cache().delete(analytics.REPORT_KEY)
+
+        python = add_cat('python', 0, 7)
+        django = add_cat('django', 0, 1)
+        add_cat('empty', 0, 0)
+        for views, cat in ((10, python), (30, python), (5, django)):
+            page = add_page(cat, 'page{0}'.format(views),
+                            'http://example.com/')
+            Page.objects.filter(id=page.id).update(views=views)
+
+    def test_report(self):
+        report = analytics.build_report(chunk_size=2)
+        self.assertEqual(analytics.get_report(), report)
+
+        self.assertEqual(report['page_views']['total'], 45)
+        self.assertEqual(report['category_likes']['total'], 8)
+        self.assertEqual(report['category_views']['count'], 2)
+
+        python, django = report['top_categories']
+        self.assertEqual(python['name'], 'python')
+        self.assertEqual((python['pages'], python['views'], python['max']),
+                         (2, 40, 30))
+        self.assertAlmostEqual(python['share'], 40 / 45.0)
+        self.assertEqual(django['likes'], 1)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('rango_analytics', top=1, stdout=out)
+        self.assertIn('page_views: count 3, total 45', out.getvalue())
+        self.assertIn('python: 2 pages, 40 views', out.getvalue())
+        self.assertNotIn('django:', out.getvalue())
+
+    def test_admin_view(self):
+        User.objects.create_superuser('admin', 'admin@example.com', '1234')
+        self.client.login(username='admin', password='1234')
+        url = reverse('admin:rango_analytics')
+
+        response = self.client.get(url)
+        self.assertContains(response, 'No report yet')
+
+        response = self.client.post(url)
+        self.assertRedirects(response, url)
+        response = self.client.get(url)
+        self.assertContains(response, 'Top categories by views')
+        self.assertContains(response, 'python')
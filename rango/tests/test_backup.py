@@ -0,0 +1,124 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from rango import backup
+from rango.counters import repair_category_counters
+from rango.models import Category, Page, UserProfile
+from rango.tests.test_views import add_cat, add_page, add_userprofile
+
+
+def snapshot():
+    return dict((model, list(model.objects.order_by('pk').values_list()))
+                for model in backup.MODELS)
+
+
+class BackupTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'rango.json.gz')
+
+        python = add_cat('Python', 10, 2)
+        django = add_cat('Django', 3, 1)
+        Category.objects.filter(pk=django.pk).update(
+            last_activity=timezone.now(), trending=1.5)
+        for i in range(5):
+            add_page(python, 'Page {0}'.format(i),
+                     'http://example.com/{0}'.format(i), views=i)
+        Page.objects.filter(title='Page 2').update(
+            first_visit=timezone.now(), last_visit=timezone.now())
+        page = add_page(django, u'Caf\xe9', 'http://example.com/cafe')
+        # Ids do not start at one nor follow each other.
+        Page.objects.filter(title='Page 3').delete()
+        Page.objects.filter(pk=page.pk).update(id=1000)
+
+        self.alice = User.objects.create_user('alice', password='1234')
+        self.bob = User.objects.create_user('bob', password='1234')
+        add_userprofile(self.alice, 'http://alice.com/')
+        add_userprofile(self.bob, 'http://bob.com/')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def clear(self):
+        UserProfile.objects.all().delete()
+        Page.objects.all().delete()
+        Category.objects.all().delete()
+
+    def test_round_trip(self):
+        before = snapshot()
+        out = StringIO()
+        call_command('rango_dump', self.path, chunk_size=2, stdout=out)
+        self.assertIn('rango.page: 5 rows', out.getvalue())
+
+        with gzip.open(self.path, 'rb') as dump:
+            lines = dump.read().splitlines()
+        self.assertEqual(json.loads(lines[0]), {'format': 'rango',
+                                                'version': 1})
+        self.assertEqual(len(lines), 1 + 3 + 2 + 5 + 2)
+
+        self.clear()
+        self.bob.delete()
+        out = StringIO()
+        call_command('rango_restore', self.path, chunk_size=2, stdout=out)
+
+        self.assertEqual(out.getvalue().splitlines(), [
+            'rango.category: 2 rows',
+            'rango.page: 5 rows',
+            'rango.userprofile: 1 rows, skipped 1 without user',
+        ])
+        after = snapshot()
+        self.assertEqual(after[Category], before[Category])
+        self.assertEqual(after[Page], before[Page])
+        self.assertEqual(after[UserProfile], before[UserProfile][:1])
+
+        # New rows do not collide with restored ids.
+        add_page(Category.objects.get(name='Python'), 'New',
+                 'http://example.com/new')
+
+    def test_restore_invalid_url(self):
+        Page.objects.filter(title='Page 4').update(
+            url='javascript:alert(1)')
+        call_command('rango_dump', self.path, stdout=StringIO())
+        self.clear()
+        out = StringIO()
+        call_command('rango_restore', self.path, stdout=out)
+        self.assertIn('rango.page: 4 rows, skipped 1 with invalid URL',
+                      out.getvalue())
+        self.assertFalse(Page.objects.filter(title='Page 4').exists())
+        python = Category.objects.get(name='Python')
+        self.assertEqual((python.page_count, python.total_page_views),
+                         (3, 3))
+        self.assertEqual(repair_category_counters([python.id]), 0)
+
+    def test_restore_checks(self):
+        call_command('rango_dump', self.path, stdout=StringIO())
+        with self.assertRaisesRegexp(CommandError, 'already has rows'):
+            call_command('rango_restore', self.path, stdout=StringIO())
+
+        self.clear()
+        path = os.path.join(self.dir, 'rango.json')
+        for content, error in (
+                ('{"model": "rango.category", "fields": []}\n',
+                 'Not a rango dump'),
+                ('{"format": "rango", "version": 1}\n'
+                 '{"model": "auth.user", "fields": ["id"]}\n',
+                 'Unknown model'),
+                ('{"format": "rango", "version": 1}\n'
+                 '{"model": "rango.category", "fields": ["id"]}\n'
+                 '[1', 'Cut or corrupt dump')):
+            with open(path, 'w') as dump:
+                dump.write(content)
+            with self.assertRaisesRegexp(CommandError, error):
+                call_command('rango_restore', path, stdout=StringIO())
+        self.assertFalse(Category.objects.exists())
@@ -0,0 +1,85 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from rango import benchmark, datagen
+
+
+@override_settings(RANGO_BUFFER_AUTO_FLUSH=False)
+class BenchmarkTests(TestCase):
+
+    def test_run(self):
+        """
+        Checks that every scenario is served and measured.
+        """
+        datagen.populate(5, 50)
+        results = benchmark.run(repeat=2)
+
+        self.assertEqual(len(results), 15)
+        for name, stats in results.items():
+            self.assertIn(stats['status'], (200, 302), name)
+            self.assertGreater(stats['queries'], 0, name)
+            self.assertTrue(0 < stats['p50'] <= stats['p95'] <= stats['max'],
+                            name)
+
+        results = benchmark.run(repeat=1, names=set(['index', 'goto']))
+        self.assertEqual(sorted(results), ['goto', 'index'])
+
+    def test_empty_database(self):
+        self.assertRaises(ValueError, benchmark.run)
+
+
+def results(**scenarios):
+    return {'meta': {}, 'scales': {'100': dict(
+        (name, {'p50': p50, 'queries': queries})
+        for name, (p50, queries) in scenarios.items())}}
+
+
+class CompareTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_compare(self):
+        baseline = results(index=(0.010, 5), category=(0.010, 5),
+                           goto=(0.0001, 3), gone=(0.01, 1))
+        current = results(index=(0.012, 5), category=(0.020, 5),
+                          goto=(0.0005, 4), new=(1.0, 9))
+
+        self.assertEqual(benchmark.compare(baseline, current), [
+            ('100', 'category', 'p50', 0.010, 0.020),
+            ('100', 'goto', 'queries', 3, 4),
+        ])
+        self.assertEqual(benchmark.compare(baseline, current, 2.5), [
+            ('100', 'goto', 'queries', 3, 4),
+        ])
+
+    def test_command_compare(self):
+        paths = []
+        for name, data in (('old', results(index=(0.010, 5))),
+                           ('same', results(index=(0.011, 5))),
+                           ('slow', results(index=(0.030, 5)))):
+            paths.append(os.path.join(self.dir, name + '.json'))
+            with open(paths[-1], 'w') as output:
+                json.dump(data, output)
+        old, same, slow = paths
+
+        out = StringIO()
+        call_command('benchmark_rango', compare=(old, same), stdout=out)
+        self.assertIn('No regressions.', out.getvalue())
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('benchmark_rango', compare=(old, slow), stdout=out)
+        self.assertIn('REGRESSION index @ 100 pages: p50 0.01 -> 0.03',
+                      out.getvalue())
@@ -0,0 +1,137 @@
+import time
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from rango.buffers import (CounterBuffer, WriteBehindBuffer, clear_buffers,
+                           group_by_increment)
+from rango.models import Category
+from rango.tests.test_views import add_cat
+
+
+@override_settings(RANGO_BUFFER_AUTO_FLUSH=False)
+class CounterBufferTests(TestCase):
+
+    def setUp(self):
+        self.flushed = []
+        self.buffer = CounterBuffer(self.flushed.append,
+                                    'TEST_BUFFER_MAX_AGE',
+                                    'TEST_BUFFER_MAX_PENDING')
+
+    @override_settings(TEST_BUFFER_MAX_AGE=60, TEST_BUFFER_MAX_PENDING=10)
+    def test_increments_are_coalesced(self):
+        """
+        Checks that increments are kept in memory and written
+        at once per key.
+        """
+        self.buffer.add(1)
+        self.buffer.add(2)
+        self.buffer.add(1, 3)
+        self.assertEqual(self.flushed, [])
+
+        self.buffer.flush()
+        self.assertEqual(self.flushed, [{1: 4, 2: 1}])
+
+        # Nothing pending, nothing to write.
+        self.buffer.flush()
+        self.assertEqual(len(self.flushed), 1)
+
+    @override_settings(TEST_BUFFER_MAX_AGE=60, TEST_BUFFER_MAX_PENDING=2)
+    def test_flush_when_full(self):
+        self.buffer.add(1)
+        self.buffer.add(2)
+        self.assertEqual(self.flushed, [{1: 1, 2: 1}])
+
+    @override_settings(TEST_BUFFER_MAX_AGE=0, TEST_BUFFER_MAX_PENDING=10)
+    def test_flush_when_old(self):
+        self.buffer.add(1)
+        self.assertEqual(self.flushed, [{1: 1}])
+
+    @override_settings(TEST_BUFFER_MAX_AGE=0.05, TEST_BUFFER_MAX_PENDING=10)
+    def test_age_of_oldest_item(self):
+        """
+        Checks that a quiet spell does not make the next item due.
+        """
+        time.sleep(0.1)
+        self.buffer.add(1)
+        self.assertEqual(self.flushed, [])
+        time.sleep(0.1)
+        self.buffer.add(2)
+        self.assertEqual(self.flushed, [{1: 1, 2: 1}])
+
+    @override_settings(TEST_BUFFER_MAX_AGE=0.05, TEST_BUFFER_MAX_PENDING=10,
+                       RANGO_BUFFER_AUTO_FLUSH=True)
+    def test_flush_by_timer(self):
+        """
+        Checks that old items are written without waiting for another
+        one, by a single timer per pending batch.
+        """
+        self.buffer.add(1)
+        self.buffer.add(2)
+        timer = self.buffer.timer
+        self.assertIsNotNone(timer)
+        timer.join(1)
+        self.assertEqual(self.flushed, [{1: 1, 2: 1}])
+        self.assertIsNone(self.buffer.timer)
+
+    @override_settings(TEST_BUFFER_MAX_AGE=60, TEST_BUFFER_MAX_PENDING=10)
+    def test_flush_at_exit(self):
+        self.buffer.add(1)
+        # Off for these tests.
+        self.buffer.flush_at_exit()
+        self.assertEqual(self.flushed, [])
+        self.assertIsNone(self.buffer.timer)
+
+        with self.settings(RANGO_BUFFER_AUTO_FLUSH=True):
+            self.buffer.flush_at_exit()
+        self.assertEqual(self.flushed, [{1: 1}])
+
+    @override_settings(TEST_BUFFER_MAX_AGE=60, TEST_BUFFER_MAX_PENDING=10,
+                       RANGO_BUFFER_AUTO_FLUSH=True)
+    def test_clear_buffers(self):
+        self.buffer.add(1)
+        timer = self.buffer.timer
+        clear_buffers()
+        self.assertIsNone(self.buffer.timer)
+        timer.join(1)
+        self.assertFalse(timer.is_alive())
+        self.buffer.flush()
+        self.assertEqual(self.flushed, [])
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            WriteBehindBuffer(self.flushed.append, 'TEST_BUFFER_MAX_AGE',
+                              'TEST_BUFFER_MAX_PENDING')
+
+    def test_group_by_increment(self):
+        groups = group_by_increment({1: 2, 2: 1, 3: 2})
+        self.assertEqual(sorted(groups[2]), [1, 3])
+        self.assertEqual(groups[1], [2])
+
+
+@override_settings(RANGO_BUFFER_AUTO_FLUSH=False)
+class CategoryViewsTests(TestCase):
+
+    def setUp(self):
+        self.cat = add_cat('rango_test', 0, 0)
+        self.url = '/rango/category/' + self.cat.slug + '/'
+
+    @override_settings(RANGO_VIEW_BUFFER_MAX_AGE=60)
+    def test_views_written_on_flush(self):
+        """
+        Checks that category visits are buffered and written in bulk.
+        """
+        from rango.buffers import category_views
+        category_views.flush()
+
+        for i in range(3):
+            self.client.get(self.url)
+        self.assertEqual(Category.objects.get(id=self.cat.id).views, 0)
+
+        category_views.flush()
+        self.assertEqual(Category.objects.get(id=self.cat.id).views, 3)
+
+    @override_settings(RANGO_VIEW_BUFFER_MAX_AGE=0)
+    def test_search_is_not_a_view(self):
+        self.client.post(self.url, data={'query': ''})
+        self.assertEqual(Category.objects.get(id=self.cat.id).views, 0)
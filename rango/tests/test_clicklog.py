@@ -0,0 +1,133 @@
+import datetime
+
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from rango import clicklog
+from rango.models import ClickEvent, PageViewRollup, CategoryViewRollup
+from rango.tests.test_views import add_cat, add_page
+
+
+@override_settings(RANGO_BUFFER_AUTO_FLUSH=False)
+class ClickLogTests(TestCase):
+
+    def setUp(self):
+        # Drop clicks buffered by other tests.
+        clicklog.click_events.clear()
+
+        self.cat = add_cat('rango_test', 0, 0)
+        self.page = add_page(self.cat, 'spam', 'http://example.com/')
+        self.other = add_page(self.cat, 'eggs', 'http://example.com/')
+
+        # 2015-07-05 12:30 UTC
+        self.now = datetime.datetime(2015, 7, 5, 12, 30,
+                                     tzinfo=timezone.utc)
+
+    def add_events(self, page, *hours_ago):
+        ClickEvent.objects.bulk_create([
+            ClickEvent(page=page, category=self.cat,
+                       created=self.now - datetime.timedelta(hours=h))
+            for h in hours_ago])
+
+    @override_settings(RANGO_CLICK_BUFFER_MAX_AGE=0)
+    def test_track_url_logs_click(self):
+        """
+        Checks that every click is appended to the log.
+        """
+        self.client.get(reverse('goto'), data={'page_id': self.page.id})
+        self.client.get(reverse('goto'), data={'page_id': self.page.id})
+
+        events = ClickEvent.objects.filter(page=self.page)
+        self.assertEqual(events.count(), 2)
+        self.assertEqual(events[0].category, self.cat)
+
+    @override_settings(RANGO_CLICK_BUFFER_MAX_AGE=60)
+    def test_clicks_are_inserted_in_batches(self):
+        self.client.get(reverse('goto'), data={'page_id': self.page.id})
+        self.assertEqual(ClickEvent.objects.count(), 0)
+
+        clicklog.click_events.flush()
+        self.assertEqual(ClickEvent.objects.count(), 1)
+
+    def test_rollup(self):
+        """
+        Checks hourly and daily buckets per page and per category.
+        Events of the current hour are left for the next run.
+        """
+        self.add_events(self.page, 0.2, 1, 1.2, 13)
+        self.add_events(self.other, 1)
+
+        rolled_up = clicklog.rollup(now=self.now, chunk_size=2)
+        self.assertEqual(rolled_up, 4)
+
+        hourly = PageViewRollup.objects.filter(page=self.page, period='h')
+        self.assertEqual(
+            sorted((r.start.hour, r.start.day, r.views) for r in hourly),
+            [(11, 5, 2), (23, 4, 1)])
+
+        daily = CategoryViewRollup.objects.filter(period='d')
+        self.assertEqual(
+            sorted((r.start.day, r.views) for r in daily),
+            [(4, 1), (5, 3)])
+
+        # Rerun counts nothing twice, next hour picks the rest up.
+        self.assertEqual(clicklog.rollup(now=self.now), 0)
+        later = self.now + datetime.timedelta(hours=1)
+        self.assertEqual(clicklog.rollup(now=later), 1)
+        self.assertEqual(
+            PageViewRollup.objects.get(page=self.page, period='d',
+                                       start=clicklog.day_start(self.now)
+                                       ).views, 3)
+
+    @override_settings(RANGO_CLICK_EVENT_RETENTION=2,
+                       RANGO_HOURLY_ROLLUP_RETENTION=1)
+    def test_compact(self):
+        """
+        Checks that only rolled up events past retention are deleted.
+        """
+        self.add_events(self.page, 1, 3, 50)
+        clicklog.rollup(now=self.now - datetime.timedelta(hours=2))
+
+        events, hourly = clicklog.compact(now=self.now)
+        self.assertEqual(events, 2)
+        # Hourly buckets of the event 50 hours ago (page + category).
+        self.assertEqual(hourly, 2)
+        self.assertEqual(ClickEvent.objects.count(), 1)
+        self.assertEqual(PageViewRollup.objects.filter(period='d').count(),
+                         2)
+
+    def test_views_in_window(self):
+        """
+        Checks windows crossing midnight combine hourly and daily
+        rollups and never read raw events.
+        """
+        self.add_events(self.page, 1, 13, 30, 40, 80)
+        self.add_events(self.other, 1)
+        clicklog.rollup(now=self.now)
+        ClickEvent.objects.all().delete()
+
+        hour = datetime.timedelta(hours=1)
+        self.assertEqual(
+            clicklog.views_in_window(self.now - 2 * hour, self.now,
+                                     page=self.page), 1)
+        self.assertEqual(
+            clicklog.views_in_window(self.now - 48 * hour, self.now,
+                                     page=self.page), 4)
+        self.assertEqual(
+            clicklog.views_in_window(self.now - 100 * hour, self.now,
+                                     category=self.cat), 6)
+        self.assertEqual(
+            clicklog.views_in_window(self.now - 2 * hour, self.now), 2)
+        self.assertEqual(
+            clicklog.views_in_window(self.now, self.now, page=self.page), 0)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('rollup_clicks', stdout=out)
+        self.assertIn('Rolled up 0 events.', out.getvalue())
+        self.assertIn('Deleted 0 events and 0 hourly rollups.',
+                      out.getvalue())
@@ -0,0 +1,62 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from rango import datagen
+from rango.counters import repair_category_counters
+from rango.models import Category, Page
+
+
+class GenerateTests(TestCase):
+
+    def snapshot(self):
+        return (list(Category.objects.order_by('slug').values_list(
+                    'slug', 'views', 'likes', 'page_count')),
+                list(Page.objects.order_by('title').values_list(
+                    'title', 'category__slug', 'views', 'last_visit')))
+
+    def test_generate(self):
+        """
+        Checks counts, denormalized counters, visit order and skew.
+        """
+        datagen.generate(20, 2000, users=3, seed=1, chunk_size=300)
+
+        self.assertEqual(Category.objects.count(), 20)
+        self.assertEqual(Page.objects.count(), 2000)
+        self.assertEqual(repair_category_counters(), 0)
+
+        for first, last in Page.objects.values_list('first_visit',
+                                                    'last_visit'):
+            self.assertEqual(first is None, last is None)
+            self.assertTrue(first is None or first <= last)
+
+        page_counts = sorted(Category.objects.values_list('page_count',
+                                                          flat=True))
+        self.assertGreater(page_counts[-1], 4 * page_counts[10])
+        views = sorted(Page.objects.values_list('views', flat=True))
+        self.assertGreater(sum(views[-400:]), sum(views) / 2)
+
+        self.assertTrue(self.client.login(username='user2',
+                                          password='password'))
+
+    def test_deterministic(self):
+        now = timezone.now()
+        datagen.generate(5, 100, seed=7, now=now)
+        first = self.snapshot()
+        Page.objects.all().delete()
+        Category.objects.all().delete()
+        datagen.generate(5, 100, seed=7, now=now)
+        self.assertEqual(self.snapshot(), first)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('generate_rango_data', pages=300, users=2, stdout=out)
+        self.assertIn('Generated 3 categories, 300 pages and 2 users',
+                      out.getvalue())
+        self.assertEqual(User.objects.count(), 2)
+
+        with self.assertRaises(CommandError):
+            call_command('generate_rango_data', pages=10, stdout=out)
@@ -0,0 +1,186 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from rango import dedup
+from rango.canonical import canonicalize, url_hash
+from rango.history import record_visits
+from rango.models import (Category, ClickEvent, Page, PageHistory,
+                          PageViewRollup, ViewRollup)
+from rango.tests.test_views import add_cat
+
+
+class CanonicalTests(SimpleTestCase):
+
+    def test_canonicalize(self):
+        for url, canonical in (
+                ('HTTP://Example.COM', 'http://example.com/'),
+                ('http://example.com:80/a/', 'http://example.com/a'),
+                ('https://example.com:443//', 'https://example.com/'),
+                ('https://example.com:8443/a', 'https://example.com:8443/a'),
+                ('http://User@Example.com/Path/',
+                 'http://User@example.com/Path'),
+                ('http://example.com/a?b=2&utm_source=x&a=1&fbclid=y#top',
+                 'http://example.com/a?a=1&b=2'),
+                ('http://example.com/?UTM_Medium=x', 'http://example.com/'),
+                (' http://example.com/a?b=A%20B ',
+                 'http://example.com/a?b=A%20B')):
+            self.assertEqual(canonicalize(url), canonical, url)
+
+        self.assertEqual(url_hash('http://Example.com/a/'),
+                         url_hash('http://example.com/a?utm_campaign=1'))
+        self.assertNotEqual(url_hash('http://example.com/a'),
+                            url_hash('https://example.com/a'))
+
+    @override_settings(RANGO_URL_TRACKING_PARAMS=('ref',))
+    def test_tracking_params_setting(self):
+        self.assertEqual(canonicalize('http://a.com/?ref=1&utm_source=2'),
+                         'http://a.com/?utm_source=2')
+
+
+class DuplicateOnAddTests(TestCase):
+
+    def setUp(self):
+        self.cat = add_cat('Python', 0, 0)
+        self.page = Page(category=self.cat, title='Python',
+                         url='https://www.python.org/')
+        self.page.save()
+        User.objects.create_user(username='alice', password='1234')
+        self.client.login(username='alice', password='1234')
+
+    def test_save_sets_hash(self):
+        self.assertEqual(self.page.url_hash,
+                         url_hash('https://WWW.python.org'))
+        self.assertEqual(
+            list(dedup.pages_for_url('https://www.python.org/?utm_id=1')),
+            [self.page])
+        self.assertEqual(dedup.find_duplicate(self.cat,
+                                              'https://www.python.org'),
+                         self.page)
+        self.assertIsNone(dedup.find_duplicate(add_cat('Other', 0, 0),
+                                               'https://www.python.org'))
+
+    def test_add_page(self):
+        url = reverse('add_page', args=[self.cat.slug])
+        response = self.client.post(url, {
+            'title': 'Home', 'url': 'https://www.python.org/#about'})
+        self.assertContains(response, 'already in the category as '
+                                      '&quot;Python&quot;')
+        self.assertEqual(Page.objects.count(), 1)
+
+        self.client.post(url, {'title': 'Docs',
+                               'url': 'https://docs.python.org/'})
+        self.assertEqual(Page.objects.count(), 2)
+
+    def test_auto_add_page(self):
+        self.client.get(reverse('auto_add_page'), {
+            'title_data': 'Home', 'url_data': 'HTTPS://www.python.org',
+            'catid_data': self.cat.id})
+        self.assertEqual(list(Page.objects.all()), [self.page])
+
+    def test_api_url_filter(self):
+        Page(category=add_cat('Web', 0, 0), title='Python',
+             url='https://www.python.org/?utm_source=web').save()
+        Page(category=self.cat, title='Docs',
+             url='https://docs.python.org/').save()
+
+        response = self.client.get(reverse('page-list'),
+                                   {'url': 'https://WWW.python.org'})
+        pages = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(sorted(page['category']['name'] for page in pages),
+                         ['Python', 'Web'])
+        self.assertEqual(
+            len(json.loads(self.client.get(reverse('page-list'))
+                           .content.decode('utf-8'))), 3)
+
+
+class DedupeTests(TestCase):
+
+    def setUp(self):
+        self.cat = add_cat('Python', 0, 0)
+        self.other = add_cat('Web', 0, 0)
+        now = timezone.now()
+        self.hour = now.replace(minute=0, second=0, microsecond=0)
+
+        self.pages = []
+        for cat, url, views, first, last in (
+                (self.cat, 'http://python.org/', 5, 3, 2),
+                (self.cat, 'HTTP://python.org', 7, 5, 1),
+                (self.cat, 'http://python.org/?utm_source=x', 1, None, None),
+                (self.cat, 'http://docs.python.org/', 2, None, None),
+                (self.other, 'http://python.org/', 4, None, None)):
+            page = Page(category=cat, title='Page', url=url, views=views,
+                        first_visit=first and now - timedelta(days=first),
+                        last_visit=last and now - timedelta(days=last))
+            page.save()
+            self.pages.append(page)
+
+        keep, dup = self.pages[:2]
+        for page in (keep, dup, dup):
+            ClickEvent.objects.create(page=page, category=self.cat,
+                                      created=now)
+        PageViewRollup.objects.create(page=keep, period=ViewRollup.HOURLY,
+                                      start=self.hour, views=2)
+        PageViewRollup.objects.create(page=dup, period=ViewRollup.HOURLY,
+                                      start=self.hour, views=3)
+        PageViewRollup.objects.create(page=dup, period=ViewRollup.DAILY,
+                                      start=self.hour, views=1)
+        self.user = User.objects.create_user(username='alice',
+                                             password='1234')
+        record_visits(self.user, [keep.id, self.pages[3].id, dup.id])
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('dedupe_pages', dry_run=True, stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), [
+            '{0} <- {1}, {2}'.format(*[page.id for page in self.pages[:3]]),
+            'Found 2 duplicates in 1 groups.',
+        ])
+        self.assertEqual(Page.objects.count(), 5)
+
+    def test_dedupe(self):
+        keep, dup, tracked, docs, other = self.pages
+        out = StringIO()
+        call_command('dedupe_pages', stdout=out)
+        self.assertIn('Merged 2 duplicates in 1 groups.', out.getvalue())
+
+        self.assertEqual(
+            sorted(Page.objects.values_list('id', flat=True)),
+            [keep.id, docs.id, other.id])
+        merged = Page.objects.get(id=keep.id)
+        self.assertEqual(merged.views, 13)
+        self.assertEqual(merged.first_visit, dup.first_visit)
+        self.assertEqual(merged.last_visit, dup.last_visit)
+        self.assertGreater(merged.trending, keep.trending)
+
+        self.assertEqual(ClickEvent.objects.filter(page=keep).count(), 3)
+        self.assertEqual(
+            sorted(PageViewRollup.objects.values_list('page', 'period',
+                                                      'views')),
+            [(keep.id, ViewRollup.DAILY, 1), (keep.id, ViewRollup.HOURLY, 5)])
+        self.assertEqual(PageHistory.objects.get(user=self.user).page_ids,
+                         '{0},{1}'.format(keep.id, docs.id))
+
+        cat = Category.objects.get(id=self.cat.id)
+        self.assertEqual((cat.page_count, cat.total_page_views), (2, 15))
+
+        out = StringIO()
+        call_command('dedupe_pages', stdout=out)
+        self.assertIn('Merged 0 duplicates in 0 groups.', out.getvalue())
+
+    def test_rehash(self):
+        docs = self.pages[3]
+        Page.objects.filter(id=docs.id).update(url_hash='')
+        with override_settings(RANGO_URL_TRACKING_PARAMS=()):
+            self.assertEqual(dedup.rehash(), 2)
+        self.assertEqual(Page.objects.get(id=docs.id).url_hash,
+                         url_hash(docs.url))
+        self.assertNotEqual(Page.objects.get(id=self.pages[2].id).url_hash,
+                            self.pages[0].url_hash)
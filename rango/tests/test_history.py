@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from rango import history
+from rango.models import PageHistory
+from rango.tests.test_views import add_cat, add_page
+
+
+@override_settings(RANGO_BUFFER_AUTO_FLUSH=False)
+class PageHistoryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='test_user',
+                                             password='1234')
+        cat = add_cat('rango_test', 0, 0)
+        self.pages = [add_page(cat, 'page{0}'.format(i), 'http://example.com/')
+                      for i in range(5)]
+
+    def titles(self):
+        return [p.title for p in history.get_recent_pages(self.user)]
+
+    def test_push_id(self):
+        self.assertEqual(history.push_id([3, 2, 1], 4, 3), [4, 3, 2])
+        self.assertEqual(history.push_id([3, 2, 1], 1, 3), [1, 3, 2])
+        self.assertEqual(history.push_id([], 1, 3), [1])
+
+    @override_settings(RANGO_RECENT_PAGES=3)
+    def test_history_is_capped(self):
+        """
+        Checks that only the latest pages are kept, in one row.
+        """
+        for page in self.pages:
+            self.assertTrue(history.record_visit(self.user, page))
+
+        self.assertEqual(self.titles(), ['page4', 'page3', 'page2'])
+        self.assertEqual(PageHistory.objects.count(), 1)
+
+    def test_revisit_moves_to_front(self):
+        for page in self.pages[:3] + self.pages[:1]:
+            history.record_visit(self.user, page)
+        self.assertEqual(self.titles(), ['page0', 'page2', 'page1'])
+
+    def test_deleted_pages_are_skipped(self):
+        for page in self.pages[:3]:
+            history.record_visit(self.user, page)
+        self.pages[1].delete()
+        self.assertEqual(self.titles(), ['page2', 'page0'])
+
+    def test_track_url_and_user_settings(self):
+        # Anonymous clicks are not recorded.
+        self.client.get(reverse('goto'), data={'page_id': self.pages[0].id})
+        self.assertFalse(PageHistory.objects.exists())
+
+        self.client.login(username='test_user', password='1234')
+        self.client.get(reverse('goto'), data={'page_id': self.pages[1].id})
+        self.client.get(reverse('goto'), data={'page_id': self.pages[2].id})
+
+        response = self.client.get(reverse('user_settings'))
+        self.assertEqual([p.title for p in response.context['recent_pages']],
+                         ['page2', 'page1'])
+        self.assertContains(response, 'Recently visited')
@@ -0,0 +1,302 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from rango import ingest
+from rango.counters import repair_category_counters
+from rango.models import Category, Page
+from rango.tests.test_requestlog import capture_logs
+from rango.tests.test_views import add_cat
+
+
+class CleanTests(TestCase):
+
+    def test_clean_row(self):
+        fields = ingest.clean_row({
+            'category': ' Python ', 'title': 'Docs',
+            'url': 'http://docs.python.org/', 'views': '12',
+            'first_visit': '2015-06-01', 'last_visit': None})
+        self.assertEqual(fields['category'], 'Python')
+        self.assertEqual(fields['views'], 12)
+        self.assertEqual(fields['first_visit'].date().isoformat(),
+                         '2015-06-01')
+        self.assertTrue(timezone.is_aware(fields['first_visit']))
+        self.assertIsNone(fields['last_visit'])
+
+        page = {'category': 'Python', 'title': 'Docs',
+                'url': 'http://docs.python.org/'}
+        for row, error in (
+                (None, 'not an object'),
+                (dict(page, title=' '), 'missing title'),
+                (dict(page, title='x' * 129),
+                 'title longer than 128 characters'),
+                (dict(page, url='docs'), 'invalid url'),
+                (dict(page, url='javascript:alert(1)'), 'invalid url'),
+                (dict(page, views='many'), 'invalid views'),
+                (dict(page, views=-1), 'negative views'),
+                (dict(page, last_visit='yesterday'), 'invalid last_visit')):
+            with self.assertRaisesRegexp(ValueError, '^{0}$'.format(error)):
+                ingest.clean_row(row)
+
+    def test_clean_visits(self):
+        """
+        Checks the rules of `Page.save` on a batch.
+        """
+        now = timezone.now()
+        past, future = now - timedelta(days=1), now + timedelta(days=1)
+        rows = [
+            {'first_visit': past, 'last_visit': now},
+            {'first_visit': future, 'last_visit': future},
+            {'first_visit': now, 'last_visit': past},
+            {'last_visit': past},
+            {},
+        ]
+        cleaned = ingest.clean_visits(rows, now)
+
+        self.assertEqual(rows, [
+            {'first_visit': past, 'last_visit': now},
+            {'first_visit': None, 'last_visit': None},
+            {'first_visit': None, 'last_visit': past},
+            {'last_visit': past},
+            {},
+        ])
+        self.assertEqual(cleaned, {'last_visit in the future': 1,
+                                   'first_visit in the future': 1,
+                                   'first_visit after last_visit': 1})
+
+
+class ImportTests(TestCase):
+
+    def setUp(self):
+        self.python = add_cat('Python', 0, 0)
+        self.django = add_cat('Django', 0, 0)
+        Page(category=self.python, title='Docs', url='http://a.com/',
+             views=5).save()
+        self.handler = capture_logs(self, ingest.logger)
+
+    def test_import(self):
+        now = timezone.now()
+        rows = [
+            {'category': 'Python', 'title': 'Docs', 'url': 'http://b.com/',
+             'views': 7},
+            {'category': 'Python', 'title': 'Tutorial',
+             'url': 'http://c.com/', 'views': 3,
+             'last_visit': (now + timedelta(days=1)).isoformat()},
+            {'category': 'Django', 'title': 'Docs', 'url': 'http://d.com/',
+             'first_visit': (now - timedelta(days=2)).isoformat()},
+            {'category': 'Ruby', 'title': 'Docs', 'url': 'http://e.com/'},
+            {'category': 'Django', 'title': 'Docs', 'url': 'http://f.com/',
+             'views': 1},
+            {'category': 'Django', 'title': 'Blog', 'url': 'ftp'},
+        ]
+        result = ingest.import_pages(rows, batch_size=4, now=now)
+
+        self.assertEqual((result.created, result.updated, result.rejected),
+                         (2, 2, 2))
+        self.assertEqual(result.errors, [(4, 'unknown category'),
+                                         (6, 'invalid url')])
+        self.assertEqual(self.handler.lines, [
+            'Rows 1-4: rejected 1: row 4: unknown category',
+            'Rows 1-4: cleaned 1 last_visit in the future.',
+            'Rows 5-6: rejected 1: row 6: invalid url',
+        ])
+
+        docs = Page.objects.get(category=self.python, title='Docs')
+        self.assertEqual((docs.url, docs.views), ('http://b.com/', 7))
+        tutorial = Page.objects.get(title='Tutorial')
+        self.assertIsNone(tutorial.last_visit)
+        # Created by the first batch, updated by the second.
+        self.assertEqual(
+            list(Page.objects.filter(category=self.django).values_list(
+                'url', 'views')),
+            [('http://f.com/', 1)])
+
+        self.assertEqual(Category.objects.get(pk=self.django.pk)
+                         .last_activity, now - timedelta(days=2))
+        self.assertCounters()
+
+    def test_last_row_wins(self):
+        result = ingest.import_pages([
+            {'category': 'Django', 'title': 'Docs', 'url': 'http://a.com/'},
+            {'category': 'Django', 'title': 'Docs', 'url': 'http://b.com/',
+             'views': 2},
+        ])
+        self.assertEqual((result.created, result.updated), (1, 0))
+        self.assertEqual(dict(result.cleaned),
+                         {'superseded by a later row': 1})
+        page = Page.objects.get(category=self.django)
+        self.assertEqual((page.url, page.views), ('http://b.com/', 2))
+        self.assertCounters()
+
+    def test_visits_merged_with_stored(self):
+        """
+        Checks that a visit given for an existing page is cleaned
+        together with the stored one it leaves in place.
+        """
+        now = timezone.now()
+        docs = Page.objects.get(title='Docs')
+        docs.first_visit = now - timedelta(days=2)
+        docs.last_visit = now - timedelta(days=1)
+        docs.save()
+
+        result = ingest.import_pages([
+            {'category': 'Python', 'title': 'Docs', 'url': 'http://a.com/',
+             'last_visit': (now - timedelta(days=3)).isoformat()},
+        ], now=now)
+        self.assertEqual(dict(result.cleaned),
+                         {'first_visit after last_visit': 1})
+        docs = Page.objects.get(pk=docs.pk)
+        self.assertIsNone(docs.first_visit)
+        self.assertEqual(docs.last_visit, now - timedelta(days=3))
+
+        # Valid with the stored last visit, the first is written as is.
+        result = ingest.import_pages([
+            {'category': 'Python', 'title': 'Docs', 'url': 'http://a.com/',
+             'first_visit': (now - timedelta(days=4)).isoformat()},
+        ], now=now)
+        self.assertFalse(result.cleaned)
+        docs = Page.objects.get(pk=docs.pk)
+        self.assertEqual((docs.first_visit, docs.last_visit),
+                         (now - timedelta(days=4), now - timedelta(days=3)))
+
+    def assertCounters(self):
+        for cat in Category.objects.all():
+            pages = Page.objects.filter(category=cat)
+            self.assertEqual(
+                (cat.page_count, cat.total_page_views),
+                (pages.count(), sum(pages.values_list('views', flat=True))))
+        self.assertEqual(repair_category_counters(), 0)
+
+
+class ImportCommandTests(TestCase):
+
+    def setUp(self):
+        add_cat('Python', 0, 0)
+        capture_logs(self, ingest.logger)
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as output:
+            output.write(content)
+        return path
+
+    def test_import_pages(self):
+        csv = self.write('pages.csv',
+                         'category,title,url,views,last_visit\n'
+                         'Python,Docs,http://a.com/,3,2015-06-01T12:00\n'
+                         'Python,Blog,http://b.com/,,\n'
+                         'Python,Bad,http://c.com/,x,\n')
+        ndjson = self.write('pages.json', '\n'.join([
+            json.dumps({'category': 'Python', 'title': 'Docs',
+                        'url': 'http://d.com/'}),
+            '',
+            '{"cut',
+        ]))
+
+        out, err = StringIO(), StringIO()
+        call_command('import_pages', csv, ndjson, workers=2, stdout=out,
+                     stderr=err)
+
+        self.assertEqual(out.getvalue().splitlines(), [
+            csv + ': 2 created, 0 updated, 1 rejected.',
+            ndjson + ': 0 created, 1 updated, 1 rejected.',
+        ])
+        self.assertIn('row 3: invalid views', err.getvalue())
+        self.assertIn('row 2: not an object', err.getvalue())
+        self.assertEqual(Page.objects.get(title='Docs').url, 'http://d.com/')
+        self.assertEqual(Page.objects.get(title='Blog').views, 0)
+
+
+class ImportFileTests(TestCase):
+
+    def setUp(self):
+        add_cat('Python', 0, 0)
+        add_cat('Django', 0, 0)
+        self.handler = capture_logs(self, ingest.logger)
+
+    def test_workers(self):
+        """
+        Checks that batches prepared in worker processes are written
+        in file order, as in one process.
+        """
+        lines = []
+        for i in range(50):
+            lines.append(json.dumps({
+                'category': ('Python', 'Django', 'Ruby')[i % 3],
+                'title': 'Page {0}'.format(i % 20),
+                'url': 'http://example.com/{0}'.format(i), 'views': i}))
+        lines.insert(10, '{"cut')
+        content = StringIO('\n'.join(lines))
+
+        result = ingest.import_file(content, 'ndjson', batch_size=7,
+                                    workers=2)
+        pages = list(Page.objects.order_by('category__name', 'title')
+                     .values_list('category__name', 'title', 'url'))
+
+        Page.objects.all().delete()
+        self.handler.lines = []
+        content.seek(0)
+        self.assertEqual(
+            ingest.import_file(content, 'ndjson', batch_size=7).as_dict(),
+            result.as_dict())
+        self.assertEqual(
+            list(Page.objects.order_by('category__name', 'title')
+                 .values_list('category__name', 'title', 'url')), pages)
+        self.assertEqual(result.rejected, 17)
+        self.assertIn((11, 'not an object'), result.errors)
+
+    def test_csv_records(self):
+        content = StringIO('category,title,url\n'
+                           'Python,"Two\nlines",http://a.com/\n'
+                           '\n'
+                           'Django,Docs,http://b.com/\n')
+        result = ingest.import_file(content, 'csv', workers=2)
+        self.assertEqual((result.created, result.rejected), (2, 0))
+        self.assertTrue(Page.objects.filter(title='Two\nlines').exists())
+
+
+class ImportApiTests(TestCase):
+
+    def setUp(self):
+        add_cat('Python', 0, 0)
+        capture_logs(self, ingest.logger)
+        User.objects.create_superuser('admin', 'admin@example.com', '1234')
+        User.objects.create_user('alice', password='1234')
+
+    def post(self, rows):
+        return self.client.post(reverse('page-import'), json.dumps(rows),
+                                content_type='application/json')
+
+    def test_import(self):
+        rows = [{'category': 'Python', 'title': 'Docs',
+                 'url': 'http://a.com/'},
+                {'category': 'Python', 'title': ''}]
+        self.assertEqual(self.post(rows).status_code, 403)
+        self.client.login(username='alice', password='1234')
+        self.assertEqual(self.post(rows).status_code, 403)
+
+        self.client.login(username='admin', password='1234')
+        response = self.post(rows)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content.decode('utf-8')), {
+            'created': 1, 'updated': 0, 'rejected': 1, 'cleaned': {},
+            'errors': [{'row': 2, 'error': 'missing title'}]})
+        self.assertTrue(Page.objects.filter(title='Docs').exists())
+
+        self.assertEqual(self.post({'title': 'Docs'}).status_code, 400)
+        with override_settings(RANGO_IMPORT_MAX_ROWS=1):
+            self.assertEqual(self.post(rows).status_code, 413)
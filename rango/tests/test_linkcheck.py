@@ -0,0 +1,279 @@
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+from django.utils.six.moves import BaseHTTPServer, socketserver
+
+from rango import linkcheck
+from rango.models import Page
+from rango.tests.test_views import add_cat
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    /ok answers 200, /no-head 405 to HEAD, /drop-head no answer to
+    HEAD, /missing 404, /moved redirects to /ok, /away to /ok on
+    localhost, /slow sleeps past the test timeouts, /busy takes a
+    moment and counts requests in flight per Host header.
+    """
+
+    def do_HEAD(self):
+        if self.path == '/no-head':
+            self.reply(405)
+        elif self.path == '/drop-head':
+            self.close_connection = 1
+        else:
+            self.do_GET()
+
+    def do_GET(self):
+        path = self.path.partition('?')[0]
+        self.server.requests[self.command, path] += 1
+        self.server.hosts.add(self.headers['Host'])
+        if path == '/moved':
+            self.reply(301, [('Location', '/ok')])
+        elif path == '/away':
+            self.reply(302, [('Location', 'http://localhost:{0}/ok'.format(
+                self.server.server_address[1]))])
+        elif path == '/slow':
+            time.sleep(1)
+            self.reply(200)
+        elif path == '/busy':
+            self.busy()
+        elif path in ('/ok', '/no-head', '/drop-head'):
+            self.reply(200)
+        else:
+            self.reply(404)
+
+    def busy(self):
+        server, host = self.server, self.headers['Host']
+        with server.lock:
+            server.in_flight[host] += 1
+            server.max_in_flight[host] = max(server.max_in_flight[host],
+                                             server.in_flight[host])
+        time.sleep(0.1)
+        with server.lock:
+            server.in_flight[host] -= 1
+        self.reply(200)
+
+    def reply(self, status, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           StubHandler)
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.hosts = set()
+        self.in_flight = Counter()
+        self.max_in_flight = Counter()
+
+    def handle_error(self, request, client_address):
+        # Clients time out on /slow before it answers.
+        pass
+
+
+class StubServerMixin(object):
+
+    def setUp(self):
+        super(StubServerMixin, self).setUp()
+        self.server = StubServer()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.port = self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super(StubServerMixin, self).tearDown()
+
+    def url(self, path, host='127.0.0.1'):
+        return 'http://{0}:{1}{2}'.format(host, self.port, path)
+
+    def patch(self, name, value):
+        original = getattr(linkcheck, name)
+        setattr(linkcheck, name, value)
+        self.addCleanup(setattr, linkcheck, name, original)
+
+
+@override_settings(RANGO_LINK_CHECK_ALLOW_PRIVATE=True)
+class CheckUrlTests(StubServerMixin, SimpleTestCase):
+
+    def check(self, path):
+        return self.check_host(path, '127.0.0.1')
+
+    def check_host(self, path, host):
+        return linkcheck.check_url(linkcheck.new_session(),
+                                   self.url(path, host), 0.3)
+
+    def test_check_url(self):
+        self.assertEqual(self.check('/ok'), (200, ''))
+        self.assertEqual(self.check('/moved'), (200, ''))
+        self.assertEqual(self.check('/missing'), (404, ''))
+        self.assertEqual(self.check('/slow'), (None, 'timeout'))
+        self.assertEqual(linkcheck.check_url(linkcheck.new_session(),
+                                             'example.com', 0.3),
+                         (None, 'invalid URL'))
+
+    def test_head_then_get(self):
+        self.assertEqual(self.check('/no-head'), (200, ''))
+        self.assertEqual(self.server.requests['GET', '/no-head'], 1)
+
+        self.check('/ok')
+        self.assertEqual(self.server.requests['HEAD', '/ok'], 1)
+        self.assertEqual(self.server.requests['GET', '/ok'], 0)
+
+        # No answer to HEAD.
+        self.assertEqual(self.check('/drop-head'), (200, ''))
+        self.assertEqual(self.server.requests['GET', '/drop-head'], 1)
+
+    @override_settings(RANGO_LINK_CHECK_ALLOW_PRIVATE=False)
+    def test_private_addresses(self):
+        self.assertEqual(self.check('/ok'), (None, 'private address'))
+        self.assertEqual(linkcheck.check_url(
+            linkcheck.new_session(),
+            'ftp://127.0.0.1:{0}/ok'.format(self.port), 0.3),
+            (None, 'invalid URL'))
+        self.assertFalse(self.server.requests)
+
+        # A public host (the stub, taken as public) redirecting to a
+        # private one.
+        self.patch('is_public_address', lambda address: address != '10.0.0.1')
+        self.patch('get_addresses', lambda host: (
+            ['127.0.0.1'] if host == '127.0.0.1' else ['10.0.0.1']))
+        self.assertEqual(self.check('/away'), (None, 'private address'))
+        self.assertEqual(self.server.requests['HEAD', '/away'], 1)
+        self.assertEqual(self.server.requests['HEAD', '/ok'], 0)
+
+    @override_settings(RANGO_LINK_CHECK_ALLOW_PRIVATE=False)
+    def test_connects_to_checked_address(self):
+        # The host does not resolve again: requests to it go to the
+        # checked address, with the host in the Host header.
+        self.patch('is_public_address', lambda address: True)
+        self.patch('get_addresses', lambda host: ['127.0.0.1'])
+        self.assertEqual(self.check_host('/ok', 'rebind.invalid'),
+                         (200, ''))
+        self.assertEqual(self.server.hosts,
+                         {'rebind.invalid:{0}'.format(self.port)})
+
+    def test_is_public_address(self):
+        for address in ('93.184.216.34', '2606:2800:220:1::'):
+            self.assertTrue(linkcheck.is_public_address(address), address)
+        for address in ('127.0.0.1', '10.1.2.3', '172.31.0.1',
+                        '192.168.0.1', '169.254.169.254', '0.0.0.0',
+                        '255.255.255.255', '::1', '::ffff:127.0.0.1',
+                        'fe80::1', 'fd00::1'):
+            self.assertFalse(linkcheck.is_public_address(address), address)
+
+    @override_settings(RANGO_LINK_CHECK_INTERVAL=86400,
+                       RANGO_LINK_CHECK_RETRY=3600)
+    def test_next_check(self):
+        now = timezone.now()
+        self.assertEqual(linkcheck.next_check(now, 0),
+                         now + timedelta(days=1))
+        self.assertEqual(linkcheck.next_check(now, 1),
+                         now + timedelta(hours=1))
+        self.assertEqual(linkcheck.next_check(now, 3),
+                         now + timedelta(hours=4))
+        self.assertEqual(linkcheck.next_check(now, 100),
+                         now + timedelta(days=1))
+
+    def test_interleave(self):
+        rows = [(1, 'http://a/1', 0), (2, 'http://a/2', 0),
+                (3, 'http://A/3', 0), (4, 'http://b/1', 0)]
+        self.assertEqual([row[0] for row in linkcheck.interleave(rows)],
+                         [1, 4, 2, 3])
+
+
+@override_settings(RANGO_LINK_CHECK_ALLOW_PRIVATE=True)
+class CheckLinksTests(StubServerMixin, TestCase):
+
+    def setUp(self):
+        super(CheckLinksTests, self).setUp()
+        self.cat = add_cat('Python', 0, 0)
+
+    def add_page(self, url, **fields):
+        page = Page(category=self.cat, title=url, url=url, **fields)
+        page.save()
+        return page
+
+    def test_check_links(self):
+        ok = self.add_page(self.url('/ok'))
+        missing = self.add_page(self.url('/missing'), link_failures=2)
+        slow = self.add_page(self.url('/slow'))
+        start = timezone.now()
+
+        stats = linkcheck.check_links(linkcheck.due_pages(), workers=4,
+                                      timeout=0.3, chunk_size=2)
+        self.assertEqual((stats.checked, stats.broken), (3, 2))
+        self.assertEqual(stats.statuses,
+                         Counter({200: 1, 404: 1, 'timeout': 1}))
+
+        ok, missing, slow = [Page.objects.get(id=page.id)
+                             for page in (ok, missing, slow)]
+        self.assertEqual((ok.link_status, ok.link_error, ok.link_failures),
+                         (200, '', 0))
+        self.assertGreaterEqual(ok.link_checked, start)
+        self.assertEqual(ok.link_next_check,
+                         linkcheck.next_check(ok.link_checked, 0))
+        self.assertEqual((missing.link_status, missing.link_failures),
+                         (404, 3))
+        self.assertEqual(missing.link_next_check,
+                         linkcheck.next_check(missing.link_checked, 3))
+        self.assertEqual((slow.link_status, slow.link_error,
+                          slow.link_failures), (None, 'timeout', 1))
+
+        # Nothing is due until the retry.
+        self.assertEqual(list(linkcheck.due_pages()), [])
+        self.assertEqual(
+            [row[0] for row in linkcheck.due_pages(
+                now=missing.link_next_check)],
+            [missing.id, slow.id])
+        self.assertEqual(len(list(linkcheck.due_pages(check_all=True))), 3)
+
+    def test_per_host_limit(self):
+        for host in ('127.0.0.1', 'localhost'):
+            for i in range(8):
+                self.add_page(self.url('/busy?{0}'.format(i), host))
+        self.server.requests.clear()
+
+        stats = linkcheck.check_links(linkcheck.due_pages(), workers=8,
+                                      per_host=2, chunk_size=5)
+        self.assertEqual(stats.checked, 16)
+        self.assertEqual(
+            sorted(self.server.max_in_flight.values()), [2, 2])
+
+    def test_command(self):
+        self.add_page(self.url('/ok'))
+        self.add_page(self.url('/missing'))
+        self.add_page(self.url('/ok'),
+                      link_next_check=timezone.now() + timedelta(days=1))
+
+        out = StringIO()
+        call_command('check_links', workers=2, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertRegexpMatches(
+            lines[0], r'^Checked 2 links in [\d.]+s, [\d.]+ URLs/s, '
+                      r'1 broken\.$')
+        self.assertEqual(lines[1], '200: 1, 404: 1')
+
+        out = StringIO()
+        call_command('check_links', limit=1, all=True, stdout=out)
+        self.assertIn('Checked 1 links', out.getvalue())
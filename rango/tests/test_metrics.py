@@ -0,0 +1,139 @@
+import threading
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from rango import metrics
+from rango.models import Category
+from rango.tests.test_views import add_cat
+
+
+@override_settings(RANGO_BUFFER_AUTO_FLUSH=False)
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.cat = add_cat('python', 0, 0)
+
+    def tearDown(self):
+        metrics.registry.clear()
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode('utf-8').splitlines()
+
+    def test_per_view_metrics(self):
+        """
+        Checks that requests are counted per URL name with their queries,
+        template time and latency histogram.
+        """
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        self.client.get(reverse('category', args=[self.cat.slug]))
+        self.client.get(reverse('cat-list'))
+        self.client.get('/no/such/page/')
+
+        lines = self.scrape()
+        self.assertIn('rango_requests_total{status="200",view="index"} 2.0',
+                      lines)
+        self.assertIn(
+            'rango_requests_total{status="200",view="category"} 1.0', lines)
+        self.assertIn(
+            'rango_requests_total{status="200",view="cat-list"} 1.0', lines)
+        self.assertIn(
+            'rango_requests_total{status="404",view="unresolved"} 1.0', lines)
+        self.assertIn(
+            'rango_request_duration_seconds_bucket{le="+Inf",view="index"} '
+            '2.0', lines)
+        self.assertIn(
+            'rango_request_duration_seconds_count{view="index"} 2.0', lines)
+
+        def value(prefix):
+            return float([line for line in lines if line.startswith(prefix)][0]
+                         .split()[-1])
+
+        self.assertGreater(value('rango_db_queries_total{view="index"}'), 0)
+        self.assertGreater(
+            value('rango_template_render_seconds_total{view="index"}'), 0)
+        self.assertEqual(
+            value('rango_template_render_seconds_total{view="cat-list"}'), 0)
+
+        # Histogram buckets are cumulative.
+        buckets = [float(line.split()[-1]) for line in lines
+                   if line.startswith('rango_request_duration_seconds_bucket{')
+                   and 'view="index"' in line]
+        self.assertEqual(buckets, sorted(buckets))
+
+    def test_query_count(self):
+        """
+        Checks that the counted queries match those Django records.
+        """
+        with self.assertNumQueries(1):
+            self.client.get(reverse('cat-list'))
+        self.assertIn('rango_db_queries_total{view="cat-list"} 1.0',
+                      self.scrape())
+
+    def test_queries_outside_requests(self):
+        """
+        Checks that queries outside requests are neither metered nor
+        wrapped.
+        """
+        Category.objects.count()
+        self.assertIsNone(metrics.current_stats())
+        self.assertNotIn('rango_db_queries_total', ''.join(
+            line for line in self.scrape() if not line.startswith('#')))
+
+    def test_external_calls(self):
+        stats = metrics.RequestStats()
+        stats.view = 'category'
+        metrics._local.stats = stats
+        try:
+            metrics.record_external('faroo', 0.25)
+            metrics.record_external('faroo', 0.5)
+        finally:
+            metrics._local.stats = None
+        metrics.registry.observe(stats, 1.0, 200)
+
+        lines = self.scrape()
+        self.assertIn('rango_external_calls_total'
+                      '{service="faroo",view="category"} 2.0', lines)
+        self.assertIn('rango_external_seconds_total'
+                      '{service="faroo",view="category"} 0.75', lines)
+
+    def test_threads(self):
+        """
+        Checks that concurrent observations are not lost.
+        """
+        def observe():
+            for _ in range(1000):
+                stats = metrics.RequestStats()
+                stats.view = 'index'
+                stats.queries = 1
+                metrics.registry.observe(stats, 0.001, 200)
+
+        threads = [threading.Thread(target=observe) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        lines = metrics.registry.render().splitlines()
+        self.assertIn('rango_db_queries_total{view="index"} 8000.0', lines)
+        self.assertIn(
+            'rango_request_duration_seconds_bucket{le="0.005",view="index"} '
+            '8000.0', lines)
+
+    def test_escape(self):
+        self.assertEqual(metrics.sample('m', {'view': 'a"b\\c\n'}, 1),
+                         'm{view="a\\"b\\\\c\\n"} 1.0')
+
+    @override_settings(RANGO_METRICS_ALLOWED_IPS=('10.0.0.1',))
+    def test_allowed_ips(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
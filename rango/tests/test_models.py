@@ -1,10 +1,15 @@
 import datetime
 from random import randrange
 
+from django.core.management import call_command
 from django.test import TestCase
 from django.utils import timezone
+from django.utils.six import StringIO
 
+from rango import models
+from rango.counters import repair_category_counters
 from rango.models import Category, Page
+from rango.tests.test_requestlog import capture_logs
 from rango.tests.test_views import add_cat, add_page
 
 
@@ -33,6 +38,9 @@ class CategoryMethodTests(TestCase):
 class PageMethodTests(TestCase):
 
     def setUp(self):
+        # Visits are cleaned with warnings.
+        capture_logs(self, models.logger)
+
         # Populate DB.
         url = 'http://www.example.com/'
         self.cat = add_cat('test cat', 1, 1)
@@ -81,6 +89,122 @@ class PageMethodTests(TestCase):
                 self.assertTrue(page.first_visit <= page.last_visit)
 
 
+class CategoryCountersTests(TestCase):
+
+    def setUp(self):
+        self.cat = add_cat('test cat', 0, 0)
+        self.url = 'http://www.example.com/'
+
+    def reload(self):
+        return Category.objects.get(id=self.cat.id)
+
+    def test_page_creation_updates_counters(self):
+        """
+        Checks that page_count, total_page_views and last_activity
+        follow page creation.
+        """
+        Page(category=self.cat, title='spam', url=self.url, views=3).save()
+        Page(category=self.cat, title='eggs', url=self.url, views=4).save()
+
+        cat = self.reload()
+        self.assertEqual(cat.page_count, 2)
+        self.assertEqual(cat.total_page_views, 7)
+        # Last activity is the latest visit, and none of the pages has
+        # been visited.
+        self.assertIsNone(cat.last_activity)
+
+        visit = timezone.now() - datetime.timedelta(days=1)
+        Page(category=self.cat, title='ham', url=self.url,
+             first_visit=visit - datetime.timedelta(days=1),
+             last_visit=visit).save()
+        Page(category=self.cat, title='bacon', url=self.url,
+             last_visit=visit - datetime.timedelta(days=2)).save()
+        self.assertEqual(self.reload().last_activity, visit)
+
+    def test_save_agrees_with_repair(self):
+        """
+        Checks that counters kept by Page.save need no repair.
+        """
+        Page(category=self.cat, title='spam', url=self.url, views=2).save()
+        Page(category=self.cat, title='eggs', url=self.url,
+             first_visit=timezone.now()).save()
+        page = add_page(add_cat('other cat', 0, 0), 'ham', self.url)
+        page.last_visit = timezone.now()
+        page.save()
+        self.assertEqual(repair_category_counters(), 0)
+
+    def test_page_update_does_not_count_twice(self):
+        page = add_page(self.cat, 'spam', self.url)
+        page.title = 'eggs'
+        page.save()
+        self.assertEqual(self.reload().page_count, 1)
+
+    def test_page_update_moves_counters(self):
+        """
+        Checks that changing views or category of a saved page moves
+        its views and count between category counters.
+        """
+        other = add_cat('other cat', 0, 0)
+        page = add_page(self.cat, 'spam', self.url, views=3)
+        self.assertEqual(
+            (self.reload().page_count, self.reload().total_page_views),
+            (1, 3))
+
+        page.views = 5
+        page.save()
+        self.assertEqual(self.reload().total_page_views, 5)
+
+        page.category = other
+        page.save()
+        cat, other = self.reload(), Category.objects.get(pk=other.pk)
+        self.assertEqual((cat.page_count, cat.total_page_views), (0, 0))
+        self.assertEqual((other.page_count, other.total_page_views), (1, 5))
+        self.assertEqual(repair_category_counters(), 0)
+
+    def test_page_deletion_updates_counters(self):
+        Page(category=self.cat, title='spam', url=self.url, views=3).save()
+        Page(category=self.cat, title='eggs', url=self.url, views=4).save()
+
+        Page.objects.get(title='spam').delete()
+        cat = self.reload()
+        self.assertEqual(cat.page_count, 1)
+        self.assertEqual(cat.total_page_views, 4)
+
+        # Queryset deletes are counted too.
+        Page.objects.filter(category=self.cat).delete()
+        cat = self.reload()
+        self.assertEqual(cat.page_count, 0)
+        self.assertEqual(cat.total_page_views, 0)
+
+    def test_repair_command(self):
+        """
+        Checks that drifted counters are recomputed from pages.
+        """
+        Page(category=self.cat, title='spam', url=self.url, views=3,
+             first_visit=timezone.now()).save()
+        other = add_cat('other cat', 0, 0)
+        Category.objects.update(page_count=42, total_page_views=42,
+                                last_activity=None)
+
+        out = StringIO()
+        call_command('repair_category_counters', chunk_size=1, stdout=out)
+        self.assertIn('Repaired 2 categories.', out.getvalue())
+
+        cat = self.reload()
+        self.assertEqual(cat.page_count, 1)
+        self.assertEqual(cat.total_page_views, 3)
+        self.assertEqual(cat.last_activity,
+                         Page.objects.get(title='spam').first_visit)
+        other = Category.objects.get(id=other.id)
+        self.assertEqual(other.page_count, 0)
+        self.assertEqual(other.total_page_views, 0)
+
+        # Nothing left to repair.
+        out = StringIO()
+        call_command('repair_category_counters', stdout=out)
+        self.assertIn('Repaired 0 categories.', out.getvalue())
+
+
 #######################################################################
 # Helper functions
 
@@ -0,0 +1,87 @@
+import json
+import marshal
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from rango import profiling
+from rango.models import ProfileDump
+from rango.tests.test_views import add_cat
+
+
+@override_settings(RANGO_BUFFER_AUTO_FLUSH=False)
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        profiling.sampler.clear()
+        self.cat = add_cat('python', 0, 0)
+        self.url = reverse('category', args=[self.cat.slug])
+        User.objects.create_superuser('admin', 'admin@example.com', '1234')
+        User.objects.create_user(username='test_user', password='1234')
+
+    def test_staff_flag(self):
+        """
+        Checks that a staff request with the flag is profiled with its
+        SQL, and that the dump can be downloaded from the admin.
+        """
+        self.client.login(username='admin', password='1234')
+        response = self.client.get(self.url, HTTP_X_RANGO_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+
+        dump = ProfileDump.objects.get()
+        self.assertEqual(response['X-Rango-Profile'], str(dump.pk))
+        self.assertEqual((dump.view, dump.method, dump.path, dump.status),
+                         ('category', 'GET', self.url, 200))
+        self.assertFalse(dump.sampled)
+        self.assertEqual(dump.user.username, 'admin')
+
+        queries = json.loads(dump.queries)
+        self.assertEqual(dump.query_count, len(queries))
+        self.assertTrue(any('rango_category' in query['sql']
+                            for query in queries))
+        self.assertIn('cumulative', dump.summary)
+
+        response = self.client.get(
+            reverse('admin:rango_profiledump_download', args=[dump.pk]))
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        stats = marshal.loads(response.content)
+        self.assertTrue(any(func[2] == 'category' for func in stats))
+
+        response = self.client.get(
+            reverse('admin:rango_profiledump_change', args=[dump.pk]))
+        self.assertContains(response, 'profile-{0}.prof'.format(dump.pk))
+
+    def test_query_flag(self):
+        self.client.login(username='admin', password='1234')
+        self.client.get(self.url, {'_profile': '1'})
+        self.assertEqual(ProfileDump.objects.count(), 1)
+
+    def test_not_profiled(self):
+        """
+        Checks that requests without the flag, or of non-staff users,
+        are not profiled.
+        """
+        self.client.get(self.url, HTTP_X_RANGO_PROFILE='1')
+        self.client.login(username='test_user', password='1234')
+        self.client.get(self.url, HTTP_X_RANGO_PROFILE='1')
+        self.client.login(username='admin', password='1234')
+        response = self.client.get(self.url)
+
+        self.assertNotIn('X-Rango-Profile', response)
+        self.assertFalse(ProfileDump.objects.exists())
+
+    @override_settings(RANGO_PROFILE_SAMPLE_EVERY=3, RANGO_PROFILE_KEEP=2)
+    def test_sampling(self):
+        """
+        Checks that one request in N is profiled for anyone, and that
+        only the newest dumps are kept.
+        """
+        for _ in range(9):
+            self.client.get(self.url)
+
+        dumps = ProfileDump.objects.all()
+        self.assertEqual(len(dumps), 2)
+        self.assertTrue(all(dump.sampled and dump.user is None
+                            for dump in dumps))
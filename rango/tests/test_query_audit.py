@@ -0,0 +1,48 @@
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from rango import datagen
+from rango.query_audit import audit, find_problems
+
+
+class QueryAuditTests(TestCase):
+
+    def setUp(self):
+        # Enough rows for ANALYZE statistics to matter.
+        datagen.populate(50, 2000)
+        connection.cursor().execute('ANALYZE')
+
+    def test_hot_queries_do_not_scan(self):
+        """
+        Fails when any hot query starts scanning a table or sorting
+        through a temporary B-tree (e.g. after an index was lost).
+        """
+        problems = []
+        for query, plan, query_problems in audit():
+            problems.extend(query_problems)
+        self.assertEqual(problems, [])
+
+    def test_find_problems(self):
+        """
+        Checks that full scans and temporary sorts are detected,
+        while ordered index scans are not.
+        """
+        plan = ['SCAN rango_page',
+                'SCAN TABLE rango_category',
+                'USE TEMP B-TREE FOR ORDER BY',
+                'SCAN rango_page USING INDEX rango_page_59a14a57',
+                'SEARCH rango_page USING INTEGER PRIMARY KEY (rowid=?)']
+        problems = find_problems('test', plan)
+        self.assertEqual([p.kind for p in problems],
+                         ['full scan', 'full scan', 'temporary sort'])
+
+    def test_command_fail_mode(self):
+        """
+        `audit_queries --fail` passes when all hot queries use indexes.
+        """
+        out = StringIO()
+        call_command('audit_queries', fail=True, stdout=out)
+        self.assertIn('ok   category.pages', out.getvalue())
+        self.assertNotIn('FAIL', out.getvalue())
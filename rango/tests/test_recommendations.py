@@ -0,0 +1,132 @@
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from rango.models import ClickEvent, RelatedCategory
+from rango.tests.test_views import add_cat, add_page
+
+try:
+    import numpy as np
+    from rango import recommendations
+except ImportError:
+    np = None
+
+
+@skipUnless(np, 'NumPy and SciPy are required')
+@override_settings(RANGO_RELATED_MIN_COVISITS=1)
+class CovisitationTests(TestCase):
+
+    def test_cosine_scores(self):
+        """
+        Categories 0 and 1 share 2 sessions, 1 and 2 share one.
+        """
+        sessions = np.array([0, 0, 1, 1, 2, 2, 3])
+        categories = np.array([0, 1, 0, 1, 1, 2, 0])
+        rows, cols, scores = recommendations.covisitation(
+            sessions, categories, 3)
+
+        pairs = dict(((r, c), s) for r, c, s in zip(rows, cols, scores))
+        self.assertEqual(sorted(pairs), [(0, 1), (1, 0), (1, 2), (2, 1)])
+        self.assertAlmostEqual(pairs[0, 1], 2 / np.sqrt(3 * 3))
+        self.assertAlmostEqual(pairs[1, 2], 1 / np.sqrt(3 * 1))
+
+    def test_duplicate_visits_count_once(self):
+        sessions = np.array([0, 0, 0, 1, 1])
+        categories = np.array([0, 0, 1, 0, 1])
+        rows, cols, scores = recommendations.covisitation(
+            sessions, categories, 2)
+        self.assertTrue(np.allclose(scores, 1))
+
+    @override_settings(RANGO_RELATED_MIN_COVISITS=2)
+    def test_min_covisits(self):
+        sessions = np.array([0, 0, 1, 1, 2, 2])
+        categories = np.array([0, 1, 0, 1, 1, 2])
+        rows, cols, scores = recommendations.covisitation(
+            sessions, categories, 3)
+        self.assertEqual(sorted(zip(rows, cols)), [(0, 1), (1, 0)])
+
+    def test_top_k(self):
+        rows = np.array([1, 0, 0, 0, 1])
+        cols = np.array([0, 1, 2, 3, 2])
+        scores = np.array([0.5, 0.1, 0.9, 0.5, 0.5])
+        rows, cols, scores, ranks = recommendations.top_k(
+            rows, cols, scores, 2)
+        self.assertEqual(list(zip(rows, cols, ranks)),
+                         [(0, 2, 0), (0, 3, 1), (1, 0, 0), (1, 2, 1)])
+
+    def test_no_visits(self):
+        empty = np.array([], dtype=np.int64)
+        neighbours = recommendations.related_categories(empty, empty, 5)
+        self.assertEqual(len(neighbours[0]), 0)
+
+
+@skipUnless(np, 'NumPy and SciPy are required')
+@override_settings(RANGO_RELATED_MIN_COVISITS=1, RANGO_BUFFER_AUTO_FLUSH=False)
+class RelatedCategoriesTests(TestCase):
+
+    def setUp(self):
+        self.python = add_cat('python', 0, 0)
+        self.django = add_cat('django', 0, 0)
+        self.ruby = add_cat('ruby', 0, 0)
+        self.perl = add_cat('perl', 0, 0)
+
+        visits = [('s1', self.python), ('s1', self.django),
+                  ('s2', self.python), ('s2', self.django),
+                  ('s2', self.ruby), ('s3', self.python),
+                  ('', self.perl), ('', self.python)]
+        now = timezone.now()
+        ClickEvent.objects.bulk_create([
+            ClickEvent(page=add_page(cat, cat.name, 'http://example.com/'),
+                       category=cat, created=now, session_key=session_key)
+            for session_key, cat in visits])
+
+    def test_build(self):
+        out = StringIO()
+        call_command('build_related_categories', top_k=1, stdout=out)
+        self.assertIn('Stored 3 related categories from 6 visits',
+                      out.getvalue())
+
+        related = dict((r.category.name, r.related.name)
+                       for r in RelatedCategory.objects.all())
+        self.assertEqual(related, {'python': 'django',
+                                   'django': 'python',
+                                   'ruby': 'django'})
+
+        # Rebuild replaces old neighbours.
+        recommendations.build(k=5)
+        self.assertEqual(RelatedCategory.objects.count(), 6)
+
+    def test_window(self):
+        """
+        Checks that only clicks of the last RANGO_RELATED_WINDOW hours
+        count, compacted or not.
+        """
+        ClickEvent.objects.filter(session_key='s2').update(
+            created=timezone.now() - timedelta(hours=25))
+        with self.settings(RANGO_RELATED_WINDOW=24):
+            stats = recommendations.build(k=1)
+        self.assertEqual((stats['visits'], stats['related']), (3, 2))
+
+        sessions, categories = recommendations.load_visits()
+        self.assertEqual(len(set(sessions)), 3)
+        self.assertEqual(len(categories), 6)
+
+    def test_category_view(self):
+        recommendations.build()
+
+        response = self.client.get(reverse('category',
+                                           args=[self.python.slug]))
+        self.assertEqual(
+            [c.name for c in response.context['related_categories']],
+            ['django', 'ruby'])
+        self.assertContains(response, 'also visited')
+
+        response = self.client.get(reverse('category',
+                                           args=[self.perl.slug]))
+        self.assertEqual(response.context['related_categories'], [])
@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from rango import requestlog
+from rango.tests.test_views import add_cat
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(record.getMessage())
+
+
+def capture_logs(test, logger):
+    """
+    Collects messages of `logger` in a ListHandler, off the console,
+    until `test` ends. Returns the handler.
+    """
+    handler = ListHandler()
+    logger.addHandler(handler)
+    test.addCleanup(logger.removeHandler, handler)
+    test.addCleanup(setattr, logger, 'propagate', logger.propagate)
+    logger.propagate = False
+    return handler
+
+
+@override_settings(RANGO_BUFFER_AUTO_FLUSH=False)
+class RequestLogTests(TestCase):
+
+    def setUp(self):
+        self.handler = ListHandler()
+        requestlog.logger.addHandler(self.handler)
+        self.cat = add_cat('python', 0, 0)
+
+    def tearDown(self):
+        requestlog.logger.removeHandler(self.handler)
+
+    @override_settings(RANGO_REQUEST_LOG_SAMPLE=1)
+    def test_log_request(self):
+        response = self.client.get(reverse('category', args=[self.cat.slug]))
+
+        record = json.loads(self.handler.lines[0])
+        self.assertEqual((record['view'], record['method'], record['status']),
+                         ('category', 'GET', 200))
+        self.assertEqual(record['bytes'], len(response.content))
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['total'], 0)
+        self.assertLessEqual(record['db'] + record['template'],
+                             record['total'])
+
+    @override_settings(RANGO_REQUEST_LOG_SAMPLE=0)
+    def test_not_sampled(self):
+        self.client.get(reverse('index'))
+        self.assertEqual(self.handler.lines, [])
+
+
+class HistogramTests(SimpleTestCase):
+
+    def test_buckets(self):
+        """
+        Checks that every value falls into the bounds of its bucket and
+        that buckets are contiguous.
+        """
+        for value in [0, 1, 127, 128, 129, 255, 256, 1000, 123456789]:
+            low, high = requestlog.bucket_bounds(
+                requestlog.bucket_index(value))
+            self.assertTrue(low <= value < high, value)
+
+        previous = requestlog.bucket_bounds(0)
+        for index in range(1, 2000):
+            bounds = requestlog.bucket_bounds(index)
+            self.assertEqual(bounds[0], previous[1])
+            previous = bounds
+
+    def test_percentiles(self):
+        """
+        Checks percentiles against exact ones within bucket error.
+        """
+        rng = random.Random(42)
+        values = sorted(rng.lognormvariate(-3, 1) for _ in range(20000))
+        hist = requestlog.Histogram()
+        for value in values:
+            hist.add(value)
+
+        self.assertEqual(hist.count, len(values))
+        self.assertLess(len(hist.counts), 600)
+        for q in (50, 95, 99):
+            exact = values[int(q / 100.0 * (len(values) - 1))]
+            self.assertAlmostEqual(hist.percentile(q) / exact, 1, delta=0.02)
+        self.assertLessEqual(hist.percentile(100), hist.max)
+        self.assertEqual(hist.max, values[-1])
+        self.assertEqual(requestlog.Histogram().percentile(50), 0)
+
+
+class AnalyzeRequestLogTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'requests.log')
+        start = requestlog.parse_time('2015-06-01')
+
+        with open(self.path, 'w') as log:
+            for hour in range(48):
+                for i in range(30):
+                    # `category` got four times slower on day two.
+                    slow = 4 if hour >= 24 else 1
+                    for view, total in (('index', 0.01),
+                                        ('category', 0.02 * slow)):
+                        log.write(json.dumps({
+                            'ts': start + hour * 3600 + i, 'view': view,
+                            'total': total * (1 + i / 30.0), 'db': 0.001,
+                        }) + '\n')
+            log.write('{"ts": 1, "view": "cut off\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def analyze(self, *args, **options):
+        out = StringIO()
+        call_command('analyze_request_log', self.path, *args, stdout=out,
+                     **options)
+        return out.getvalue()
+
+    def test_summary(self):
+        out = self.analyze(hourly=True)
+        self.assertIn('2880 requests, total seconds', out)
+        lines = out.splitlines()
+        self.assertTrue(any(line.startswith('index') and ' 1440 ' in line
+                            for line in lines))
+        self.assertTrue(any(line.startswith('category @ 2015-06-02 23h')
+                            for line in lines))
+
+    def test_regressions(self):
+        out = self.analyze(baseline=('2015-06-01', '2015-06-02'),
+                           window=('2015-06-02', '2015-06-03'))
+        self.assertIn('REGRESSION category: p95', out)
+        self.assertNotIn('REGRESSION index', out)
+
+        out = self.analyze(baseline=('2015-06-01T00', '2015-06-01T12'),
+                           window=('2015-06-01T12', '2015-06-02T00'))
+        self.assertIn('No regressions of p95.', out)
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connections
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from rango.models import Category, Page
+from rango.routers import PIN_COOKIE, ReplicaRouter, reset_pin
+from rango.tests.test_views import add_cat
+
+
+class ReplicaRouterTests(TestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        reset_pin()
+
+    def tearDown(self):
+        reset_pin()
+
+    def test_no_replicas_configured(self):
+        """
+        Without replicas router doesn't interfere.
+        """
+        self.assertIsNone(self.router.db_for_read(Category))
+        self.assertIsNone(self.router.db_for_write(Category))
+
+    @override_settings(RANGO_READ_REPLICAS=('replica',))
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Page), 'replica')
+        self.assertEqual(self.router.db_for_write(Page), 'default')
+
+    @override_settings(RANGO_READ_REPLICAS=('replica',))
+    def test_read_your_writes(self):
+        """
+        After a write reads are pinned to primary.
+        """
+        self.router.db_for_write(Page)
+        self.assertEqual(self.router.db_for_read(Category), 'default')
+
+    @override_settings(RANGO_READ_REPLICAS=('replica',), RANGO_REPLICA_LAG=0)
+    def test_pin_expires_after_lag(self):
+        self.router.db_for_write(Page)
+        self.assertEqual(self.router.db_for_read(Category), 'replica')
+
+    @override_settings(RANGO_READ_REPLICAS=('replica',))
+    def test_other_apps_are_not_routed(self):
+        self.assertIsNone(self.router.db_for_read(User))
+        self.router.db_for_write(User)
+        self.assertEqual(self.router.db_for_read(Category), 'replica')
+
+
+class CopiedReplicaTests(TestCase):
+    """
+    Uses a separate SQLite file as replica. It is deliberately stale:
+    it holds a category which primary doesn't have.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        connections.databases['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(self.tmp_dir, 'replica.sqlite3'),
+        }
+        call_command('migrate', database='replica', verbosity=0,
+                     interactive=False)
+        self.cat = add_cat('rango_test', 0, 0)
+
+        # Replica has seen `self.cat`, but not that 'Stale' was deleted.
+        self.cat.save(using='replica')
+        Category.objects.using('replica').create(name='Stale')
+
+        User.objects.create_user(username='test_user', password='1234')
+        reset_pin()
+
+    def tearDown(self):
+        reset_pin()
+        connections['replica'].close()
+        del connections.databases['replica']
+        delattr(connections._connections, 'replica')
+        shutil.rmtree(self.tmp_dir)
+
+    @override_settings(RANGO_READ_REPLICAS=('replica',))
+    def test_orm_reads_follow_writes(self):
+        self.assertTrue(Category.objects.filter(name='Stale').exists())
+
+        Category.objects.create(name='Fresh')
+        self.assertFalse(Category.objects.filter(name='Stale').exists())
+        self.assertTrue(Category.objects.filter(name='Fresh').exists())
+
+    @override_settings(RANGO_READ_REPLICAS=('replica',))
+    def test_client_is_pinned_after_auto_add_page(self):
+        """
+        API list is served by replica until the user adds a page,
+        then by primary for the next requests of that user.
+        """
+        response = self.client.get(reverse('cat-list'))
+        self.assertContains(response, 'Stale')
+
+        self.client.login(username='test_user', password='1234')
+        response = self.client.get(reverse('auto_add_page'),
+                                   data={'title_data': 'Python.org',
+                                         'url_data': 'https://python.org/',
+                                         'catid_data': self.cat.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        response = self.client.get(reverse('cat-list'))
+        self.assertNotContains(response, 'Stale')
+        self.assertContains(response, 'rango_test')
@@ -0,0 +1,117 @@
+import time
+
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from django.test import Client, RequestFactory, TestCase
+from django.test.utils import override_settings
+
+from rango import shedding
+from rango.tests.test_views import add_cat
+
+
+class FailingRequestMiddleware(object):
+
+    def process_request(self, request):
+        raise ValueError('request')
+
+
+class FailingResponseMiddleware(object):
+
+    def process_response(self, request, response):
+        raise ValueError('response')
+
+
+@override_settings(RANGO_SHED_MAX_IN_FLIGHT=4, RANGO_SHED_LATENCY_TARGET=1.0,
+                   RANGO_SHED_WINDOW=10, RANGO_BUFFER_AUTO_FLUSH=False)
+class LoadSheddingTests(TestCase):
+
+    def setUp(self):
+        shedding.tracker.clear()
+        self.cat = add_cat('python', 0, 0)
+        self.category_url = reverse('category', args=[self.cat.slug])
+
+    def tearDown(self):
+        shedding.tracker.clear()
+
+    def status_codes(self):
+        return {
+            'search': self.client.post(self.category_url,
+                                       {'query': ''}).status_code,
+            'suggest': self.client.get(reverse('suggest_category'),
+                                       {'suggestion': 'py'}).status_code,
+            'api': self.client.get(reverse('cat-list')).status_code,
+            'core': self.client.get(self.category_url).status_code,
+        }
+
+    def test_shed_by_concurrency(self):
+        """
+        Checks that low-priority requests are shed first as
+        concurrency grows, core pages are always served.
+        """
+        self.assertEqual(set(self.status_codes().values()), set([200]))
+
+        shedding.tracker.in_flight = 4
+        self.assertEqual(self.status_codes(), {
+            'search': 503, 'suggest': 200, 'api': 200, 'core': 200})
+
+        shedding.tracker.in_flight = 5
+        self.assertEqual(self.status_codes(), {
+            'search': 503, 'suggest': 503, 'api': 200, 'core': 200})
+
+        shedding.tracker.in_flight = 6
+        self.assertEqual(self.status_codes(), {
+            'search': 503, 'suggest': 503, 'api': 503, 'core': 200})
+
+    def test_shed_by_latency(self):
+        """
+        Checks that a slow endpoint is shed until its samples leave
+        the window.
+        """
+        now = 1000.0
+        shedding.tracker.samples['category'].extend(
+            [(now, 3.0), (now, 3.0)])
+
+        self.assertGreaterEqual(shedding.tracker.pressure('category', now),
+                                3.0)
+        self.assertEqual(shedding.tracker.pressure('category', now + 11), 0)
+
+        shedding.tracker.samples['category'].clear()
+        shedding.tracker.samples['category'].append((time.time(), 1.1))
+        response = self.client.post(self.category_url, {'query': ''})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+
+    def test_in_flight_is_balanced(self):
+        self.status_codes()
+        self.assertEqual(shedding.tracker.in_flight, 0)
+        self.assertEqual(len(shedding.tracker.samples['cat-list']), 1)
+
+    def test_balanced_after_middleware_errors(self):
+        """
+        Checks that requests failing in later middleware are finished
+        although the response phase skips LoadSheddingMiddleware.
+        """
+        for name in ('FailingRequestMiddleware', 'FailingResponseMiddleware'):
+            middleware = settings.MIDDLEWARE_CLASSES + (
+                'rango.tests.test_shedding.' + name,)
+            with self.settings(MIDDLEWARE_CLASSES=middleware):
+                with self.assertRaises(ValueError):
+                    Client().get(self.category_url)
+            self.assertEqual(shedding.tracker.in_flight, 0, name)
+
+    def test_shed_before_other_middleware(self):
+        """
+        Checks that requests are shed in process_request, before
+        sessions and auth are set up.
+        """
+        shedding.tracker.in_flight = 4
+        middleware = shedding.LoadSheddingMiddleware()
+        request = RequestFactory().post(self.category_url, {'query': ''})
+        self.assertEqual(middleware.process_request(request).status_code,
+                         503)
+        self.assertFalse(hasattr(request, 'session'))
+
+        request = RequestFactory().get('/missing/')
+        self.assertIsNone(middleware.process_request(request))
+        middleware.process_response(request, None)
+        self.assertEqual(shedding.tracker.in_flight, 4)
@@ -0,0 +1,40 @@
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from rango.sqlite_tuning import pragma_statements
+
+
+class SqliteTuningTests(TestCase):
+
+    def query_pragma(self, name):
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA {0}'.format(name))
+        return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_connection(self):
+        """
+        Checks that SQLITE_PRAGMAS are applied on `connection_created`.
+        """
+        self.assertEqual(self.query_pragma('busy_timeout'), 5000)
+        self.assertEqual(self.query_pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.query_pragma('cache_size'), -65536)
+
+    def test_pragma_statements(self):
+        statements = pragma_statements((('journal_mode', 'WAL'),
+                                        ('busy_timeout', 100)))
+        self.assertEqual(statements, ['PRAGMA journal_mode = WAL',
+                                      'PRAGMA busy_timeout = 100'])
+
+    def test_contention_benchmark(self):
+        """
+        Checks that benchmark reports both profiles.
+        """
+        out = StringIO()
+        call_command('bench_sqlite_contention', processes=2, writes=10,
+                     stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith('default'))
+        self.assertTrue(lines[2].startswith('tuned'))
@@ -0,0 +1,102 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from rango import throttling
+from rango.tests.test_views import add_cat, add_page
+
+
+THROTTLES = {
+    'goto': {'rate': 1, 'burst': 2},
+    'like_category': {'rate': 1, 'burst': 1, 'key': 'user'},
+}
+
+
+class BucketTests(TestCase):
+
+    def check_buckets(self, buckets):
+        # Burst of 2, then one token per 2 seconds.
+        self.assertEqual(buckets.take('a', 0.5, 2, 100), 0)
+        self.assertEqual(buckets.take('a', 0.5, 2, 100), 0)
+        self.assertAlmostEqual(buckets.take('a', 0.5, 2, 100), 2)
+        self.assertAlmostEqual(buckets.take('a', 0.5, 2, 101), 1)
+        self.assertEqual(buckets.take('a', 0.5, 2, 102), 0)
+        # Other clients have their own buckets.
+        self.assertEqual(buckets.take('b', 0.5, 2, 102), 0)
+
+    def test_local_buckets(self):
+        self.check_buckets(throttling.LocalBuckets())
+
+    def test_cache_buckets(self):
+        cache = caches['default']
+        cache.delete_many(['rango:throttle:a', 'rango:throttle:b'])
+        self.check_buckets(throttling.CacheBuckets(cache))
+
+    def test_full_buckets_are_pruned(self):
+        buckets = throttling.LocalBuckets(max_keys=2)
+        buckets.take('a', 1, 1, 100)
+        buckets.take('b', 1, 1, 100)
+        buckets.take('c', 1, 1, 102)
+        self.assertEqual(sorted(buckets.buckets), ['c'])
+
+
+@override_settings(RANGO_THROTTLES=THROTTLES, RANGO_BUFFER_AUTO_FLUSH=False)
+class ThrottleTests(TestCase):
+
+    def setUp(self):
+        throttling.local_buckets.clear()
+        throttling.counters.clear()
+
+        self.cat = add_cat('python', 0, 0)
+        self.page = add_page(self.cat, 'spam', 'http://example.com/')
+
+    def goto(self, **extra):
+        return self.client.get(reverse('goto'),
+                               data={'page_id': self.page.id}, **extra)
+
+    def test_goto_is_throttled_before_db_access(self):
+        self.assertEqual(self.goto().status_code, 302)
+        self.assertEqual(self.goto().status_code, 302)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.goto()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(len(queries), 0)
+
+        # Another IP is not affected.
+        self.assertEqual(self.goto(REMOTE_ADDR='10.0.0.1').status_code, 302)
+
+    def test_user_key(self):
+        User.objects.create_user(username='alice', password='1234')
+        User.objects.create_user(username='bob', password='1234')
+        url = reverse('like_category')
+        data = {'category_id': self.cat.id}
+
+        self.client.login(username='alice', password='1234')
+        self.assertEqual(self.client.get(url, data).status_code, 200)
+        self.assertEqual(self.client.get(url, data).status_code, 429)
+
+        # Same IP, other user.
+        self.client.login(username='bob', password='1234')
+        self.assertEqual(self.client.get(url, data).status_code, 200)
+
+    @override_settings(RANGO_THROTTLES={})
+    def test_unconfigured_scope(self):
+        for _ in range(5):
+            self.assertEqual(self.goto().status_code, 302)
+
+    def test_stats(self):
+        for _ in range(3):
+            self.goto()
+
+        User.objects.create_superuser('admin', 'admin@example.com', '1234')
+        self.client.login(username='admin', password='1234')
+        response = self.client.get(reverse('throttle_stats'))
+        stats = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(stats, {'goto': {'allowed': 2, 'throttled': 1}})
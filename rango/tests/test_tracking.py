@@ -0,0 +1,135 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import Client, TestCase
+from django.test.utils import override_settings
+
+from rango import clicklog, history, trending
+from rango.models import Category, ClickEvent, Page
+from rango.tests.test_views import add_cat, add_page
+from rango.tracking import (parse_events, record_page_view,
+                            record_page_views)
+
+
+class ParseEventsTests(TestCase):
+
+    def test_valid_batch(self):
+        clicks, likes = parse_events(json.dumps([
+            {'type': 'click', 'page': 3},
+            {'type': 'like', 'category': 1},
+            {'type': 'click', 'page': 2},
+            {'type': 'like', 'category': 1},
+        ]))
+        self.assertEqual(clicks, [3, 2])
+        self.assertEqual(dict(likes), {1: 2})
+
+    @override_settings(RANGO_EVENT_BATCH_MAX=2)
+    def test_invalid_batches(self):
+        for data in ('', '{}', '[1]', '[{"type": "view", "page": 1}]',
+                     '[{"type": "click", "page": "1"}]',
+                     '[{"type": "click", "page": true}]',
+                     '[{"type": "like", "category": -1}]',
+                     '[{"type": "like"}]',
+                     json.dumps([{'type': 'click', 'page': 1}] * 3)):
+            self.assertRaises(ValueError, parse_events, data)
+
+
+@override_settings(RANGO_CLICK_BUFFER_MAX_AGE=0, RANGO_BUFFER_AUTO_FLUSH=False)
+class EventsViewTests(TestCase):
+
+    def setUp(self):
+        clicklog.click_events.clear()
+        trending.trending_scores.clear()
+
+        self.cat = add_cat('python', 0, 0)
+        self.other = add_cat('django', 0, 0)
+        self.page = add_page(self.cat, 'spam', 'http://example.com/')
+        self.eggs = add_page(self.cat, 'eggs', 'http://example.com/')
+        self.ham = add_page(self.other, 'ham', 'http://example.com/')
+        self.user = User.objects.create_user(username='test_user',
+                                             password='1234')
+
+    def post(self, events, client=None):
+        response = (client or self.client).post(
+            reverse('events'), {'events': json.dumps(events)})
+        return response, json.loads(response.content.decode('utf-8'))
+
+    def test_clicks_are_counted_in_bulk(self):
+        response, data = self.post([
+            {'type': 'click', 'page': self.page.id},
+            {'type': 'click', 'page': self.page.id},
+            {'type': 'click', 'page': self.ham.id},
+            {'type': 'click', 'page': 999999},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data, {'clicks': 3, 'likes': 0})
+
+        self.assertEqual(Page.objects.get(id=self.page.id).views, 2)
+        self.assertEqual(Page.objects.get(id=self.ham.id).views, 1)
+        self.assertIsNotNone(Page.objects.get(id=self.ham.id).last_visit)
+        self.assertEqual(
+            Category.objects.get(id=self.cat.id).total_page_views, 2)
+        self.assertEqual(ClickEvent.objects.count(), 3)
+        self.assertEqual(Category.objects.get(id=self.other.id).trending, 0)
+        trending.trending_scores.flush()
+        self.assertGreater(Category.objects.get(id=self.other.id).trending, 0)
+
+    @override_settings(RANGO_CLICK_BUFFER_MAX_AGE=60,
+                       RANGO_TRENDING_BUFFER_MAX_AGE=60)
+    def test_click_queries(self):
+        """
+        Checks that a click costs the grouped updates of page and
+        category only, click log and trending scores are written behind.
+        """
+        # Two UPDATEs in a savepoint.
+        with self.assertNumQueries(4):
+            record_page_view(self.page)
+
+    def test_likes_need_login(self):
+        response, data = self.post([{'type': 'like',
+                                     'category': self.cat.id}])
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Category.objects.get(id=self.cat.id).likes, 0)
+
+        self.client.login(username='test_user', password='1234')
+        response, data = self.post([
+            {'type': 'like', 'category': self.cat.id},
+            {'type': 'like', 'category': self.cat.id},
+            {'type': 'click', 'page': self.eggs.id},
+            {'type': 'click', 'page': self.page.id},
+        ])
+        self.assertEqual(data, {'clicks': 2, 'likes': 2})
+        self.assertEqual(Category.objects.get(id=self.cat.id).likes, 2)
+        self.assertEqual(
+            [p.title for p in history.get_recent_pages(self.user)],
+            ['spam', 'eggs'])
+
+    def test_invalid_batch(self):
+        response, data = self.post([{'type': 'click'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', data)
+        self.assertEqual(self.client.get(reverse('events')).status_code, 405)
+
+    def test_csrf_token_is_required(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(reverse('events'), {'events': '[]'})
+        self.assertEqual(response.status_code, 403)
+
+        # Token from the page, as sent by rango-ajax.js.
+        response = client.get(reverse('index'))
+        token = response.cookies['csrftoken'].value
+        self.assertContains(response, token)
+        response = client.post(reverse('events'),
+                               {'events': '[]', 'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 200)
+
+    def test_links_point_to_targets(self):
+        response = self.client.get(reverse('category', args=['python']))
+        self.assertContains(
+            response, '<a href="http://example.com/" class="page-link" '
+                      'data-page-id="{0}">'.format(self.page.id))
+
+    def test_record_page_views_skips_unknown_pages(self):
+        self.assertEqual(record_page_views({self.page.id: 2, 999999: 1}),
+                         {self.page.id: 2})
@@ -0,0 +1,234 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+from django.utils.six.moves import BaseHTTPServer
+
+from rango import throttling, traffic
+from rango.management.commands import replay_traffic
+from rango.models import Category
+from rango.tests.test_requestlog import ListHandler, capture_logs
+from rango.tests.test_views import add_cat
+
+
+@override_settings(RANGO_BUFFER_AUTO_FLUSH=False)
+class RecordingTests(TestCase):
+
+    def setUp(self):
+        self.handler = ListHandler()
+        traffic.recorder.addHandler(self.handler)
+        self.cat = add_cat('python', 0, 0)
+        User.objects.create_user(username='alice', password='1234')
+
+    def tearDown(self):
+        traffic.recorder.removeHandler(self.handler)
+
+    def records(self):
+        return [json.loads(line) for line in self.handler.lines]
+
+    @override_settings(RANGO_TRAFFIC_RECORD=1)
+    def test_record(self):
+        self.client.get(reverse('suggest_category'), {'suggestion': 'py'})
+        self.client.login(username='alice', password='1234')
+        self.client.post(reverse('events'),
+                         {'events': '[]', 'csrfmiddlewaretoken': 'secret'})
+
+        get, post = self.records()
+        self.assertEqual((get['method'], get['path'], get['query'],
+                          get['user']),
+                         ('GET', reverse('suggest_category'),
+                          {'suggestion': ['py']}, None))
+        self.assertEqual((post['method'], post['data'], post['user']),
+                         ('POST', {'events': ['[]']}, 'alice'))
+
+    @override_settings(RANGO_TRAFFIC_RECORD=0)
+    def test_not_recorded(self):
+        self.client.get(reverse('index'))
+        self.assertEqual(self.handler.lines, [])
+
+
+@override_settings(RANGO_BUFFER_AUTO_FLUSH=False)
+class InProcessTargetTests(TestCase):
+
+    def setUp(self):
+        throttling.local_buckets.clear()
+        self.cat = add_cat('python', 0, 0)
+        User.objects.create_user(username='alice', password='1234')
+
+    def test_send(self):
+        """
+        Checks that recorded requests run through the WSGI handler as
+        the recorded user.
+        """
+        target = traffic.InProcessTarget()
+        sessions = traffic.Sessions()
+        like = {'method': 'GET', 'path': reverse('like_category'),
+                'query': {'category_id': [str(self.cat.id)]}}
+
+        self.assertEqual(target.send(like, sessions.get('nobody')), 302)
+        self.assertEqual(target.send(like, sessions.get('alice')), 200)
+        self.assertEqual(Category.objects.get(pk=self.cat.pk).likes, 1)
+
+        search = {'method': 'GET', 'path': reverse('suggest_category'),
+                  'query': {'suggestion': ['py']}}
+        self.assertEqual(target.send(search, None), 200)
+        self.assertEqual(traffic.view_name(search['path']),
+                         'suggest_category')
+        self.assertEqual(traffic.view_name('/no/such/page/'), 'unresolved')
+
+
+class CookieHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Records Cookie headers, /login sets a session cookie.
+    """
+
+    def do_GET(self):
+        self.server.cookies.append(self.headers.get('Cookie', ''))
+        self.send_response(200)
+        if self.path == '/login':
+            self.send_header('Set-Cookie', 'sessionid=logged-in; Path=/')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpTargetTests(SimpleTestCase):
+
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                CookieHandler)
+        self.server.cookies = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_cookies_per_record(self):
+        """
+        Checks that cookies set in answer to one record are not sent
+        with the next.
+        """
+        target = traffic.HttpTarget(
+            'http://127.0.0.1:{0}/'.format(self.server.server_address[1]))
+        self.assertEqual(target.send({'method': 'GET', 'path': '/login'},
+                                     None), 200)
+        target.send({'method': 'GET', 'path': '/'}, None)
+        target.send({'method': 'GET', 'path': '/'}, 'alice-session')
+
+        self.assertNotIn('sessionid', self.server.cookies[1])
+        self.assertIn('sessionid=alice-session', self.server.cookies[2])
+
+
+class FakeTarget(object):
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.sent = []
+        self.in_flight = self.max_in_flight = 0
+
+    def send(self, record, session_key):
+        with self.lock:
+            self.sent.append((time.time(), record['path']))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        if record['path'] == '/fail/':
+            raise IOError('connection refused')
+        return 200
+
+
+class ReplayTests(SimpleTestCase):
+
+    def records(self, n, step=0.1):
+        return [{'ts': 1000 + i * step, 'method': 'GET',
+                 'path': reverse('index'), 'query': {}} for i in range(n)]
+
+    def test_concurrency(self):
+        target = FakeTarget(delay=0.02)
+        handler = capture_logs(self, traffic.logger)
+        results = traffic.replay(
+            self.records(20) + [{'method': 'GET', 'path': '/fail/'}],
+            target, concurrency=4)
+
+        self.assertEqual(len(target.sent), 21)
+        self.assertEqual(target.max_in_flight, 4)
+        self.assertEqual(results.count, 21)
+        self.assertEqual(dict(results.statuses['index']), {200: 20})
+        self.assertEqual(dict(results.statuses['unresolved']), {0: 1})
+        self.assertEqual(handler.lines, ['Replay of GET /fail/ failed.'])
+
+        summary = results.summary()
+        self.assertEqual(summary['views']['index']['count'], 20)
+        self.assertIn('p95', summary['views']['index']['percentiles'])
+        json.dumps(summary)
+
+    def test_speed(self):
+        """
+        Checks that requests keep their recorded offsets, scaled.
+        """
+        target = FakeTarget()
+        traffic.replay(self.records(5, step=0.5), target, concurrency=2,
+                       speed=10)
+
+        times = sorted(sent for sent, _ in target.sent)
+        self.assertGreaterEqual(times[-1] - times[0], 0.19)
+        self.assertLess(times[-1] - times[0], 0.5)
+
+
+class ReplayCommandTests(TestCase):
+
+    def setUp(self):
+        add_cat('python', 0, 0)
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'traffic.log')
+        with open(self.path, 'w') as log:
+            for path in (reverse('index'), reverse('cat-list'),
+                         reverse('index')):
+                log.write(json.dumps({'ts': 1, 'method': 'GET',
+                                      'path': path, 'query': {}}) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_replay_traffic(self):
+        # A worker thread would not see the test database, so run the
+        # in-process target in this thread.
+        def replay(records, target, concurrency, speed):
+            results = traffic.ReplayResults()
+            for record in records:
+                results.add(traffic.view_name(record['path']),
+                            target.send(record, None), 0.01)
+            return results
+
+        output = os.path.join(self.dir, 'results.json')
+        out = StringIO()
+        replay_traffic.replay = replay
+        try:
+            call_command('replay_traffic', self.path, output=output,
+                         stdout=out)
+        finally:
+            replay_traffic.replay = traffic.replay
+
+        self.assertIn('3 requests in', out.getvalue())
+        self.assertIn('200: 2', out.getvalue())
+        with open(output) as results:
+            results = json.load(results)
+        self.assertEqual(results['views']['cat-list']['statuses'],
+                         {'200': 1})
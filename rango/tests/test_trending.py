@@ -0,0 +1,144 @@
+import datetime
+import json
+import math
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from rango import clicklog, trending
+from rango.models import Category, ClickEvent, Page
+from rango.tests.test_views import add_cat, add_page
+
+
+HOUR = datetime.timedelta(hours=1)
+
+
+@override_settings(RANGO_TRENDING_HALF_LIFE=24, RANGO_BUFFER_AUTO_FLUSH=False)
+class TrendingScoreTests(TestCase):
+
+    def setUp(self):
+        self.cat = add_cat('rango_test', 0, 0)
+        self.old = add_page(self.cat, 'old', 'http://example.com/')
+        self.new = add_page(self.cat, 'new', 'http://example.com/')
+        self.now = timezone.now()
+        trending.trending_scores.clear()
+
+    def reload(self, obj):
+        return type(obj).objects.get(id=obj.id)
+
+    def test_log_add(self):
+        self.assertAlmostEqual(trending.log_add(0, 0), math.log(2))
+        # No overflow far away from the epoch.
+        self.assertAlmostEqual(trending.log_add(5000, 5000),
+                               5000 + math.log(2))
+
+    def test_heat_halves_every_half_life(self):
+        score = trending.event_score(self.now, 4)
+        self.assertAlmostEqual(trending.heat(score, self.now), 4)
+        self.assertAlmostEqual(trending.heat(score, self.now + 24 * HOUR), 2)
+
+    def test_recent_clicks_outrank_old_ones(self):
+        """
+        Checks that 3 clicks two days ago lose against 1 click now.
+        """
+        for _ in range(3):
+            trending.bump(Page, self.old.id, now=self.now - 48 * HOUR)
+        trending.bump(Page, self.new.id, now=self.now)
+
+        self.assertEqual([p.title for p in trending.get_trending_pages(2)],
+                         ['new', 'old'])
+        self.assertAlmostEqual(
+            trending.heat(self.reload(self.old).trending, self.now), 0.75,
+            places=4)
+
+    def test_bump_missing_row(self):
+        self.assertFalse(trending.bump(Page, 0))
+
+    def test_track_url_and_like_update_scores(self):
+        User.objects.create_user(username='test_user', password='1234')
+        self.client.login(username='test_user', password='1234')
+
+        self.client.get(reverse('goto'), data={'page_id': self.new.id})
+        self.client.get(reverse('like_category'),
+                        data={'category_id': self.cat.id})
+        trending.trending_scores.flush()
+
+        self.assertAlmostEqual(trending.heat(self.reload(self.new).trending),
+                               1, places=2)
+        self.assertAlmostEqual(trending.heat(self.reload(self.cat).trending),
+                               6, places=2)
+
+    def test_rebuild_matches_incremental_scores(self):
+        """
+        Checks that rebuilding from rolled up and pending clicks gives
+        the scores incremental updates would (up to bucket precision).
+        """
+        now = datetime.datetime(2015, 7, 5, 12, 30, tzinfo=timezone.utc)
+        clicks = [(self.old, now - 40 * 24 * HOUR),
+                  (self.old, now - 3 * HOUR),
+                  (self.new, now - 2 * HOUR),
+                  (self.new, now)]
+        ClickEvent.objects.bulk_create([
+            ClickEvent(page=page, category=self.cat, created=created)
+            for page, created in clicks])
+        clicklog.rollup(now=now)
+        clicklog.compact(now=now)
+
+        self.assertEqual(trending.rebuild(now=now), (2, 1))
+
+        old = self.reload(self.old).trending
+        new = self.reload(self.new).trending
+        self.assertGreater(new, old)
+        expected = trending.log_add(trending.event_score(now - 2 * HOUR),
+                                    trending.event_score(now))
+        self.assertAlmostEqual(trending.heat(new, now),
+                               trending.heat(expected, now), places=2)
+        self.assertAlmostEqual(
+            trending.heat(self.reload(self.cat).trending, now),
+            trending.heat(trending.log_add(old, new), now))
+
+    def test_rebuild_command(self):
+        Page.objects.update(trending=42)
+        out = StringIO()
+        call_command('rebuild_trending', stdout=out)
+        self.assertIn('Rebuilt trending scores of 0 pages and 0 categories.',
+                      out.getvalue())
+        self.assertFalse(Page.objects.exclude(trending=0).exists())
+
+
+class TrendingViewTests(TestCase):
+
+    def setUp(self):
+        for n in range(12):
+            cat = add_cat('test{0}'.format(n), 0, 0)
+            page = add_page(cat, 'page{0}'.format(n), 'http://example.com/')
+            if n:
+                trending.bump(Page, page.id, n)
+                trending.bump(Category, cat.id, n)
+
+    def test_trending_view(self):
+        response = self.client.get(reverse('trending'))
+        self.assertTemplateUsed(response, 'rango/trending.html')
+
+        pages = response.context['trending_pages']
+        self.assertEqual([p.title for p in pages][:2], ['page11', 'page10'])
+        self.assertEqual(len(pages), 10)
+        cats = response.context['trending_categories']
+        self.assertEqual(cats[0].name, 'test11')
+
+    def test_api(self):
+        response = self.client.get(reverse('page-trending'),
+                                   data={'limit': 2})
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual([p['title'] for p in data], ['page11', 'page10'])
+        self.assertAlmostEqual(data[0]['heat'], 11, places=1)
+
+        response = self.client.get(reverse('cat-trending'))
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(len(data), 10)
+        self.assertEqual(data[0]['name'], 'test11')
@@ -1,8 +1,11 @@
 import datetime
+import json
+import re
 
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.utils import timezone
 
 from rango.models import Category, Page, UserProfile
@@ -86,6 +89,24 @@ class IndexViewTests(TestCase):
         cats_num = len(response.context['categories'])
         self.assertEqual(cats_num, 5)
 
+    def test_most_viewed_categories(self):
+        """
+        Checks context contains top 5 categories sorted by views.
+        """
+        for views in range(7):
+            add_cat('test{0}'.format(views), views, 0)
+
+        response = self.client.get(reverse(self.urlpat_name))
+        self.assertEqual(response.status_code, 200)
+        self.assertQuerysetEqual(
+            response.context['most_viewed_categories'],
+            ['<Category: test6>',
+             '<Category: test5>',
+             '<Category: test4>',
+             '<Category: test3>',
+             '<Category: test2>'])
+        self.assertContains(response, "Most Viewed Categories")
+
     #
     # Pages
     #
@@ -216,6 +237,7 @@ class AboutViewTests(TestCase):
         self.assertTemplateUsed(response, 'rango/about.html')
 
 
+@override_settings(RANGO_BUFFER_AUTO_FLUSH=False)
 class CategoryViewTests(TestCase):
 
     def setUp(self):
@@ -307,12 +329,77 @@ class CategoryViewTests(TestCase):
             response,
             "The specified category does not exist!")
 
+    @override_settings(RANGO_PAGE_CHUNK_SIZE=2)
+    def test_pages_context_is_first_chunk(self):
+        """
+        Checks that only the first chunk of pages is rendered
+        and cursor to the next chunk is provided.
+        """
+        url = 'http://example.com'
+        add_page(cat=self.cat, name='test1', url=url, views=1)
+        add_page(cat=self.cat, name='test2', url=url, views=2)
+        add_page(cat=self.cat, name='test3', url=url, views=3)
+
+        response = self.client.get(self.url + self.cat.slug + '/')
+        self.assertEqual(response.status_code, 200)
+        self.assertQuerysetEqual(response.context['pages'],
+                                 ['<Page: test3>', '<Page: test2>'])
+        self.assertContains(response, 'id="page-more"')
+
     #
     # Searching
     #
     # !!!TODO: add appropriate tests.
 
 
+@override_settings(RANGO_PAGE_CHUNK_SIZE=2)
+class CategoryPagesViewTests(TestCase):
+
+    def setUp(self):
+        self.cat = add_cat('rango_test', 1, 1)
+        url = 'http://example.com'
+        add_page(cat=self.cat, name='test1', url=url, views=1)
+        add_page(cat=self.cat, name='test2', url=url, views=5)
+        add_page(cat=self.cat, name='test3', url=url, views=5)
+        add_page(cat=self.cat, name='test4', url=url, views=7)
+        add_page(cat=self.cat, name='test5', url=url, views=0)
+        self.url = reverse('category_pages', args=[self.cat.slug])
+
+    def test_chunks_follow_each_other(self):
+        """
+        Checks that following `next` links walks through all pages
+        sorted by views (ties broken by id) without repetitions.
+        """
+        titles = []
+        url = self.url
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.content.decode('utf-8'))
+            titles.extend(re.findall(r'>(test\d)</a>', data['html']))
+            url = data['next']
+
+        self.assertEqual(titles,
+                         ['test4', 'test3', 'test2', 'test1', 'test5'])
+
+    def test_malformed_cursor_starts_from_top(self):
+        """
+        Malformed cursor should be ignored.
+        """
+        response = self.client.get(self.url, data={'after': 'spam'})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertIn('test4', data['html'])
+
+    def test_non_exist_category(self):
+        """
+        Unknown category results in 404.
+        """
+        url = reverse('category_pages', args=['no-such-category'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+
 class AddCategoryViewTests(TestCase):
 
     def setUp(self):
@@ -615,6 +702,7 @@ class UserSettingsViewTests(TestCase):
         self.assertTrue('profile' not in response.context.keys())
 
 
+@override_settings(RANGO_BUFFER_AUTO_FLUSH=False)
 class TrackUrlViewTests(TestCase):
 
     def setUp(self):
@@ -667,7 +755,23 @@ class TrackUrlViewTests(TestCase):
         page = Page.objects.get(id=self.page.id)
         self.assertEqual(page.views, views + 1)
 
+    def test_category_counters_updated(self):
+        """
+        Checks that page visit is added to denormalized counters
+        of the page category.
+        """
+        response = self.client.get(path=reverse(self.urlpat_name),
+                                   data={'page_id': self.page.id})
+        self.assertEqual(response.status_code, 302)
+
+        cat = Category.objects.get(id=self.cat.id)
+        self.assertEqual(cat.total_page_views, 1)
+        self.assertEqual(cat.page_count, 1)
+        self.assertEqual(cat.last_activity, Page.objects.get(
+            id=self.page.id).last_visit)
+
 
+@override_settings(RANGO_BUFFER_AUTO_FLUSH=False)
 class LikeCategoryViewTests(TestCase):
 
     def setUp(self):
@@ -827,6 +931,7 @@ class SuggestCategoryViewTests(TestCase):
         self.assertEqual(response.context['cats'], [])
 
 
+@override_settings(RANGO_BUFFER_AUTO_FLUSH=False)
 class AutoAddPageViewTests(TestCase):
 
     def setUp(self):
@@ -895,6 +1000,51 @@ class AutoAddPageViewTests(TestCase):
         self.assertQuerysetEqual(response.context['pages'],
                                  ['<Page: Python.org>'])
 
+    def test_only_web_urls(self):
+        """
+        Checks that URLs other than http(s) are not added, and that
+        those stored before link through goto.
+        """
+        self.client.login(username='test_user', password='1234')
+        params = {'title_data': 'Script',
+                  'url_data': 'javascript:alert(1)',
+                  'catid_data': self.cat.id}
+        response = self.client.get(path=reverse(self.urlpat_name),
+                                   data=params)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Page.objects.exists())
+
+        page = add_page(self.cat, 'Script', 'http://example.com/')
+        Page.objects.filter(pk=page.pk).update(url='javascript:alert(1)')
+        response = self.client.get(reverse('category',
+                                           args=[self.cat.slug]))
+        self.assertContains(response, 'href="{0}?page_id={1}"'.format(
+            reverse('goto'), page.pk))
+        self.assertNotContains(response, 'javascript:alert')
+
+
+class MostViewedCategoriesApiTests(TestCase):
+
+    def setUp(self):
+        for views in range(12):
+            add_cat('test{0}'.format(views), views, 0)
+        self.url = reverse('cat-most-viewed')
+
+    def get_names(self, **params):
+        response = self.client.get(self.url, data=params)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content.decode('utf-8'))
+        return [cat['name'] for cat in data]
+
+    def test_sorted_by_views(self):
+        names = self.get_names()
+        self.assertEqual(len(names), 10)
+        self.assertEqual(names[:3], ['test11', 'test10', 'test9'])
+
+    def test_limit(self):
+        self.assertEqual(self.get_names(limit=2), ['test11', 'test10'])
+        self.assertEqual(len(self.get_names(limit='spam')), 10)
+
 
 #######################################################################
 # Helper functions
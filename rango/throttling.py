@@ -0,0 +1,156 @@
+"""
+Per-client token-bucket throttling of Rango endpoints.
+
+`throttle(scope)` wraps a view with the limits of RANGO_THROTTLES
+`[scope]`: `rate` tokens per second refill a bucket of `burst` tokens,
+every request takes one. A request finding the bucket empty gets a 429
+with `Retry-After` before the view (and any DB query it makes) runs.
+
+Buckets are keyed by client IP, or by user id for scopes configured
+with `'key': 'user'`, which costs the session lookup that the login
+check of those views does anyway. They live in process memory, or in
+the RANGO_THROTTLE_CACHE cache when several workers should share
+them; there concurrent requests of one client may both see the last
+token, so the limit is soft by at most the number of workers.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+
+def get_throttles():
+    return getattr(settings, 'RANGO_THROTTLES', {})
+
+
+class LocalBuckets(object):
+    """
+    Thread-safe in-process buckets. Buckets that have refilled
+    completely are dropped once more than `max_keys` are held.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def take(self, key, rate, burst, now):
+        """
+        Takes a token. Returns 0, or seconds until one is available.
+        """
+        with self.lock:
+            tokens, last, _ = self.buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            full_at = now + (burst - tokens) / rate
+            self.buckets[key] = (tokens, now, full_at)
+
+            if len(self.buckets) > self.max_keys:
+                self.prune(now)
+        return wait
+
+    def prune(self, now):
+        for key, (_, _, full_at) in list(self.buckets.items()):
+            if full_at <= now:
+                del self.buckets[key]
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheBuckets(object):
+    """
+    Buckets kept in a Django cache shared by all workers.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def take(self, key, rate, burst, now):
+        key = 'rango:throttle:' + key
+        tokens, last = self.cache.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / rate
+        if not wait:
+            tokens -= 1
+        # Expires once refilled, a missing bucket is a full one.
+        self.cache.set(key, (tokens, now),
+                       int(math.ceil((burst - tokens) / rate)) + 1)
+        return wait
+
+
+class ThrottleCounters(object):
+    """
+    Allowed and throttled requests per scope since process start.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = defaultdict(lambda: {'allowed': 0, 'throttled': 0})
+
+    def add(self, scope, throttled):
+        with self.lock:
+            self.counts[scope]['throttled' if throttled else 'allowed'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict((scope, dict(counts))
+                        for scope, counts in self.counts.items())
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+
+
+local_buckets = LocalBuckets()
+counters = ThrottleCounters()
+
+
+def get_buckets():
+    alias = getattr(settings, 'RANGO_THROTTLE_CACHE', None)
+    if alias:
+        return CacheBuckets(caches[alias])
+    return local_buckets
+
+
+def get_client_key(request, key_type):
+    if key_type == 'user' and request.user.is_authenticated():
+        return 'user:{0}'.format(request.user.pk)
+    return 'ip:{0}'.format(request.META.get('REMOTE_ADDR', ''))
+
+
+def too_many_requests(wait):
+    response = HttpResponse('Too many requests, slow down.', status=429,
+                            content_type='text/plain')
+    response['Retry-After'] = str(int(math.ceil(wait)))
+    return response
+
+
+def throttle(scope):
+    """
+    View decorator applying the RANGO_THROTTLES limits of `scope`.
+    Put it above `login_required`, so throttled requests stop here.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            config = get_throttles().get(scope)
+            if config:
+                key = '{0}:{1}'.format(
+                    scope, get_client_key(request, config.get('key', 'ip')))
+                wait = get_buckets().take(key, float(config['rate']),
+                                          config['burst'], time.time())
+                counters.add(scope, wait)
+                if wait:
+                    return too_many_requests(wait)
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
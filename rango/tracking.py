@@ -0,0 +1,131 @@
+"""
+Recording of page visits and category likes.
+"""
+import json
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import six, timezone
+
+from rango.buffers import group_by_increment
+from rango.clicklog import log_clicks
+from rango.models import Category, Page
+from rango.trending import record_like, trending_scores
+
+
+def get_max_events():
+    return getattr(settings, 'RANGO_EVENT_BATCH_MAX', 100)
+
+
+def record_page_view(page, session_key=''):
+    """
+    Counts a visit of `page`, see `record_page_views`.
+    """
+    record_page_views({page.id: 1}, session_key,
+                      {page.id: page.category_id})
+
+
+def record_page_views(clicks, session_key='', categories=None):
+    """
+    Counts visits (`{page_id: clicks}`): bumps page views and the
+    denormalized counters of their categories in one transaction, and
+    queues the clicks for the click log and trending scores, which are
+    written behind. `session_key` ties clicks to the visitor's other
+    clicks for related categories. `categories` maps page ids to
+    category ids and is looked up if not given. Unknown pages are
+    skipped. Returns `{page_id: clicks}` counted.
+    """
+    now = timezone.now()
+    if categories is None:
+        categories = dict(Page.objects.filter(id__in=list(clicks))
+                                      .values_list('id', 'category_id'))
+    clicks = dict((page_id, n) for page_id, n in clicks.items()
+                  if page_id in categories)
+
+    category_clicks = defaultdict(int)
+    for page_id, n in clicks.items():
+        category_clicks[categories[page_id]] += n
+
+    # One UPDATE per distinct increment: concurrent clicks are not
+    # lost and the write lock is held for a few statements only.
+    with transaction.atomic():
+        for n, ids in group_by_increment(clicks).items():
+            Page.objects.filter(id__in=ids).update(
+                views=F('views') + n, last_visit=now)
+        for n, ids in group_by_increment(category_clicks).items():
+            Category.objects.filter(id__in=ids).update(
+                total_page_views=F('total_page_views') + n,
+                last_activity=now)
+
+    log_clicks(clicks, categories, now, session_key)
+    for page_id, n in clicks.items():
+        trending_scores.add(Page, page_id, n, now)
+    for category_id, n in category_clicks.items():
+        trending_scores.add(Category, category_id, n, now)
+
+    return clicks
+
+
+def record_likes(likes):
+    """
+    Counts likes (`{category_id: likes}`) and updates trending
+    scores. Returns `{category_id: likes}` counted.
+    """
+    existing = set(Category.objects.filter(id__in=list(likes))
+                                   .values_list('id', flat=True))
+    likes = dict((category_id, n) for category_id, n in likes.items()
+                 if category_id in existing)
+
+    with transaction.atomic():
+        for n, ids in group_by_increment(likes).items():
+            Category.objects.filter(id__in=ids).update(likes=F('likes') + n)
+
+    for category_id, n in likes.items():
+        record_like(category_id, n)
+
+    return likes
+
+
+def parse_events(data):
+    """
+    Validates JSON list of events posted to the events beacon:
+    `{"type": "click", "page": <id>}` and
+    `{"type": "like", "category": <id>}`. Returns list of clicked
+    page ids in order and `{category_id: likes}`. Raises ValueError
+    on malformed or too large batches.
+    """
+    try:
+        events = json.loads(data)
+    except ValueError:
+        raise ValueError('Events must be a JSON list.')
+    if not isinstance(events, list):
+        raise ValueError('Events must be a JSON list.')
+    if len(events) > get_max_events():
+        raise ValueError('At most {0} events per batch.'.format(
+            get_max_events()))
+
+    clicks = []
+    likes = Counter()
+    for event in events:
+        if not isinstance(event, dict):
+            raise ValueError('Event must be an object.')
+
+        kind = event.get('type')
+        key = {'click': 'page', 'like': 'category'}.get(kind)
+        if key is None:
+            raise ValueError('Unknown event type: {0!r}.'.format(kind))
+
+        object_id = event.get(key)
+        if (not isinstance(object_id, six.integer_types) or
+                isinstance(object_id, bool) or object_id <= 0):
+            raise ValueError('Event {0} needs a positive integer "{1}".'
+                             .format(kind, key))
+
+        if kind == 'click':
+            clicks.append(object_id)
+        else:
+            likes[object_id] += 1
+
+    return clicks, likes
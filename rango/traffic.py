@@ -0,0 +1,293 @@
+"""
+Record and replay of real request streams.
+
+`TrafficRecordingMiddleware` writes a RANGO_TRAFFIC_RECORD fraction of
+requests as JSON lines to the `rango.traffic.record` logger (see
+LOGGING):
+
+    {"ts": 1434556800.1, "method": "POST", "path": "/rango/like_category/",
+     "query": {}, "data": {"category_id": ["3"]}, "user": "alice"}
+
+Form fields named in RANGO_TRAFFIC_REDACT (passwords, CSRF tokens) are
+left out, uploaded files are not recorded.
+
+`manage.py replay_traffic` sends the recorded requests again with a
+fixed number of worker threads, either in-process through the WSGI
+handler (`InProcessTarget`) or to a running server (`HttpTarget`),
+optionally keeping the original pacing, and reports throughput and
+latency per URL name. Recorded users are logged in with a session
+created in the database of the replaying process, so an `HttpTarget`
+server has to use that database too. Replays write, e.g. likes and
+added pages, so run them against a copy of the data.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY)
+from django.contrib.auth.models import User
+from django.core.urlresolvers import Resolver404, resolve
+from django.utils.http import urlencode
+from django.utils.importlib import import_module
+from django.utils.six.moves import queue
+from django.utils.six.moves.urllib.parse import urlsplit
+
+from rango.requestlog import Histogram
+
+
+logger = logging.getLogger(__name__)
+recorder = logging.getLogger('rango.traffic.record')
+
+# Stand-in CSRF secret, sent as cookie and form field to HTTP targets.
+CSRF_TOKEN = 'r' * 32
+
+
+def get_record_rate():
+    return getattr(settings, 'RANGO_TRAFFIC_RECORD', 0)
+
+
+def get_redacted():
+    return getattr(settings, 'RANGO_TRAFFIC_REDACT',
+                   ('csrfmiddlewaretoken', 'password', 'password1',
+                    'password2'))
+
+
+def form_fields(querydict, redacted=()):
+    return dict((key, values) for key, values in querydict.lists()
+                if key not in redacted)
+
+
+class TrafficRecordingMiddleware(object):
+    """
+    Records requests, see module docstring.
+    Put it after AuthenticationMiddleware.
+    """
+
+    def process_request(self, request):
+        rate = get_record_rate()
+        if not rate or random.random() >= rate:
+            return None
+
+        user = request.user
+        recorder.info(json.dumps({
+            'ts': round(time.time(), 3),
+            'method': request.method,
+            'path': request.path,
+            'query': form_fields(request.GET),
+            'data': (form_fields(request.POST, get_redacted())
+                     if request.method == 'POST' else {}),
+            'user': user.get_username() if user.is_authenticated() else None,
+        }, sort_keys=True))
+
+
+def view_name(path):
+    try:
+        return resolve(urlsplit(path).path).view_name
+    except Resolver404:
+        return 'unresolved'
+
+
+class Sessions(object):
+    """
+    Thread-safe cache of session keys of logged in users by username,
+    None for unknown users.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = {}
+
+    def get(self, username):
+        with self.lock:
+            if username not in self.keys:
+                self.keys[username] = self.create(username)
+            return self.keys[username]
+
+    def create(self, username):
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            return None
+
+        engine = import_module(settings.SESSION_ENGINE)
+        session = engine.SessionStore()
+        session[SESSION_KEY] = user.pk
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return session.session_key
+
+
+class InProcessTarget(object):
+    """
+    Sends requests through Django's WSGI handler in this process, one
+    test client per worker thread. CSRF checks are off.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def send(self, record, session_key):
+        # Imported here, the test client is a development tool.
+        from django.test import Client
+
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client()
+
+        client.cookies.clear()
+        if session_key:
+            client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+
+        method, path = record['method'], record['path']
+        if method == 'POST':
+            response = client.post(path + query_string(record),
+                                   record.get('data', {}))
+        elif method in ('GET', 'HEAD'):
+            response = getattr(client, method.lower())(
+                path, record.get('query', {}))
+        else:
+            response = client.generic(method, path + query_string(record))
+        return response.status_code
+
+
+class HttpTarget(object):
+    """
+    Sends requests to a running server at `base_url`.
+    """
+
+    def __init__(self, base_url):
+        import requests
+
+        self.requests = requests
+        self.base_url = base_url.rstrip('/')
+        self.local = threading.local()
+
+    def send(self, record, session_key):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = self.requests.Session()
+        # Keep the connection pool but not cookies, e.g. the session of
+        # a replayed login, each record carries its own.
+        session.cookies.clear()
+
+        cookies = {settings.CSRF_COOKIE_NAME: CSRF_TOKEN}
+        if session_key:
+            cookies[settings.SESSION_COOKIE_NAME] = session_key
+        data = dict(record.get('data', {}))
+        if record['method'] == 'POST':
+            data['csrfmiddlewaretoken'] = CSRF_TOKEN
+
+        response = session.request(
+            record['method'], self.base_url + record['path'],
+            params=record.get('query', {}), data=data or None,
+            cookies=cookies, allow_redirects=False)
+        return response.status_code
+
+
+def query_string(record):
+    query = record.get('query')
+    return '?' + urlencode(query, doseq=True) if query else ''
+
+
+class ReplayResults(object):
+    """
+    Thread-safe latency histograms and status counts per URL name.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(Histogram)
+        self.statuses = defaultdict(Counter)
+        self.started = self.finished = time.time()
+
+    def add(self, view, status, seconds):
+        with self.lock:
+            self.latency[view].add(seconds)
+            self.statuses[view][status] += 1
+
+    @property
+    def count(self):
+        return sum(hist.count for hist in self.latency.values())
+
+    @property
+    def seconds(self):
+        return self.finished - self.started
+
+    def summary(self):
+        """
+        Returns results as a JSON-serializable dict.
+        """
+        seconds = max(self.seconds, 1e-6)
+        views = {}
+        for view, hist in self.latency.items():
+            summary = hist.summary()
+            summary['percentiles'] = dict(
+                ('p{0:g}'.format(q), value)
+                for q, value in summary['percentiles'])
+            summary['throughput'] = hist.count / seconds
+            summary['statuses'] = dict(
+                (str(status), count)
+                for status, count in self.statuses[view].items())
+            views[view] = summary
+        return {'requests': self.count, 'seconds': self.seconds,
+                'throughput': self.count / seconds, 'views': views}
+
+
+def replay(records, target, concurrency=4, speed=0, sessions=None):
+    """
+    Sends `records` to `target` from `concurrency` threads and returns
+    `ReplayResults`. With `speed` > 0 requests start no earlier than
+    their recorded offset divided by `speed`, else as fast as workers
+    are free. Failed requests count with status 0.
+    """
+    sessions = sessions or Sessions()
+    results = ReplayResults()
+    pending = queue.Queue(maxsize=concurrency * 4)
+
+    def work():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            due, record = item
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+            user = record.get('user')
+            session_key = sessions.get(user) if user else None
+            start = time.time()
+            try:
+                status = target.send(record, session_key)
+            except Exception:
+                logger.exception('Replay of %s %s failed.',
+                                 record['method'], record['path'])
+                status = 0
+            results.add(view_name(record['path']), status,
+                        time.time() - start)
+
+    workers = [threading.Thread(target=work) for _ in range(concurrency)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    results.started = time.time()
+    first = None
+    for record in records:
+        if first is None:
+            first = record.get('ts', 0)
+        due = 0
+        if speed:
+            due = results.started + (record.get('ts', 0) - first) / speed
+        pending.put((due, record))
+    for _ in workers:
+        pending.put(None)
+    for worker in workers:
+        worker.join()
+    results.finished = time.time()
+    return results
@@ -0,0 +1,205 @@
+"""
+Time-decayed trending scores of pages and categories.
+
+A click (or like) at time `t` weighs `w * 2 ** ((t - now) / half_life)`.
+Instead of decaying every stored score as time passes, scores are kept
+in log space relative to a fixed epoch:
+
+    trending = log(sum(w * exp(rate * (t - EPOCH))))
+
+Decay multiplies all scores by the same factor, so ranking by
+`trending` never needs a recompute and top-K is an index walk. A new
+event is folded in with `log_add`. `heat` turns a score back into the
+decayed event count at a given moment.
+
+Clicks and likes are folded per row in `trending_scores`, a
+write-behind buffer, and written with `bump` off the request path.
+
+Changing RANGO_TRENDING_HALF_LIFE invalidates stored scores, run
+`manage.py rebuild_trending` afterwards.
+"""
+import datetime
+import logging
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+
+from rango.buffers import WriteBehindBuffer
+from rango.clicklog import day_start
+from rango.models import (Category, Page, ClickEvent, CategoryViewRollup,
+                          PageViewRollup, ViewRollup)
+
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime.datetime(2015, 1, 1, tzinfo=timezone.utc)
+
+# Conditional updates retried on concurrent writes before giving up.
+MAX_RETRIES = 10
+
+
+def get_decay_rate():
+    """
+    Decay rate per second, from RANGO_TRENDING_HALF_LIFE hours.
+    """
+    half_life = getattr(settings, 'RANGO_TRENDING_HALF_LIFE', 24)
+    return math.log(2) / (half_life * 3600.0)
+
+
+def get_like_weight():
+    return getattr(settings, 'RANGO_TRENDING_LIKE_WEIGHT', 5)
+
+
+def log_add(a, b):
+    """
+    Returns `log(exp(a) + exp(b))` without overflowing.
+    """
+    hi, lo = max(a, b), min(a, b)
+    return hi + math.log1p(math.exp(lo - hi))
+
+
+def event_score(when, weight=1):
+    """
+    Log-space score of a single event of given weight.
+    """
+    seconds = (when - EPOCH).total_seconds()
+    return get_decay_rate() * seconds + math.log(weight)
+
+
+def heat(score, now=None):
+    """
+    Decayed number of events behind `score` as of `now`.
+    """
+    return math.exp(score - event_score(now or timezone.now()))
+
+
+def bump(model, pk, weight=1, now=None, term=None):
+    """
+    Folds an event (or the log-space `term` of several) into the
+    trending score of `model` row `pk`.
+
+    SQLite has no `exp`/`log`, so the new score is computed here and
+    written with a conditional UPDATE, retried if another writer got
+    in between. Returns False if the row is gone or retries ran out.
+    """
+    if term is None:
+        term = event_score(now or timezone.now(), weight)
+    rows = model.objects.using(router.db_for_write(model))
+
+    for _ in range(MAX_RETRIES):
+        old = rows.filter(pk=pk).values_list('trending', flat=True).first()
+        if old is None:
+            return False
+        if rows.filter(pk=pk, trending=old).update(
+                trending=log_add(old, term)):
+            return True
+
+    logger.warning('Gave up updating trending score of %s %s.',
+                   model.__name__, pk)
+    return False
+
+
+class ScoreBuffer(WriteBehindBuffer):
+    """
+    Folds event scores per row in log space: `{(model, pk): score}`.
+    """
+
+    def new_pending(self):
+        return {}
+
+    def put(self, pending, item):
+        key, term = item
+        pending[key] = log_add(pending[key], term) if key in pending \
+            else term
+
+    def merge(self, pending):
+        for item in pending.items():
+            self.put(self.pending, item)
+
+    def add(self, model, pk, weight=1, now=None):
+        self.push(((model, pk), event_score(now or timezone.now(), weight)))
+
+
+def flush_trending_scores(pending):
+    with transaction.atomic():
+        for (model, pk), term in pending.items():
+            bump(model, pk, term=term)
+
+
+trending_scores = ScoreBuffer(flush_trending_scores,
+                              'RANGO_TRENDING_BUFFER_MAX_AGE',
+                              'RANGO_TRENDING_BUFFER_MAX_PENDING')
+
+
+def record_like(category_id, count=1, now=None):
+    trending_scores.add(Category, category_id, get_like_weight() * count,
+                        now)
+
+
+def get_trending_pages(limit):
+    return Page.objects.select_related('category').order_by(
+        '-trending')[:limit]
+
+
+def get_trending_categories(limit):
+    return Category.objects.order_by('-trending')[:limit]
+
+
+def collect_scores(scores, rows, offset=datetime.timedelta(0)):
+    """
+    Adds `(key, when, weight)` rows to `scores`, events are taken
+    to happen `offset` after `when`.
+    """
+    for key, when, weight in rows:
+        term = event_score(when + offset, weight)
+        if key in scores:
+            scores[key] = log_add(scores[key], term)
+        else:
+            scores[key] = term
+
+
+def rebuild(now=None):
+    """
+    Recomputes trending scores from click history: daily rollups for
+    days whose hourly rollups may be compacted already, hourly rollups
+    for the later days and raw events not rolled up yet. Likes are not
+    timestamped, so rebuilt scores count clicks only.
+    Returns number of `(pages, categories)` with a non-zero history.
+    """
+    now = now or timezone.now()
+    retention = getattr(settings, 'RANGO_HOURLY_ROLLUP_RETENTION', 30)
+    boundary = day_start(now) - datetime.timedelta(days=retention - 1)
+
+    counts = []
+    for model, rollup_model, key in (
+            (Page, PageViewRollup, 'page_id'),
+            (Category, CategoryViewRollup, 'category_id')):
+        scores = {}
+        rollups = rollup_model.objects.values_list(key, 'start', 'views')
+        # Clicks of a bucket are placed in its middle.
+        collect_scores(scores,
+                       rollups.filter(period=ViewRollup.DAILY,
+                                      start__lt=boundary),
+                       datetime.timedelta(hours=12))
+        collect_scores(scores,
+                       rollups.filter(period=ViewRollup.HOURLY,
+                                      start__gte=boundary),
+                       datetime.timedelta(minutes=30))
+
+        events = defaultdict(int)
+        for event_key, created in ClickEvent.objects.filter(
+                rolled_up=False).values_list(key, 'created'):
+            events[event_key, created] += 1
+        collect_scores(scores, ((k, created, n)
+                                for (k, created), n in events.items()))
+
+        with transaction.atomic():
+            model.objects.update(trending=0)
+            for pk, score in scores.items():
+                model.objects.filter(pk=pk).update(trending=score)
+        counts.append(len(scores))
+
+    return tuple(counts)
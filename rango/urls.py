@@ -8,11 +8,16 @@ urlpatterns = patterns(
 
     url(r'^about/', views.about, name='about'),
 
+    url(r'^trending/$', views.trending, name='trending'),
+
     url(r'^add_category/$', views.add_category, name='add_category'),
 
     url(r'^category/(?P<category_name_slug>[\w\-]+)/add_page/$',
         views.add_page, name='add_page'),
 
+    url(r'^category/(?P<category_name_slug>[\w\-]+)/pages/$',
+        views.category_pages, name='category_pages'),
+
     url(r'^category/(?P<category_name_slug>[\w\-]+)/$',
         views.category, name='category'),
 
@@ -22,8 +27,12 @@ urlpatterns = patterns(
 
     url(r'^like_category/$', views.like_category, name='like_category'),
 
+    url(r'^events/$', views.events, name='events'),
+
     url(r'^suggest_category/$', views.suggest_category,
         name='suggest_category'),
 
     url(r'^auto_add_page/$', views.auto_add_page, name='auto_add_page'),
+
+    url(r'^throttle_stats/$', views.throttle_stats, name='throttle_stats'),
     )
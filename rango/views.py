@@ -1,18 +1,38 @@
+from collections import Counter
 from datetime import datetime
 
-from django.shortcuts import render
-from django.http import HttpResponse, HttpResponseRedirect
+from django.conf import settings
+from django.shortcuts import render, get_object_or_404
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.template.loader import render_to_string
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.core.urlresolvers import reverse
+from django.views.decorators.http import require_POST
+from django.db.models import F
 from django.utils import timezone
 
-from rango.models import Category, Page, UserProfile
+from rango.models import Category, Page, UserProfile, validate_page_url
 from rango.forms import CategoryForm, PageForm, UserProfileForm
+from rango.buffers import category_views
+from rango.dedup import find_duplicate, pages_for_url
 from rango.faroo_search import run_query, API_KEY
-from rango.serializers import CatSerializer, PageSerializer
+from rango.history import get_recent_pages, record_visit, record_visits
+from rango import ingest, metrics as rango_metrics
+from rango.pagination import get_page_chunk
+from rango.serializers import (CatSerializer, PageSerializer,
+                               TrendingCatSerializer, TrendingPageSerializer)
+from rango.throttling import counters as throttle_counters, throttle
+from rango.tracking import (parse_events, record_likes, record_page_view,
+                            record_page_views)
+from rango.trending import (get_trending_categories, get_trending_pages,
+                            record_like)
 
 from rest_framework import generics, status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 
 
 def index(request):
@@ -22,6 +42,10 @@ def index(request):
     category_list = Category.objects.order_by('-likes')[:5]
     context_dict['categories'] = category_list
 
+    # Most popular categories by visits.
+    most_viewed = Category.objects.order_by('-views')[:5]
+    context_dict['most_viewed_categories'] = most_viewed
+
     # Query the DB for a list of pages currently stored
     pages_list = Page.objects.order_by('-views')[:5]
     context_dict['pages'] = pages_list
@@ -54,6 +78,15 @@ def index(request):
     return render(request, 'rango/index.html', context_dict)
 
 
+def trending(request):
+    # Walk the trending indexes, no scores are recomputed.
+    context_dict = {
+        'trending_pages': get_trending_pages(10),
+        'trending_categories': get_trending_categories(10),
+    }
+    return render(request, 'rango/trending.html', context_dict)
+
+
 def about(request):
     return render(request, 'rango/about.html')
 
@@ -77,12 +110,21 @@ def category(request, category_name_slug):
         category = Category.objects.get(slug=category_name_slug)
         context_dict['category_name'] = category.name
 
-        # Retrieve all of the associated pages.
-        # Note that filter returns >= 1 model instance.
-        pages = Page.objects.filter(category=category).order_by('-views')
+        # Count the visit, written to DB in bulk later on.
+        if request.method == 'GET':
+            category_views.add(category.id)
+
+        # Retrieve the first chunk of the associated pages,
+        # the rest is fetched by `category_pages` on scrolling.
+        pages, next_cursor = get_page_chunk(category)
 
         # Add results list to the template context under name pages
         context_dict['pages'] = pages
+        context_dict['next_cursor'] = next_cursor
+
+        # Precomputed by `manage.py build_related_categories`.
+        context_dict['related_categories'] = [
+            r.related for r in category.related.select_related('related')]
 
         # Add the category object from the database to the context dict.
         # We'll use this in the template to verify that the category exists.
@@ -100,6 +142,23 @@ def category(request, category_name_slug):
     return render(request, 'rango/category.html', context_dict)
 
 
+def category_pages(request, category_name_slug):
+    """
+    Returns the next chunk of category pages as HTML fragment
+    wrapped into JSON, used for infinite scrolling.
+    """
+    category = get_object_or_404(Category, slug=category_name_slug)
+    pages, next_cursor = get_page_chunk(category, request.GET.get('after'))
+
+    html = render_to_string('rango/page_items.html', {'pages': pages})
+
+    next_url = None
+    if next_cursor:
+        next_url = get_category_pages_url(category, next_cursor)
+
+    return JsonResponse({'html': html, 'next': next_url})
+
+
 @login_required
 def add_category(request):
     # A HTTP POST?
@@ -136,7 +195,12 @@ def add_page(request, category_name_slug):
     if request.method == 'POST':
         form = PageForm(request.POST)
         if form.is_valid():
-            if cat:
+            duplicate = cat and find_duplicate(cat, form.cleaned_data['url'])
+            if duplicate:
+                form.add_error('url', 'This page is already in the '
+                                      'category as "{0}".'.format(
+                                          duplicate.title))
+            elif cat:
                 page = form.save(commit=False)
                 page.category = cat
                 page.views = 0
@@ -167,9 +231,12 @@ def user_settings(request):
     else:
         context['profile'] = profile
 
+    context['recent_pages'] = get_recent_pages(request.user)
+
     return render(request, 'registration/user_settings.html', context)
 
 
+@throttle('goto')
 def track_url(request):
     if request.method == 'GET':
         page_id = request.GET.get('page_id')
@@ -181,26 +248,55 @@ def track_url(request):
                 page = None
 
             if page:
-                page.views += 1
-                page.last_visit = timezone.now()
-                page.save()
+                record_page_view(page, request.session.session_key)
+                if request.user.is_authenticated():
+                    record_visit(request.user, page)
                 # Redirect user to specified URL.
                 return HttpResponseRedirect(page.url)
 
         return HttpResponseRedirect('/rango/')
 
 
+@throttle('like_category')
 @login_required
 def like_category(request):
     if request.method == 'GET':
         cat_id = request.GET.get('category_id')
 
         if cat_id:
-            cat = Category.objects.get(id=cat_id)
-            if cat:
-                cat.likes += 1
-                cat.save()
-                return HttpResponse(cat.likes)
+            cats = Category.objects.filter(id=cat_id)
+            if cats.update(likes=F('likes') + 1):
+                record_like(cat_id)
+                likes = cats.values_list('likes', flat=True)[0]
+                return HttpResponse(likes)
+
+
+@throttle('events')
+@require_POST
+def events(request):
+    """
+    Beacon endpoint for batches of click and like events queued by
+    rango-ajax.js, posted as JSON list in the `events` field (see
+    `rango.tracking.parse_events`). Page links point straight at
+    their targets, clicks are counted here.
+    """
+    try:
+        clicks, likes = parse_events(request.POST.get('events', ''))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if likes and not request.user.is_authenticated():
+        return JsonResponse({'error': 'Log in to like categories.'},
+                            status=403)
+
+    counted = record_page_views(Counter(clicks),
+                                request.session.session_key)
+    if counted and request.user.is_authenticated():
+        record_visits(request.user, [i for i in clicks if i in counted])
+    liked = record_likes(likes)
+
+    return JsonResponse({'clicks': sum(counted.values()),
+                         'likes': sum(liked.values())})
 
 
 @login_required
@@ -221,6 +317,7 @@ def register_profile(request):
     return render(request, 'rango/profile_registration.html', {'form': form})
 
 
+@throttle('suggest_category')
 def suggest_category(request):
     cat_list = []
 
@@ -232,6 +329,7 @@ def suggest_category(request):
     return render(request, 'rango/cats.html', {'cats': cat_list})
 
 
+@throttle('auto_add_page')
 @login_required
 def auto_add_page(request):
     context = {}
@@ -247,20 +345,47 @@ def auto_add_page(request):
         except Category.DoesNotExist:
             cat = None
 
-        # Add page to category.
+        # Only web URLs, they are rendered as links.
+        try:
+            validate_page_url(url)
+        except ValidationError:
+            url = None
+
+        # Add page to category, unless its URL is there already.
         if title and url and cat_id:
-            if cat:
+            if cat and not find_duplicate(cat, url):
                 p = Page.objects.get_or_create(category=cat, title=title)[0]
                 p.url = url
                 p.save()
 
                 # Fill the context.
-                pages = Page.objects.filter(category=cat).order_by('-views')
+                pages, next_cursor = get_page_chunk(cat)
                 context['pages'] = pages
+                context['next_cursor'] = next_cursor
+                context['category'] = cat
 
     return render(request, 'rango/page_list.html', context)
 
 
+@staff_member_required
+def throttle_stats(request):
+    """
+    Allowed and throttled requests per endpoint of this process.
+    """
+    return JsonResponse(throttle_counters.snapshot())
+
+
+def metrics(request):
+    """
+    Request metrics of this process in Prometheus text format.
+    """
+    if not rango_metrics.allowed(request):
+        return HttpResponse('Forbidden.', status=403,
+                            content_type='text/plain')
+    return HttpResponse(rango_metrics.exposition(),
+                        content_type='text/plain; version=0.0.4')
+
+
 class CategoriesViewSet(generics.ListAPIView):
     """
     API endpoint that allows categories to be viewed.
@@ -269,6 +394,40 @@ class CategoriesViewSet(generics.ListAPIView):
     serializer_class = CatSerializer
 
 
+class MostViewedCategoriesViewSet(generics.ListAPIView):
+    """
+    API endpoint that lists the most viewed categories,
+    `limit` (default 10, at most 100) sets how many.
+    """
+    serializer_class = CatSerializer
+
+    def get_queryset(self):
+        limit = get_limit(self.request)
+        return Category.objects.order_by('-views')[:limit]
+
+
+class TrendingCategoriesViewSet(generics.ListAPIView):
+    """
+    API endpoint that lists trending categories (time-decayed clicks
+    and likes), `limit` (default 10, at most 100) sets how many.
+    """
+    serializer_class = TrendingCatSerializer
+
+    def get_queryset(self):
+        return get_trending_categories(get_limit(self.request))
+
+
+class TrendingPagesViewSet(generics.ListAPIView):
+    """
+    API endpoint that lists trending pages (time-decayed clicks),
+    `limit` (default 10, at most 100) sets how many.
+    """
+    serializer_class = TrendingPageSerializer
+
+    def get_queryset(self):
+        return get_trending_pages(get_limit(self.request))
+
+
 @api_view(['GET'])
 def category_details(request, cat_id):
     """
@@ -286,11 +445,17 @@ def category_details(request, cat_id):
 
 class PagesViewSet(generics.ListAPIView):
     """
-    API endpoint that allows pages to be viewed.
+    API endpoint that allows pages to be viewed, `url` limits them
+    to the pages of that URL in any form (see `rango.canonical`).
     """
-    queryset = Page.objects.all()
     serializer_class = PageSerializer
 
+    def get_queryset(self):
+        url = self.request.query_params.get('url')
+        pages = pages_for_url(url) if url else Page.objects.all()
+        # Nested category is serialized for every page.
+        return pages.select_related('category')
+
 
 @api_view(['GET'])
 def page_details(request, page_id):
@@ -307,9 +472,46 @@ def page_details(request, page_id):
         return Response(serializer.data)
 
 
+@api_view(['POST'])
+@permission_classes((IsAdminUser,))
+def import_pages(request):
+    """
+    API endpoint that imports a JSON list of pages for staff, creating
+    or updating them (see `rango.ingest`). Takes at most
+    RANGO_IMPORT_MAX_ROWS pages per request.
+    """
+    rows = request.data
+    if not isinstance(rows, list):
+        return Response({'error': 'Expected a list of pages.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    max_rows = getattr(settings, 'RANGO_IMPORT_MAX_ROWS', 10000)
+    if len(rows) > max_rows:
+        return Response({'error': 'More than {0} pages.'.format(max_rows)},
+                        status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    return Response(ingest.import_pages(rows).as_dict())
+
+
 #######################################################################
 # Helper functions.
 
+def get_limit(request, default=10, maximum=100):
+    """
+    Returns `limit` query parameter of API request clamped
+    to `[1, maximum]`.
+    """
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def get_category_pages_url(category, cursor):
+    return '{0}?after={1}'.format(
+        reverse('category_pages', args=[category.slug]), cursor)
+
+
 def get_category_list(max_results=0, starts_with=None):
     cat_list = []
     if starts_with:
@@ -1,16 +1,70 @@
 // Ensure that whole document is loaded.
 $(document).ready(function() {
 
+    // Click and like events, posted in batches to `/rango/events/`.
+    var pendingEvents = [];
+
+    function eventsForm() {
+        var form = new FormData();
+        form.append("csrfmiddlewaretoken",
+                    $("meta[name=csrf-token]").attr("content"));
+        form.append("events", JSON.stringify(pendingEvents));
+        pendingEvents = [];
+        return form;
+    }
+
+    function flushEvents(leaving) {
+        if (!pendingEvents.length) {
+            return;
+        }
+        // A beacon survives the page being unloaded.
+        if (leaving && navigator.sendBeacon) {
+            navigator.sendBeacon('/rango/events/', eventsForm());
+        } else {
+            $.ajax({
+                url: '/rango/events/',
+                type: 'POST',
+                data: eventsForm(),
+                processData: false,
+                contentType: false
+            });
+        }
+    }
+
+    setInterval(function() {
+        flushEvents(false);
+    }, 2000);
+    $(window).on("pagehide", function() {
+        flushEvents(true);
+    });
+    $(document).on("visibilitychange", function() {
+        if (document.visibilityState === "hidden") {
+            flushEvents(true);
+        }
+    });
+
+
+    // Page links lead straight to their targets, clicks are queued.
+    $(document).on("click", "a.page-link", function() {
+        var pageId;
+        pageId = parseInt($(this).attr("data-page-id"), 10);
+        if (!navigator.sendBeacon) {
+            // Count the click through the redirect instead.
+            window.location = '/rango/goto/?page_id=' + pageId;
+            return false;
+        }
+        pendingEvents.push({type: "click", page: pageId});
+    });
+
+
     // Like button.
     $("#likes").click(function() {
         var catid;
-        catid = $(this).attr("data-catid");
-        $.get('/rango/like_category/', {
-            category_id: catid
-        }, function(data) {
-            $("#like_count").html(data);
-            $("#likes").hide();
-        });
+        catid = parseInt($(this).attr("data-catid"), 10);
+        pendingEvents.push({type: "like", category: catid});
+        flushEvents(false);
+        $("#like_count").html(parseInt($("#like_count").html(), 10) + 1);
+        $("#likes").hide();
     });
 
 
@@ -44,4 +98,35 @@ $(document).ready(function() {
             });
     });
 
+
+    // Infinite scrolling of category pages.
+    var loadingPages = false;
+    $(window).scroll(function() {
+        var more;
+        more = $("#page-more");
+        if (loadingPages || !more.length) {
+            return;
+        }
+
+        // Wait until the end of the list is about to be shown.
+        if ($(window).scrollTop() + $(window).height() < more.offset().top - 200) {
+            return;
+        }
+
+        loadingPages = true;
+        $.getJSON(more.attr("data-url"), function(data) {
+            $("#page-list").append(data.html);
+            if (data.next) {
+                more.attr("data-url", data.next);
+            } else {
+                more.remove();
+            }
+            loadingPages = false;
+
+            // Keep loading while the list is shorter than the window.
+            $(window).scroll();
+        });
+    });
+    $(window).scroll();
+
 });
\ No newline at end of file